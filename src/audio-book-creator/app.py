@@ -4,17 +4,27 @@ This beast turns plain text into sick audiobooks using
 the Sesame CSM-1b model! No cap, it's fire...
 
 ✨ Features:
-- Processes entire books at once (no more chunking, we're built different)
+- Streams whole books through a chunked text pipeline (constant memory, any size)
 - Multiple voice vibes to choose from
+- EPUB, PDF, Markdown and text books, split into chapters you can grab one by one
 - Background processing so you don't have to wait
+- Fair-share scheduling - previews cut the line, no one user hogs the model
+- Instant voice previews - hear the first sentence before committing a whole book
 - Download your fresh audiobooks when they're ready
 """
 
 import os
-import shutil
+import io
 import uuid
 import json
-from typing import Optional
+import time
+import asyncio
+import random
+import hashlib
+import threading
+import contextlib
+import shutil
+from typing import List, Optional
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
@@ -22,12 +32,32 @@ import torch
 import torchaudio
 import numpy as np
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 # from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
+from autotune import Autotuner
+from backends import backend_from_env, load_backend
+from coalescing import SingleFlight, job_fingerprint
+from dialogue import iter_dialogue_chunks, parse_cast
+from duration import DurationEstimator
+from ingest import SUPPORTED_EXTENSIONS, extract_chapters
+from pipeline import DecodeStage
+from pretokenize import PackedChunks, iter_chapter_chunks, iter_pretokenized
+from profiling import JobProfiler
+from postprocess import AudioPostProcessor
+from progress import TERMINAL_STATUSES, ProgressTracker
+from resampling import resample
+from scheduler import BULK, INTERACTIVE, SynthesisScheduler, run_once
+from storage import BookStore
+from text_processing import iter_text_chunks, preview_text
+from voices import DEFAULT_TRANSCRIPT, context_tokens, list_meta, load_meta, prepare_reference, save_meta
+from wav_writer import StreamingWavWriter
+from worker_pool import SharedModelPool
+
 # 📝 Setup logging - gotta see what's happening
 logging.basicConfig(
     level=logging.INFO,
@@ -61,15 +91,67 @@ os.makedirs("data/books", exist_ok=True)
 os.makedirs("data/voices", exist_ok=True)
 os.makedirs("data/audio", exist_ok=True)
 
+# 📦 Uploads get written in bites this big so a fat manuscript never sits in RAM
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 🏊 Forked workers sharing one copy of the weights (0 = generate in-process, CPU only)
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", "0"))
+
+# 🧺 Continuous batching - chunks share one model, joining and leaving at frame boundaries (0 = off)
+BATCH_SLOTS = int(os.environ.get("BATCH_SLOTS", "0"))
+
+# 🚦 How many chunks the scheduler runs at once - enough to keep every worker process / batch slot busy
+SCHEDULER_WORKERS = int(os.environ.get("SCHEDULER_WORKERS", str(max(1, WORKER_PROCESSES, BATCH_SLOTS))))
+
+# 👀 Preview knobs - keep it short and snappy
+PREVIEW_MAX_CHARS = int(os.environ.get("PREVIEW_MAX_CHARS", "200"))
+PREVIEW_MAX_AUDIO_MS = int(os.environ.get("PREVIEW_MAX_AUDIO_MS", "10000"))
+PREVIEW_TIMEOUT_S = float(os.environ.get("PREVIEW_TIMEOUT_S", "20"))
+
+# 🎚️ Trim dead air, level loudness and limit peaks on every chunk
+POSTPROCESS_AUDIO = os.environ.get("POSTPROCESS_AUDIO", "1") == "1"
+TARGET_LUFS = float(os.environ.get("TARGET_LUFS", "-18"))
+
+# 🏭 Decode + watermark on background threads while the next chunk generates (0 = serial)
+DECODE_WORKERS = int(os.environ.get("DECODE_WORKERS", "1"))
+
+# 🔤 Tokenize the whole book in batch calls when it's split, instead of chunk by chunk while rendering
+PRETOKENIZE = os.environ.get("PRETOKENIZE", "1") == "1"
+
+# 🎤 Voice references get trimmed to this much speech - it's prefilled in front of every chunk
+VOICE_MAX_SECONDS = float(os.environ.get("VOICE_MAX_SECONDS", "10"))
+VOICE_MAX_PAUSE_MS = int(os.environ.get("VOICE_MAX_PAUSE_MS", "400"))
+
+# 📡 Idle SSE streams get a keep-alive comment this often
+PROGRESS_KEEPALIVE_S = 15
+
+# 🏎️ Benchmark dtype / thread count once per host and use the winner (0 = off, force = re-run)
+AUTOTUNE = os.environ.get("AUTOTUNE", "1").lower()
+
+# 🔬 Profiled jobs capture this many chunks - keeps traces from growing without bound
+PROFILE_MAX_CHUNKS = int(os.environ.get("PROFILE_MAX_CHUNKS", "8"))
+
+# 🔥 Load the model at startup instead of on the first request
+PREWARM_MODEL = os.environ.get("PREWARM_MODEL", "1") == "1"
+
 # 🎙️ The real MVP - our voice generator
 class CSMGenerator:
-    def __init__(self, device="cuda" if torch.cuda.is_available() else "cpu"):
+    def __init__(self, device="cuda" if torch.cuda.is_available() else "cpu", backend=None):
         """🔥 Fire up the text-to-speech engine"""
         self.device = device
+        # csm = the real model, tiny = toy model offline, stub = timing-only fake (see backends.py)
+        self.backend = backend or backend_from_env()
         self.sample_rate = 24000
         self.model = None
         self.model_loaded = False
-        logging.info(f"CSMGenerator initialized with device: {device}")
+        self.pool = None
+        self.batcher = None
+        self.autotuner = Autotuner()
+        # One model, one KV cache - chapters take turns on it
+        self._lock = threading.Lock()
+        # Learns how fast each voice talks so we can cap generation tightly
+        self.durations = DurationEstimator()
+        logging.info(f"CSMGenerator initialized with device: {device}, backend: {self.backend}")
     
     def load_model(self):
         """📥 Grab that model from the cloud - it's heavy tho"""
@@ -77,26 +159,50 @@ class CSMGenerator:
             return self.model
         
         try:
-            from huggingface_hub import hf_hub_download
-            from generator import load_csm_1b
+            # Load it up - downloads the checkpoint for the real backend
+            self.model = load_backend(self.backend, self.device, hf_token=HF_TOKEN)
+            self.sample_rate = self.model.sample_rate
+            self.model_loaded = True
+            logging.info(f"{self.backend} backend loaded successfully")
             
-            # Yoink the model from HF
-            model_path = hf_hub_download(
-                repo_id="sesame/csm-1b", 
-                filename="ckpt.pt",
-                token=HF_TOKEN
-            )
+            # Fastest dtype / threads for this box - before forking or batching so everyone inherits it
+            if AUTOTUNE != "0" and hasattr(self.model, "_model"):
+                try:
+                    self.autotuner.tune(self.model._model, self.device, force=AUTOTUNE == "force")
+                except Exception as e:
+                    logging.error(f"Autotune failed, keeping the defaults: {e}")
             
-            # Load it up
-            self.model = load_csm_1b(model_path, self.device)
-            self.model_loaded = True
-            logging.info("CSM-1b model loaded successfully")
+            # Fork the worker pool now, after loading, so every worker maps the same weights
+            if WORKER_PROCESSES > 0:
+                if str(self.device).startswith("cuda"):
+                    logging.warning("WORKER_PROCESSES needs a CPU device, generating in-process instead")
+                else:
+                    self.pool = SharedModelPool(self.model, WORKER_PROCESSES)
+            
+            # Or batch everyone onto the one in-process model
+            if BATCH_SLOTS > 0 and self.pool is None:
+                if hasattr(self.model, "tokenize_prompt"):
+                    from batching import ContinuousBatcher
+                    self.batcher = ContinuousBatcher(self.model, BATCH_SLOTS)
+                else:
+                    logging.warning(f"BATCH_SLOTS needs a real model, the {self.backend} backend runs unbatched")
             return self.model
             
         except Exception as e:
-            logging.error(f"Error loading CSM-1b model: {e}")
+            logging.error(f"Error loading {self.backend} backend: {e}")
             return None
     
+    def warm_up(self):
+        """🔥 Load the model and run a tiny generation so the first real request is snappy"""
+        started = time.perf_counter()
+        with self._lock:
+            if self.load_model() is None:
+                logging.warning("Warm-up skipped - model didn't load")
+                return False
+            self._generate_locked("Hello there.", 0, None, 2000, "default", 0)
+        logging.info(f"Generator warmed up in {time.perf_counter() - started:.1f}s")
+        return True
+    
     def load_audio(self, audio_path, target_sr=24000):
         """🎵 Load voice sample for the vibe check"""
         try:
@@ -106,20 +212,21 @@ class CSMGenerator:
             if waveform.shape[0] > 1:
                 waveform = waveform.mean(dim=0, keepdim=True)
             
-            # Fix the sample rate if it's off
-            if sr != target_sr:
-                resampler = torchaudio.transforms.Resample(sr, target_sr)
-                waveform = resampler(waveform)
-            
-            # Move to the right device
+            # Move to the right device first - the resample then runs there too
             waveform = waveform.to(self.device)
             
+            # Fix the sample rate if it's off (kernels are cached, see resampling.py)
+            waveform = resample(waveform, sr, target_sr)
+            
             return waveform
         except Exception as e:
             logging.error(f"Error loading audio: {e}")
             return None
     
-    def generate(self, text, speaker=0, context=None, max_audio_length_ms=30000):
+    def generate(
+        self, text, speaker=0, context=None, max_audio_length_ms=None, voice_key="default", seed=None, context_key=None,
+        text_tokens=None
+    ):
         """
         🗣️ The main character - turns text into speech
         
@@ -127,7 +234,11 @@ class CSMGenerator:
             text: The words to speak
             speaker: Voice ID (0 is the default vibe)
             context: Voice samples for cloning (optional glow-up)
-            max_audio_length_ms: How long can this go on?
+            max_audio_length_ms: Hard ceiling - the real cap is estimated from the text
+            voice_key: Whose speaking rate to use for the estimate
+            seed: Same seed + same inputs = same audio (random if None)
+            context_key: Names the context so the model can reuse its encoding + prefill (optional)
+            text_tokens: The text already run through the tokenizer (see pretokenize.py, optional)
             
         Returns:
             audio: The fresh audio tensor that slaps
@@ -135,42 +246,86 @@ class CSMGenerator:
         # Check if text is too long (that's what she said)
         if len(text) > 2000:
             logging.warning(f"Text is very long ({len(text)} chars). This might cause issues with generation.")
-            
-            # We'll try it anyway but with more headroom
-            max_audio_length_ms = max(max_audio_length_ms, min(300000, len(text) * 80))
         
+        if self.pool is not None or self.batcher is not None:
+            # Every worker process / batch slot has its own KV cache - no need to take turns
+            return self._generate_locked(
+                text, speaker, context, max_audio_length_ms, voice_key, seed, context_key, text_tokens
+            )
+        
+        with self._lock:
+            return self._generate_locked(
+                text, speaker, context, max_audio_length_ms, voice_key, seed, context_key, text_tokens
+            )
+    
+    def _count_tokens(self, text):
+        """🔢 Text token count for the duration estimate (None if we can't tell)"""
+        try:
+            return len(self.model._text_tokenizer.encode(text))
+        except Exception:
+            return None
+    
+    def _cap_ms(self, text, voice_key, max_audio_length_ms, text_tokens=None):
+        """🧢 Just above how long this should take to say - missed EOS burns frames till the cap"""
+        if text_tokens is not None:
+            token_count = len(text_tokens)  # Pre-tokenized - no need to encode it again
+        else:
+            token_count = self._count_tokens(text) if self.model is not None else None
+        cap_ms = self.durations.cap_ms(text, voice_key, token_count)
+        if max_audio_length_ms is not None:
+            cap_ms = min(cap_ms, max_audio_length_ms)
+        return cap_ms, token_count
+    
+    def _context_segments(self, context, speaker):
+        """🎭 Turn our {'text', 'audio'} voice samples into generator Segments"""
+        from generator import Segment
+        
+        # Setup the context - empty list to start
+        context_segments = []
+        
+        # If we have voice samples, add them to the vibe
+        if context and isinstance(context, list) and len(context) > 0:
+            for ctx in context:
+                if 'text' in ctx and 'audio' in ctx:
+                    context_segments.append(
+                        Segment(text=ctx['text'], speaker=speaker, audio=ctx['audio'])
+                    )
+        return context_segments
+    
+    def _generate_locked(
+        self, text, speaker, context, max_audio_length_ms, voice_key, seed, context_key=None, text_tokens=None
+    ):
+        """🔒 Does the actual generation - caller holds the model lock"""
         # Make sure we're loaded
         if not self.model_loaded:
             self.model = self.load_model()
         
+        cap_ms, token_count = self._cap_ms(text, voice_key, max_audio_length_ms, text_tokens)
+        max_audio_length_ms = cap_ms
+        
         # If loading failed, fall back to the mock generator
         if self.model is None:
             return self._generate_mock_audio(text, context, max_audio_length_ms)
         
         try:
-            # Import the right stuff
-            from generator import Segment
-            
-            # Setup the context - empty list to start
-            context_segments = []
-            
-            # If we have voice samples, add them to the vibe
-            if context and isinstance(context, list) and len(context) > 0:
-                for ctx in context:
-                    if 'text' in ctx and 'audio' in ctx:
-                        context_segments.append(
-                            Segment(text=ctx['text'], speaker=speaker, audio=ctx['audio'])
-                        )
-            
             # Let everyone know what's happening
             logging.info(f"Generating audio for text with {len(text)} characters")
             
             # The magic happens here
-            audio = self.model.generate(
+            if self.pool is not None:
+                run = self.pool.generate
+            elif self.batcher is not None:
+                run = self._generate_batched
+            else:
+                run = self.model.generate
+            audio = run(
                 text=text,
                 speaker=speaker,  # Default vibe
-                context=context_segments,  # Voice reference
-                max_audio_length_ms=max_audio_length_ms
+                context=self._context_segments(context, speaker),  # Voice reference
+                max_audio_length_ms=max_audio_length_ms,
+                seed=seed,  # Reproducible sampling
+                context_key=context_key,  # Same voice as last time? Skip re-encoding + re-prefilling it
+                text_tokens=text_tokens  # Tokenized up front? Skip the tokenizer
             )
             
             if audio is None:
@@ -178,6 +333,11 @@ class CSMGenerator:
                 return self._generate_mock_audio(text, context, max_audio_length_ms)
                 
             logging.info(f"Successfully generated audio with shape {audio.shape}")
+            
+            # Stopped on its own before the cap? Then it tells us how fast this voice talks
+            audio_ms = audio.shape[-1] * 1000 / self.sample_rate
+            if 0 < audio_ms < max_audio_length_ms - 80:
+                self.durations.observe(text, voice_key, audio_ms, token_count)
             return audio
             
         except Exception as e:
@@ -185,6 +345,114 @@ class CSMGenerator:
             # Plan B - fake it 'til you make it
             return self._generate_mock_audio(text, context, max_audio_length_ms)
     
+    def _generate_batched(self, **kwargs):
+        """🧺 generate() via the continuous batcher - tokens come from the shared batch, decode happens here"""
+        return self.model.decode_tokens(self.batcher.generate_tokens(**kwargs))
+    
+    def can_pipeline(self):
+        """🏭 True if tokens and audio can be made in separate steps (see pipeline.py)"""
+        with self._lock:
+            if not self.model_loaded:
+                self.model = self.load_model()
+        # Worker processes already overlap whole chunks - no point splitting them too
+        return self.pool is None and hasattr(self.model, "generate_tokens")
+    
+    def generate_tokens(
+        self, text, speaker=0, context=None, max_audio_length_ms=None, voice_key="default", seed=None, context_key=None,
+        text_tokens=None
+    ):
+        """
+        🎼 First half of generate() - just the codebook tokens, no decode or watermark
+        
+        Holds the model lock only while tokens are being sampled. Returns None if
+        the model blew up (there's no mock fallback for tokens).
+        """
+        # The batcher hands out the model frame by frame itself - no lock needed on top
+        lock = self._lock if self.batcher is None else contextlib.nullcontext()
+        with lock:
+            cap_ms, token_count = self._cap_ms(text, voice_key, max_audio_length_ms, text_tokens)
+            try:
+                logging.info(f"Generating tokens for text with {len(text)} characters")
+                run = self.batcher.generate_tokens if self.batcher is not None else self.model.generate_tokens
+                tokens = run(
+                    text=text,
+                    speaker=speaker,
+                    context=self._context_segments(context, speaker),
+                    max_audio_length_ms=cap_ms,
+                    seed=seed,
+                    context_key=context_key,
+                    text_tokens=text_tokens
+                )
+            except Exception as e:
+                logging.error(f"Error generating tokens with real model: {e}")
+                return None
+        
+        self._observe_tokens(text, voice_key, tokens, cap_ms, token_count)
+        return tokens
+    
+    def _observe_tokens(self, text, voice_key, tokens, cap_ms, token_count):
+        """⏱️ Same speaking-rate lesson as generate() - every frame is 80ms"""
+        audio_ms = tokens.shape[-1] * 80
+        if 0 < audio_ms < cap_ms - 80:
+            self.durations.observe(text, voice_key, audio_ms, token_count)
+    
+    def group_size(self):
+        """🧺 How many lines generate_tokens_group can usefully run at once"""
+        return self.batcher.max_slots if self.batcher is not None else 1
+    
+    def generate_tokens_group(self, requests):
+        """
+        🧺 generate_tokens() for several lines at once - a list of tokens (None where one failed)
+        
+        With batch slots they all go in together (and share their voice's prefill);
+        otherwise they just run one after another.
+        """
+        if self.batcher is None:
+            return [self.generate_tokens(**request) for request in requests]
+        
+        jobs = []
+        for request in requests:
+            cap_ms, token_count = self._cap_ms(
+                request["text"], request["voice_key"], request.get("max_audio_length_ms"), request.get("text_tokens")
+            )
+            try:
+                future = self.batcher.submit(
+                    text=request["text"],
+                    speaker=request["speaker"],
+                    context=self._context_segments(request["context"], request["speaker"]),
+                    max_audio_length_ms=cap_ms,
+                    seed=request["seed"],
+                    context_key=request.get("context_key"),
+                    text_tokens=request.get("text_tokens")
+                )
+            except Exception as e:
+                logging.error(f"Error queueing tokens for batched generation: {e}")
+                future = None
+            jobs.append((request, cap_ms, token_count, future))
+        
+        results = []
+        for request, cap_ms, token_count, future in jobs:
+            tokens = None
+            if future is not None:
+                try:
+                    tokens = future.result()
+                    self._observe_tokens(request["text"], request["voice_key"], tokens, cap_ms, token_count)
+                except Exception as e:
+                    logging.error(f"Error generating tokens with real model: {e}")
+            results.append(tokens)
+        return results
+    
+    def decode_tokens(self, tokens):
+        """🔊 Second half of generate() - codec decode + watermark, no model lock needed"""
+        return self.model.decode_tokens(tokens)
+    
+    def text_encoder(self):
+        """🔤 The backend's batch text tokenizer - encode_texts(texts, speakers) - or None if it hasn't got one"""
+        with self._lock:
+            if not self.model_loaded:
+                self.model = self.load_model()
+        return getattr(self.model, "encode_texts", None)
+    
     def _generate_mock_audio(self, text, context, max_audio_length_ms):
         """🔊 Creates fake audio when the real model ghosts us"""
         logging.warning("Using mock audio generation")
@@ -225,22 +493,52 @@ class CSMGenerator:
         except Exception as e:
             logging.error(f"Error saving audio: {e}")
             return None
+    
+    def encode_wav(self, audio):
+        """📦 Packs audio into WAV bytes for sending straight back over HTTP"""
+        audio_to_save = audio.unsqueeze(0).cpu() if len(audio.shape) == 1 else audio.cpu()
+        buffer = io.BytesIO()
+        torchaudio.save(buffer, audio_to_save, self.sample_rate, format="wav")
+        return buffer.getvalue()
 
 # 🎤 Create our generator
 generator = CSMGenerator()
 
+# 🚦 Everything that touches the model goes through here
+scheduler = SynthesisScheduler(workers=SCHEDULER_WORKERS)
+decode_stage = DecodeStage(workers=DECODE_WORKERS) if DECODE_WORKERS > 0 else None
+progress = ProgressTracker()
+flights = SingleFlight()
+
 # 📋 Data models - gotta keep things organized
 class AudiobookBase(BaseModel):
     title: str
     author: str
     voice_id: Optional[int] = 0
 
+class Chapter(BaseModel):
+    index: int
+    title: str
+    text_path: str
+    status: str  # 'pending', 'processing', 'completed', 'failed'
+    audio_path: Optional[str] = None
+    seed: Optional[int] = None  # Overrides the book seed after a re-render with a new seed
+
 class Audiobook(AudiobookBase):
     id: str
     date: str
     status: str  # 'processing', 'completed', 'failed'
     audio_path: Optional[str] = None
     text_path: str
+    seed: Optional[int] = None
+    chapters: List[Chapter] = []
+    version: int = 0  # bumped on every metadata write
+    profile: bool = False
+    profile_trace: Optional[str] = None  # Chrome trace, when the book was profiled
+    profile_summary: Optional[str] = None  # Top-ops table, when the book was profiled
+    linked_to: Optional[str] = None  # Rode along on this identical book's render
+    linked_ids: List[str] = []  # Identical books that rode along on this one's render
+    cast: Optional[dict] = None  # Role -> voice_id when dialogue gets its own voices
 
 class TextChunk(BaseModel):
     book_id: str
@@ -248,91 +546,623 @@ class TextChunk(BaseModel):
     text: str
     audio_path: Optional[str] = None
 
+# 🗄️ Blocking file helpers - routes run these in the threadpool, never on the event loop
+# 🔐 Atomic writes + per-book locks + version counter - see storage.py
+books = BookStore("data/books")
+
+def _load_book(book_id):
+    """📖 Read a book's metadata from disk"""
+    return books.load(book_id)
+
+def _update_book(book_id, **changes):
+    """✏️ Patch a few fields of a book's metadata"""
+    return books.update(book_id, **changes)
+
+def _update_chapter(book_id, index, **changes):
+    """✏️ Patch a few fields of one chapter's entry"""
+    return books.update_chapter(book_id, index, **changes)
+
+def _write_text(text_path, text_content):
+    """✍️ Write book text straight to disk"""
+    with open(text_path, "w", encoding="utf-8") as f:
+        f.write(text_content)
+
+def _list_books():
+    """📚 Every book's metadata - unchanged files come from cache"""
+    return books.list()
+
+def _remove_book_files(book_id):
+    """🧹 Delete everything on disk that belongs to a book"""
+    # Metadata goes first (under the book's lock) so nobody keeps updating a book mid-delete
+    book = books.delete(book_id)
+
+    # Delete the audio if it exists
+    if book.get("audio_path") and os.path.exists(book["audio_path"]):
+        os.remove(book["audio_path"])
+
+    # Delete the text file
+    if book.get("text_path") and os.path.exists(book["text_path"]):
+        os.remove(book["text_path"])
+
+    # Clean up chapter texts and any leftover audio chunks
+    for folder in ("data/books", "data/audio"):
+        for filename in os.listdir(folder):
+            if filename.startswith(f"{book_id}_"):
+                os.remove(f"{folder}/{filename}")
+
+async def _save_upload(upload, path):
+    """📥 Stream an upload to disk chunk by chunk without blocking the loop"""
+    f = await run_in_threadpool(open, path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await run_in_threadpool(f.write, chunk)
+    finally:
+        await run_in_threadpool(f.close)
+
+# 🎲 Seeds - every chunk gets its own, derived from the book's, so any chunk can be replayed exactly
+def _new_seed():
+    return random.randrange(2**31)
+
+def _chunk_seed(seed, chapter_index, chunk_id):
+    """🎲 Stable per-chunk seed from (book seed, chapter, chunk)"""
+    digest = hashlib.sha256(f"{seed}:{chapter_index}:{chunk_id}".encode()).digest()
+    return int.from_bytes(digest[:8], "little") & (2**63 - 1)
+
 # 🎬 Background processing - do the heavy lifting
-def process_audiobook(book_id, text_content, voice_id):
-    """⚙️ Creates audiobook in the background while you chill"""
+# 🎭 voice_id -> (sample mtime, context) - no re-reading the same WAV for every job
+_voice_contexts = {}
+_voice_contexts_lock = threading.Lock()
+
+def _load_voice_context(voice_id):
+    """🎭 Build the voice cloning context for a voice, if we have a sample"""
+    voice_path = f"data/voices/voice_{voice_id}.wav"
+    if not os.path.exists(voice_path):
+        return []
+    
+    mtime = os.path.getmtime(voice_path)
+    with _voice_contexts_lock:
+        cached = _voice_contexts.get(voice_id)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    
     try:
-        # Update the status to let everyone know we're cooking
-        with open(f"data/books/{book_id}.json", "r") as f:
-            book = json.load(f)
+        # Load the voice sample
+        voice_audio = generator.load_audio(voice_path, generator.sample_rate)
         
-        book["status"] = "processing"
-        
-        with open(f"data/books/{book_id}.json", "w") as f:
-            json.dump(book, f)
+        if voice_audio is not None:
+            meta = load_meta(voice_id)
+            if meta is None:
+                # Dropped in by hand, never registered - still keep the prefill short
+                voice_audio, _ = prepare_reference(
+                    voice_audio, generator.sample_rate, VOICE_MAX_SECONDS, VOICE_MAX_PAUSE_MS
+                )
+            else:
+                voice_audio = voice_audio.reshape(-1)
+            logging.info(f"Voice cloning context created from {voice_path}")
+            # Create context - just one sample is all we need
+            transcript = (meta or {}).get("transcript") or DEFAULT_TRANSCRIPT
+            context = [{"text": transcript, "audio": voice_audio}]
+            with _voice_contexts_lock:
+                _voice_contexts[voice_id] = (mtime, context)
+            return context
+    except Exception as e:
+        logging.error(f"Error setting up voice cloning: {e}")
+    return []
+
+def _register_voice(voice_id, upload_path, transcript=None):
+    """
+    🎤 Turn an uploaded sample into a voice reference - trimmed, capped, best window picked
+    
+    The transcript only sticks if the clip wasn't cut down (it wouldn't match
+    any more otherwise). Returns the voice's metadata.
+    """
+    audio = generator.load_audio(upload_path, generator.sample_rate)
+    if audio is None:
+        raise ValueError("couldn't read that audio file")
+    reference, info = prepare_reference(audio, generator.sample_rate, VOICE_MAX_SECONDS, VOICE_MAX_PAUSE_MS)
+    if reference.numel() == 0:
+        raise ValueError("no speech found in the sample")
+    if transcript and info["cut"]:
+        logging.info(f"Voice {voice_id} sample was cut to {info['duration_s']}s, dropping its transcript")
+        transcript = None
+    transcript = transcript or DEFAULT_TRANSCRIPT
+    
+    # Exact text token count when the tokenizer is loaded, ~4 characters a token otherwise
+    text_tokens = generator._count_tokens(f"[0]{transcript}") if generator.model is not None else None
+    if text_tokens is None:
+        text_tokens = len(f"[0]{transcript}") // 4 + 2
+    meta = {
+        "voice_id": voice_id,
+        "transcript": transcript,
+        "sample_rate": generator.sample_rate,
+        **info,
+        "context_tokens": context_tokens(reference.numel(), generator.sample_rate, text_tokens),
+        "registered_at": datetime.now().isoformat(),
+    }
+    
+    # Metadata first - the WAV's mtime is what tells the caches this voice changed
+    save_meta(voice_id, meta)
+    with StreamingWavWriter(f"data/voices/voice_{voice_id}.wav", generator.sample_rate) as writer:
+        writer.write(reference)
+    logging.info(
+        f"Registered voice {voice_id}: {info['source_s']}s sample -> {info['duration_s']}s reference, "
+        f"{meta['context_tokens']} prompt positions"
+    )
+    return meta
+
+def _voice_context_key(voice_id, speaker):
+    """🔑 Names a voice's context for the generator's caches - changes whenever the sample does"""
+    try:
+        mtime_ns = os.stat(f"data/voices/voice_{voice_id}.wav").st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return f"voice_{voice_id}:{mtime_ns}:{speaker}"
+
+def _render_cast(book_id, chapter, cast, seed, write, finish, profiler=None):
+    """
+    🎭 A multi-voice chapter - narration and dialogue each in their cast member's voice
+    
+    Lines are generated voice by voice, so each voice's context gets prefilled
+    once and its lines share batch slots instead of taking turns with the
+    other voices. The tokens are tiny, so we hold them and write the audio in
+    reading order at the end.
+    """
+    index = chapter["index"]
+    contexts = {}
+    requests = []
+    for chunk_id, (voice_id, speaker, text, text_tokens) in enumerate(_iter_chapter_chunks(chapter, cast=cast)):
+        if voice_id not in contexts:
+            contexts[voice_id] = _load_voice_context(voice_id)
+        requests.append(dict(
+            text=text,
+            speaker=speaker,
+            context=contexts[voice_id],
+            voice_key=f"voice_{voice_id}",
+            seed=_chunk_seed(seed, index, chunk_id),
+            context_key=_voice_context_key(voice_id, speaker),
+            text_tokens=text_tokens
+        ))
+    profiled = profiler.chunk if profiler is not None else contextlib.nullcontext
+    
+    if not generator.can_pipeline():
+        # Whole-chunk workers - no token/decode split to regroup around, so just read straight through
+        for chunk_id, request in enumerate(requests):
+            started = time.perf_counter()
+            with profiled():
+                chunk_audio = generator.generate(**request)
+            if chunk_audio is None:
+                raise RuntimeError(f"chunk {chunk_id} came back empty")
+            frames = round(chunk_audio.shape[-1] * 1000 / generator.sample_rate / 80)
+            progress.chunk_done(book_id, index, frames, time.perf_counter() - started, _token_count(request))
+            write([finish(chunk_audio)])
+            yield
+        return
+    
+    # Voice by voice, in order of first appearance, a batch worth of lines at a time
+    by_voice = {}
+    for chunk_id, request in enumerate(requests):
+        by_voice.setdefault(request["voice_key"], []).append(chunk_id)
+    group_size = generator.group_size()
+    tokens = {}
+    for chunk_ids in by_voice.values():
+        for start in range(0, len(chunk_ids), group_size):
+            group = chunk_ids[start:start + group_size]
+            started = time.perf_counter()
+            with profiled():
+                results = generator.generate_tokens_group([requests[chunk_id] for chunk_id in group])
+            seconds = (time.perf_counter() - started) / len(group)
+            for chunk_id, chunk_tokens in zip(group, results):
+                if chunk_tokens is None:
+                    raise RuntimeError(f"chunk {chunk_id} came back empty")
+                tokens[chunk_id] = chunk_tokens
+                progress.chunk_done(
+                    book_id, index, chunk_tokens.shape[-1], seconds, _token_count(requests[chunk_id])
+                )
+            
+            # Group boundary - let the scheduler decide who goes next
+            yield
+    
+    # Back to reading order - decode threads (when there are any) overlap with writing
+    if decode_stage is not None and profiler is None:
+        pipeline = decode_stage.pipeline(lambda chunk_tokens: finish(generator.decode_tokens(chunk_tokens)))
+    else:
+        pipeline = None
+    try:
+        for chunk_id in range(len(requests)):
+            chunk_tokens = tokens.pop(chunk_id)
+            if pipeline is not None:
+                finished = pipeline.push(chunk_tokens)
+            else:
+                with profiled():
+                    finished = [finish(generator.decode_tokens(chunk_tokens))]
+            write(finished)
+        if pipeline is not None:
+            write(pipeline.drain())
+    finally:
+        if pipeline is not None:
+            pipeline.cancel()
+
+def render_chapter(book_id, chapter, context, voice_id=0, seed=0, profiler=None, cast=None):
+    """
+    🎞️ Speaks one chapter into its own WAV - the unit of work and of retry
+    
+    It's a generator that yields after every chunk, so the scheduler can
+    slip other users' work in between. Returns True when the chapter made it.
+    With a cast, dialogue gets its own voices (see _render_cast).
+    """
+    index = chapter["index"]
+    try:
+        _update_chapter(book_id, index, status="processing")
+        logging.info(f"Rendering chapter {index} of book {book_id}")
         
-        logging.info(f"Starting processing for audiobook {book_id}")
+        # Stream the chapter through the text pipeline and speak it chunk by chunk
+        # Each chunk goes straight to disk - only a couple of chunks are ever in RAM
+        postprocessor = AudioPostProcessor(generator.sample_rate, target_lufs=TARGET_LUFS)
         
-        # Setup voice cloning if we have a sample
-        context = []  # Start with nothing
-        voice_path = f"data/voices/voice_{voice_id}.wav"
+        def _finish(chunk_audio):
+            # Just the trim - that part's stateless, so the decode threads can do it
+            return postprocessor.prepare(chunk_audio) if POSTPROCESS_AUDIO else chunk_audio
         
-        if os.path.exists(voice_path):
-            try:
-                # Load the voice sample
-                voice_audio = generator.load_audio(voice_path)
-                
-                if voice_audio is not None:
-                    # Create context - just one sample is all we need
-                    context = [
-                        {"text": "This is a voice sample for cloning.", "audio": voice_audio}
-                    ]
-                    logging.info(f"Voice cloning context created from {voice_path}")
-            except Exception as e:
-                logging.error(f"Error setting up voice cloning: {e}")
-        
-        # Generate the entire audiobook at once - one shot, one opportunity
-        logging.info(f"Generating audio for entire text of book {book_id}")
-        audio = generator.generate(
-            text=text_content,
-            speaker=0,  # Default voice 
-            context=context,
-            max_audio_length_ms=min(300000, len(text_content) * 80)  # Big text = big audio
-        )
+        def _write(finished):
+            # Leveling follows the chapter's running loudness, so it happens here, in reading order
+            if POSTPROCESS_AUDIO:
+                finished = postprocessor.iter_leveled(finished)
+            for chunk_audio in finished:
+                if chunk_audio.numel():
+                    writer.write(chunk_audio)
         
-        output_path = f"data/books/{book_id}.wav"
+        # Pipelined: we sample tokens, decode threads turn the previous chunk into audio meanwhile
+        # (not when profiling - decode has to happen inside the chunk's profile to show up in it)
+        if decode_stage is not None and generator.can_pipeline() and profiler is None and not cast:
+            pipeline = decode_stage.pipeline(lambda tokens: _finish(generator.decode_tokens(tokens)))
+        else:
+            pipeline = None
         
-        if audio is not None:
-            # Save the masterpiece
-            result = generator.save_audio(audio, output_path)
-            
-            if result:
-                # We did it! 🎉
-                book["status"] = "completed"
-                book["audio_path"] = output_path
-                logging.info(f"Successfully created audiobook {book_id}")
+        audio_path = f"data/audio/{book_id}_chapter_{index:03d}.wav"
+        with StreamingWavWriter(audio_path, generator.sample_rate) as writer:
+            if cast:
+                yield from _render_cast(book_id, chapter, cast, seed, _write, _finish, profiler)
             else:
-                # Saving failed - sad noises
-                logging.error(f"Failed to save audio for book {book_id}")
-                book["status"] = "failed"
+                try:
+                    for chunk_id, (_, _, chunk, text_tokens) in enumerate(_iter_chapter_chunks(chapter, voice_id)):
+                        request = dict(
+                            text=chunk,
+                            speaker=0,  # Default voice 
+                            context=context,
+                            voice_key=f"voice_{voice_id}",  # Length cap comes from this voice's pace
+                            seed=_chunk_seed(seed, index, chunk_id),
+                            context_key=_voice_context_key(voice_id, 0),  # Same voice every chunk - prefill it once
+                            text_tokens=text_tokens  # Tokenized with the rest of the book (None if it wasn't)
+                        )
+                        started = time.perf_counter()
+                        with profiler.chunk() if profiler is not None else contextlib.nullcontext():
+                            if pipeline is not None:
+                                tokens = generator.generate_tokens(**request)
+                                if tokens is None:
+                                    raise RuntimeError(f"chunk {chunk_id} came back empty")
+                                frames = tokens.shape[-1]
+                                finished = pipeline.push(tokens)
+                            else:
+                                chunk_audio = generator.generate(**request)
+                                if chunk_audio is None:
+                                    raise RuntimeError(f"chunk {chunk_id} came back empty")
+                                frames = round(chunk_audio.shape[-1] * 1000 / generator.sample_rate / 80)
+                                finished = [_finish(chunk_audio)]
+                        progress.chunk_done(
+                            book_id, index, frames, time.perf_counter() - started, _token_count(request)
+                        )
+                    
+                        _write(finished)
+                    
+                        # Chunk boundary - let the scheduler decide who goes next
+                        yield
+                    
+                    # Whatever the decode threads are still chewing on
+                    if pipeline is not None:
+                        _write(pipeline.drain())
+                finally:
+                    if pipeline is not None:
+                        pipeline.cancel()
+                
+            if not writer.frames:
+                raise RuntimeError("chapter has no speakable text")
+        
+        _update_chapter(book_id, index, status="completed", audio_path=audio_path)
+        progress.chapter_done(book_id, index, ok=True)
+        return True
+    except Exception as e:
+        logging.error(f"Error rendering chapter {index} of book {book_id}: {e}")
+        progress.chapter_done(book_id, index, ok=False)
+        try:
+            _update_chapter(book_id, index, status="failed")
+        except Exception as nested_e:
+            logging.error(f"Failed to update chapter status after error: {nested_e}")
+        return False
+
+def assemble_audiobook(book_id):
+    """📼 Glues the finished chapters into the full-book WAV"""
+    book = _load_book(book_id)
+    chapters = book.get("chapters", [])
+    
+    if not chapters or any(chapter["status"] != "completed" for chapter in chapters):
+        # Chapters that did finish stay downloadable - only the failed ones need a re-render
+        logging.error(f"Book {book_id} has unfinished chapters, not assembling")
+        _update_book(book_id, status="failed")
+        progress.finish(book_id, "failed")
+        return False
+    
+    # Stitch the chapter PCM together on disk - the book never sits in RAM
+    with StreamingWavWriter(f"data/books/{book_id}.wav", generator.sample_rate) as writer:
+        for chapter in chapters:
+            writer.append_wav(chapter["audio_path"])
+    output_path = writer.path
+    
+    # We did it! 🎉
+    _update_book(book_id, status="completed", audio_path=output_path)
+    progress.finish(book_id, "completed")
+    logging.info(f"Successfully created audiobook {book_id}")
+    return True
+
+def _count_chunks(text_path, cast=None):
+    """🔢 How many chunks a chapter will be spoken in - one cheap pass of the text pipeline"""
+    chunks = iter_dialogue_chunks(text_path, cast) if cast else iter_text_chunks(text_path)
+    return sum(1 for _ in chunks)
+
+def _pretokenize_chapters(chapters, voice_id=0, cast=None):
+    """
+    🔤 Chunk + tokenize the whole book in a few batch calls, packed next to each chapter's text
+    
+    Sets tokens_path, chunks and text_tokens on every chapter. Returns False
+    (and leaves the chapters alone) when the backend can't tokenize up front.
+    """
+    encode_texts = generator.text_encoder()
+    if encode_texts is None:
+        return False
+    started = time.perf_counter()
+    packed = iter_pretokenized([chapter["text_path"] for chapter in chapters], encode_texts, voice_id, cast)
+    # Each chapter hits disk before the next one gets chunked - memory stays flat
+    for chapter, chunks in zip(chapters, packed):
+        tokens_path = f"{os.path.splitext(chapter['text_path'])[0]}.tokens.npz"
+        chunks.save(tokens_path)
+        chapter["tokens_path"] = tokens_path
+        chapter["chunks"] = len(chunks)
+        chapter["text_tokens"] = chunks.total_tokens
+    logging.info(
+        f"Pre-tokenized {sum(chapter['chunks'] for chapter in chapters)} chunks "
+        f"({sum(chapter['text_tokens'] for chapter in chapters)} tokens) in {time.perf_counter() - started:.2f}s"
+    )
+    return True
+
+def _iter_chapter_chunks(chapter, voice_id=0, cast=None):
+    """🚰 (voice_id, speaker, text, text tokens) per chunk - from the packed tokens if we have them"""
+    tokens_path = chapter.get("tokens_path")
+    if tokens_path and os.path.exists(tokens_path):
+        yield from PackedChunks.load(tokens_path)
+        return
+    # Not pre-tokenized (older book, or a backend without a batch tokenizer) - chunk it on the fly
+    for chunk_voice, speaker, text in iter_chapter_chunks(chapter["text_path"], voice_id, cast):
+        yield chunk_voice, speaker, text, None
+
+def _token_count(request):
+    return len(request["text_tokens"]) if request.get("text_tokens") is not None else 0
+
+def _start_progress(book_id, chapters, cast=None):
+    """🚦 Progress for these chapters - by tokens when they were all pre-tokenized"""
+    chunk_counts = {
+        chapter["index"]: chapter["chunks"] if "chunks" in chapter else _count_chunks(chapter["text_path"], cast)
+        for chapter in chapters
+    }
+    token_counts = None
+    if all("text_tokens" in chapter for chapter in chapters):
+        token_counts = {chapter["index"]: chapter["text_tokens"] for chapter in chapters}
+    progress.start(book_id, chunk_counts, token_counts)
+
+def _write_profile(book_id, profiler):
+    """🔬 Save a profiled book's trace + top-ops summary and point its metadata at them"""
+    try:
+        paths = profiler.write()
+        if paths:
+            _update_book(book_id, profile_trace=paths[0], profile_summary=paths[1])
+    except Exception as e:
+        logging.error(f"Error writing profile for audiobook {book_id}: {e}")
+
+# 🪢 Single-flight - identical books submitted while one is rendering share that render
+def _share_file(src, dst):
+    """🔗 Hardlink (copy if we can't) so each book owns its files and can be deleted on its own"""
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+    return dst
+
+def _link_follower(book_id, leader_id):
+    """🪢 Record on both books that book_id rides along on leader_id's render"""
+    leader = books.update(leader_id, mutate=lambda book: book.setdefault("linked_ids", []).append(book_id))
+    return books.update(book_id, linked_to=leader_id, seed=leader.get("seed"))
+
+def _hand_over(leader, follower_id):
+    """
+    🎁 Give a follower the leader's finished chapters and book audio
+    
+    The flight's follower list is what counts here - the follower's linked_to
+    may not be written yet if the leader finished right as it joined.
+    """
+    _load_book(follower_id)  # FileNotFoundError if it was deleted while it waited
+    
+    def _own(path):
+        return _share_file(path, path.replace(leader["id"], follower_id)) if path else None
+    
+    chapters = []
+    for chapter in leader.get("chapters", []):
+        chapter = dict(chapter)
+        chapter["text_path"] = _own(chapter["text_path"])
+        if chapter.get("tokens_path"):
+            chapter["tokens_path"] = _own(chapter["tokens_path"]) if os.path.exists(chapter["tokens_path"]) else None
+        if chapter["status"] == "completed":
+            chapter["audio_path"] = _own(chapter.get("audio_path"))
         else:
-            # Generation failed - big oof
-            logging.error(f"Failed to generate audio for book {book_id}")
-            book["status"] = "failed"
+            chapter["status"], chapter["audio_path"] = "failed", None
+        chapters.append(chapter)
+    audio_path = _own(leader.get("audio_path")) if leader["status"] == "completed" else None
+    _update_book(follower_id, status=leader["status"], chapters=chapters, audio_path=audio_path)
+
+def _land_flight(book_id):
+    """🛬 A leading book is done - hand its results to every book that rode along"""
+    followers = flights.land(book_id)
+    if not followers:
+        return
+    try:
+        leader = _load_book(book_id)
+    except FileNotFoundError:
+        leader = {"id": book_id, "status": "failed", "chapters": []}
+    for follower_id in followers:
+        try:
+            _hand_over(leader, follower_id)
+            logging.info(f"Audiobook {follower_id} got its results from identical book {book_id}")
+        except FileNotFoundError:
+            pass  # Follower was deleted while it waited
+        except Exception as e:
+            logging.error(f"Error handing results of {book_id} to {follower_id}: {e}")
+            with contextlib.suppress(Exception):
+                _update_book(follower_id, status="failed")
+
+def _promote_follower(book_id):
+    """
+    👑 A leading book got deleted before it landed - its first follower renders for the flight instead
+    
+    Returns the promoted book (it still needs its render queued), or None if nobody was following.
+    """
+    promoted = flights.promote(book_id)
+    while promoted is not None:
+        leader_id, followers = promoted
+        try:
+            book = _update_book(leader_id, status="pending", linked_to=None, linked_ids=followers)
+        except FileNotFoundError:
+            # Deleted while it waited too - next in line
+            promoted = flights.promote(leader_id)
+            continue
+        for follower_id in followers:
+            with contextlib.suppress(FileNotFoundError):
+                _update_book(follower_id, linked_to=leader_id)
+        logging.info(f"Leader {book_id} was deleted, {leader_id} renders for its {len(followers)} followers now")
+        return book
+    return None
+
+def _assemble_when_done(book_id, futures, profiler=None):
+    """⏳ Assemble the book once the last of its chapter jobs lands"""
+    remaining = [len(futures)]
+    lock = threading.Lock()
+    
+    def _on_done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        try:
+            assemble_audiobook(book_id)
+        except Exception as e:
+            logging.error(f"Error assembling audiobook {book_id}: {e}")
+            _update_book(book_id, status="failed")
+            progress.finish(book_id, "failed")
+        finally:
+            if profiler is not None:
+                _write_profile(book_id, profiler)
+            _land_flight(book_id)
+    
+    for future in futures:
+        future.add_done_callback(_on_done)
+
+def process_audiobook(book_id, source_path, voice_id, user_id="anonymous", seed=0, profile=False, cast=None):
+    """⚙️ Creates audiobook in the background while you chill"""
+    profiler = JobProfiler(book_id, max_chunks=PROFILE_MAX_CHUNKS) if profile else None
+    try:
+        # Update the status to let everyone know we're cooking
+        _update_book(book_id, status="processing")
+        logging.info(f"Starting processing for audiobook {book_id}")
+        
+        # Split the book into chapters - each one is its own job
+        chapters = extract_chapters(source_path, f"data/books/{book_id}_chapter_")
+        for chapter in chapters:
+            chapter["status"] = "pending"
+            chapter["audio_path"] = None
+        
+        # Every chunk of every chapter through the tokenizer in batches, instead of one encode per chunk later
+        if PRETOKENIZE:
+            try:
+                _pretokenize_chapters(chapters, voice_id, cast)
+            except Exception as e:
+                logging.error(f"Pre-tokenizing book {book_id} failed, chunks get tokenized as they render: {e}")
+                for chapter in chapters:
+                    for key in ("tokens_path", "chunks", "text_tokens"):
+                        chapter.pop(key, None)
+        _update_book(book_id, chapters=chapters)
+        logging.info(f"Book {book_id} split into {len(chapters)} chapters")
+        _start_progress(book_id, chapters, cast)
         
-        with open(f"data/books/{book_id}.json", "w") as f:
-            json.dump(book, f)
+        # Setup voice cloning if we have a sample
+        context = _load_voice_context(voice_id)
         
+        # Hand every chapter to the scheduler as a bulk job
+        futures = [
+            scheduler.submit(
+                render_chapter(book_id, chapter, context, voice_id, seed, profiler, cast),
+                user_id=user_id,
+                priority=BULK,
+                name=f"{book_id}/chapter-{chapter['index']}"
+            )
+            for chapter in chapters
+        ]
+        _assemble_when_done(book_id, futures, profiler)
         return True
     except Exception as e:
         logging.error(f"Error processing audiobook {book_id}: {e}")
         
         # Update status to failed - we tried
+        progress.finish(book_id, "failed")
         try:
-            with open(f"data/books/{book_id}.json", "r") as f:
-                book = json.load(f)
-            
-            book["status"] = "failed"
-            
-            with open(f"data/books/{book_id}.json", "w") as f:
-                json.dump(book, f)
+            _update_book(book_id, status="failed")
         except Exception as nested_e:
             logging.error(f"Failed to update book status after error: {nested_e}")
+        _land_flight(book_id)
         
         return False
 
+def rerender_chapter(book_id, index, seed=None):
+    """
+    🔁 Queues a single chapter for another go, then re-assembles the book
+    
+    Same seed = the exact same audio again; pass a new one for a different take.
+    """
+    book = _update_book(book_id, status="processing")
+    if seed is not None:
+        book = _update_chapter(book_id, index, seed=seed)
+    chapter = book["chapters"][index]
+    cast = book.get("cast")
+    _start_progress(book_id, [chapter], cast)
+    context = _load_voice_context(book.get("voice_id", 0))
+    future = scheduler.submit(
+        render_chapter(
+            book_id, chapter, context, book.get("voice_id", 0), chapter.get("seed", book.get("seed", 0)), cast=cast
+        ),
+        user_id=book.get("user_id", "anonymous"),
+        priority=BULK,
+        name=f"{book_id}/chapter-{index}"
+    )
+    _assemble_when_done(book_id, [future])
+
 # 🛣️ API Routes - where the requests go
 
+@app.on_event("startup")
+def prewarm_generator():
+    """🔥 Warm the shared generator in the background so previews are fast from the start"""
+    if PREWARM_MODEL:
+        threading.Thread(target=generator.warm_up, name="generator-warm-up", daemon=True).start()
+
 @app.get("/")
 def read_root():
     """👋 Just saying hi - API health check"""
@@ -345,7 +1175,11 @@ async def create_audiobook(
     author: str = Form(...),
     voice_id: int = Form(0),
     text_file: Optional[UploadFile] = File(None),
-    text_content: Optional[str] = Form(None)
+    text_content: Optional[str] = Form(None),
+    seed: Optional[int] = Form(None),
+    profile: bool = Form(False),
+    cast: Optional[str] = Form(None),
+    user_id: str = Header("anonymous", alias="X-User-Id")
 ):
     """🆕 Drop a new audiobook project - from text to speech"""
     try:
@@ -353,25 +1187,42 @@ async def create_audiobook(
         if not text_file and not text_content:
             raise HTTPException(status_code=400, detail="Either text_file or text_content is required")
         
+        # 🎭 Who reads what - {"narrator": 0, "dialogue": 1, "Alice": 2}; no cast = one voice for everything
+        if cast:
+            try:
+                cast = parse_cast(cast, default_voice=voice_id)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid cast: {e}")
+        else:
+            cast = None
+        
         # Generate that unique ID
         book_id = str(uuid.uuid4())
+        
+        # No seed? Pick one anyway and remember it, so the book can be replayed bit for bit
+        # (an explicit seed changes the audio, a picked one doesn't - only the former is part of the fingerprint)
+        requested_seed = seed
+        if seed is None:
+            seed = _new_seed()
         date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         # Handle uploaded file if that's what we got
         if text_file:
-            # Save the file
-            text_path = f"data/books/{book_id}.txt"
-            with open(text_path, "wb") as f:
-                shutil.copyfileobj(text_file.file, f)
+            # Keep the extension - it tells us how to find the chapters
+            extension = os.path.splitext(text_file.filename or "")[1].lower() or ".txt"
+            if extension not in SUPPORTED_EXTENSIONS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unsupported file type {extension}, use one of {sorted(SUPPORTED_EXTENSIONS)}"
+                )
             
-            # Extract the text
-            with open(text_path, "r", encoding="utf-8") as f:
-                text_content = f.read()
+            # Stream the file to disk
+            text_path = f"data/books/{book_id}{extension}"
+            await _save_upload(text_file, text_path)
         else:
             # Just save the text directly
             text_path = f"data/books/{book_id}.txt"
-            with open(text_path, "w", encoding="utf-8") as f:
-                f.write(text_content)
+            await run_in_threadpool(_write_text, text_path, text_content)
         
         # Create the book info
         book = {
@@ -381,27 +1232,133 @@ async def create_audiobook(
             "voice_id": voice_id,
             "date": date_str,
             "status": "pending",
-            "text_path": text_path
+            "text_path": text_path,
+            "user_id": user_id,
+            "seed": seed,
+            "profile": profile,
+            "cast": cast
         }
         
-        with open(f"data/books/{book_id}.json", "w") as f:
-            json.dump(book, f)
+        await run_in_threadpool(books.create, book)
+        
+        # 🪢 Same text, voice and settings already rendering? Ride along instead of rendering it twice
+        fingerprint = await run_in_threadpool(
+            job_fingerprint, text_path, voice_id=voice_id, seed=requested_seed, profile=profile, cast=cast
+        )
+        leader_id = flights.join(fingerprint, book_id)
+        if leader_id is not None:
+            try:
+                book = await run_in_threadpool(_link_follower, book_id, leader_id)
+                return JSONResponse(content={
+                    "message": "Identical audiobook already in progress, attached to it",
+                    "book_id": book_id,
+                    "linked_to": leader_id,
+                    "seed": book["seed"]
+                })
+            except FileNotFoundError:
+                # Leader got deleted under us - leave its flight and just render it ourselves
+                flights.leave(book_id)
+                logging.info(f"Leader {leader_id} vanished, rendering {book_id} on its own")
         
         # Process in the background - no waiting
-        background_tasks.add_task(process_audiobook, book_id, text_content, voice_id)
+        background_tasks.add_task(process_audiobook, book_id, text_path, voice_id, user_id, seed, profile, cast)
         
-        return JSONResponse(content={"message": "Audiobook creation started", "book_id": book_id})
+        return JSONResponse(content={"message": "Audiobook creation started", "book_id": book_id, "seed": seed})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating audiobook: {str(e)}")
 
+@app.post("/preview")
+async def preview_voice(
+    text: str = Form(...),
+    voice_id: int = Form(0),
+    seed: Optional[int] = Form(None),
+    user_id: str = Header("anonymous", alias="X-User-Id")
+):
+    """🎧 Hear a voice right now - just the first sentence, no book required"""
+    snippet = preview_text(text, PREVIEW_MAX_CHARS)
+    if not snippet:
+        raise HTTPException(status_code=400, detail="Preview text is empty")
+    
+    started = time.perf_counter()
+    future = None
+    try:
+        context = await run_in_threadpool(_load_voice_context, voice_id)
+        
+        # Interactive class - cuts ahead of every bulk book chunk on the shared model
+        future = scheduler.submit(
+            run_once(
+                generator.generate,
+                text=snippet,
+                speaker=0,
+                context=context,
+                max_audio_length_ms=PREVIEW_MAX_AUDIO_MS,
+                voice_key=f"voice_{voice_id}",
+                seed=seed if seed is not None else _new_seed()
+            ),
+            user_id=user_id,
+            priority=INTERACTIVE,
+            name="preview"
+        )
+        audio = await asyncio.wait_for(asyncio.wrap_future(future), timeout=PREVIEW_TIMEOUT_S)
+        if audio is None:
+            raise RuntimeError("generator returned no audio")
+        
+        if POSTPROCESS_AUDIO:
+            postprocessor = AudioPostProcessor(generator.sample_rate, target_lufs=TARGET_LUFS)
+            audio = await run_in_threadpool(postprocessor.process, audio)
+        wav_bytes = await run_in_threadpool(generator.encode_wav, audio)
+        elapsed_ms = int((time.perf_counter() - started) * 1000)
+        logging.info(f"Preview for voice {voice_id} rendered in {elapsed_ms}ms")
+        return Response(content=wav_bytes, media_type="audio/wav", headers={"X-Render-Time-Ms": str(elapsed_ms)})
+    except asyncio.TimeoutError:
+        # Still waiting in line? Then don't bother rendering it at all
+        future.cancel()
+        raise HTTPException(status_code=504, detail=f"Preview took longer than {PREVIEW_TIMEOUT_S}s")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rendering preview: {str(e)}")
+
+@app.post("/voice/upload")
+async def upload_voice(
+    file: UploadFile = File(...),
+    voice_id: int = Form(...),
+    transcript: Optional[str] = Form(None)
+):
+    """🎤 Register a voice sample - it gets trimmed down to a short, representative reference"""
+    if voice_id < 0:
+        raise HTTPException(status_code=400, detail="voice_id must be a non-negative integer")
+    extension = os.path.splitext(file.filename or "")[1].lower() or ".wav"
+    upload_path = f"data/voices/upload_{uuid.uuid4()}{extension}"
+    try:
+        await _save_upload(file, upload_path)
+        meta = await run_in_threadpool(_register_voice, voice_id, upload_path, transcript)
+        return JSONResponse(content=meta)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error registering voice: {str(e)}")
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(upload_path)
+
+@app.get("/voices")
+async def get_voices():
+    """🎤 Every registered voice, with how long its reference is and what it costs to prefill"""
+    return await run_in_threadpool(list_meta)
+
 @app.get("/audiobook/{book_id}")
-def get_audiobook(book_id: str):
+async def get_audiobook(book_id: str):
     """📖 Get the deets on a specific book"""
     try:
         # Load that book info
-        with open(f"data/books/{book_id}.json", "r") as f:
-            book = json.load(f)
+        book = await run_in_threadpool(_load_book, book_id)
         
+        # Riding along on another render? Its status is our status until the results come over
+        if book.get("linked_to") and book["status"] == "pending":
+            with contextlib.suppress(FileNotFoundError):
+                leader = await run_in_threadpool(_load_book, book["linked_to"])
+                book["status"] = leader["status"]
         return book
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Audiobook not found")
@@ -409,12 +1366,11 @@ def get_audiobook(book_id: str):
         raise HTTPException(status_code=500, detail=f"Error retrieving audiobook: {str(e)}")
 
 @app.get("/audiobook/{book_id}/audio")
-def get_audiobook_audio(book_id: str):
+async def get_audiobook_audio(book_id: str):
     """🔊 Get the actual audio file - for the ears"""
     try:
         # Check the book info
-        with open(f"data/books/{book_id}.json", "r") as f:
-            book = json.load(f)
+        book = await run_in_threadpool(_load_book, book_id)
         
         # Make sure it's ready
         if book["status"] != "completed" or not book.get("audio_path"):
@@ -431,16 +1387,157 @@ def get_audiobook_audio(book_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving audiobook audio: {str(e)}")
 
+def _find_chapter(book, index):
+    """🔎 Grab a chapter entry or 404"""
+    chapters = book.get("chapters", [])
+    if index < 0 or index >= len(chapters):
+        raise HTTPException(status_code=404, detail="Chapter not found")
+    return chapters[index]
+
+@app.get("/audiobook/{book_id}/chapters")
+async def get_audiobook_chapters(book_id: str):
+    """📑 Get the chapter index - titles, status and audio for each"""
+    try:
+        book = await run_in_threadpool(_load_book, book_id)
+        return {"chapters": book.get("chapters", [])}
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Audiobook not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving chapters: {str(e)}")
+
+@app.get("/audiobook/{book_id}/chapters/{index}/audio")
+async def get_chapter_audio(book_id: str, index: int):
+    """🔉 Get one chapter's audio - no need to wait for the whole book"""
+    try:
+        book = await run_in_threadpool(_load_book, book_id)
+        chapter = _find_chapter(book, index)
+        
+        # Make sure it's ready
+        if chapter["status"] != "completed" or not chapter.get("audio_path"):
+            raise HTTPException(status_code=400, detail="Chapter is not yet completed")
+        
+        # Send the file
+        return FileResponse(
+            chapter["audio_path"],
+            media_type="audio/wav",
+            filename=f"{book['title']} - {index + 1:03d} {chapter['title']}.wav"
+        )
+    except HTTPException:
+        raise
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Audiobook not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving chapter audio: {str(e)}")
+
+@app.post("/audiobook/{book_id}/chapters/{index}/render")
+async def render_audiobook_chapter(
+    book_id: str,
+    index: int,
+    background_tasks: BackgroundTasks,
+    seed: Optional[int] = None
+):
+    """🔁 Re-render just one chapter - for when a single chapter flops"""
+    try:
+        book = await run_in_threadpool(_load_book, book_id)
+        _find_chapter(book, index)
+        
+        background_tasks.add_task(rerender_chapter, book_id, index, seed)
+        return {"message": "Chapter re-render started", "book_id": book_id, "chapter": index}
+    except HTTPException:
+        raise
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Audiobook not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error re-rendering chapter: {str(e)}")
+
+@app.get("/status")
+def get_status():
+    """🩺 What the generator is running on - backend, device and the autotuned dtype / threads"""
+    return {
+        "backend": generator.backend,
+        "device": str(generator.device),
+        "model_loaded": generator.model_loaded,
+        "torch_threads": torch.get_num_threads(),
+        "torch_interop_threads": torch.get_num_interop_threads(),
+        "autotune": generator.autotuner.result,
+        "worker_processes": generator.pool.workers if generator.pool is not None else 0,
+        "batch_slots": generator.batcher.max_slots if generator.batcher is not None else 0,
+    }
+
+@app.get("/queue")
+def get_queue():
+    """🚦 Peek at the synthesis queue - who's waiting and who's used what"""
+    stats = scheduler.stats()
+    if generator.batcher is not None:
+        stats["batch"] = generator.batcher.stats()
+    # Leading book -> identical books riding along on its render
+    stats["coalesced"] = flights.in_flight()
+    return stats
+
+def _sse(snapshot, as_book_id=None):
+    if as_book_id is not None:
+        snapshot = {**snapshot, "book_id": as_book_id}
+    return f"event: progress\ndata: {json.dumps(snapshot)}\n\n"
+
+async def _progress_events(book_id, initial, as_book_id=None):
+    """📡 SSE stream of progress snapshots - book_id None means every book"""
+    queue = progress.subscribe(book_id)
+    try:
+        for snapshot in initial:
+            yield _sse(snapshot, as_book_id)
+        if book_id is not None and initial and initial[0]["status"] in TERMINAL_STATUSES:
+            return
+        while True:
+            try:
+                snapshot = await asyncio.wait_for(queue.get(), timeout=PROGRESS_KEEPALIVE_S)
+            except asyncio.TimeoutError:
+                # Comment line - keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            yield _sse(snapshot, as_book_id)
+            if book_id is not None and snapshot["status"] in TERMINAL_STATUSES:
+                return
+    finally:
+        progress.unsubscribe(queue, book_id)
+
+@app.get("/audiobook/{book_id}/progress")
+async def stream_book_progress(book_id: str):
+    """📡 Live chunks done / total, frames/sec and ETA for one book (Server-Sent Events)"""
+    source_id = book_id
+    snapshot = progress.snapshot(book_id)
+    if snapshot is None:
+        try:
+            book = await run_in_threadpool(_load_book, book_id)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Audiobook not found")
+        # Riding along on another render - that render's progress is ours
+        if book.get("linked_to") and book["status"] == "pending":
+            snapshot = progress.snapshot(book["linked_to"])
+            if snapshot is not None:
+                source_id = book["linked_to"]
+        if snapshot is None:
+            # Not rendering since the server started - just report where the metadata says it is
+            snapshot = {"book_id": book_id, "status": book["status"]}
+    return StreamingResponse(
+        _progress_events(source_id, [snapshot], as_book_id=book_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@app.get("/progress")
+async def stream_all_progress():
+    """📡 Live progress for every book the server is tracking (Server-Sent Events)"""
+    return StreamingResponse(
+        _progress_events(None, progress.snapshots()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
 @app.get("/audiobooks/")
-def get_audiobooks():
+async def get_audiobooks():
     """📚 Get all the books - the whole collection"""
     try:
-        audiobooks = []
-        for filename in os.listdir("data/books"):
-            if filename.endswith(".json"):
-                with open(f"data/books/{filename}", "r") as f:
-                    book = json.load(f)
-                    audiobooks.append(book)
+        audiobooks = await run_in_threadpool(_list_books)
         
         # Newest vibes first
         audiobooks.sort(key=lambda x: x["date"], reverse=True)
@@ -449,32 +1546,22 @@ def get_audiobooks():
         raise HTTPException(status_code=500, detail=f"Error retrieving audiobooks: {str(e)}")
 
 @app.delete("/audiobook/{book_id}")
-def delete_audiobook(book_id: str):
+async def delete_audiobook(book_id: str, background_tasks: BackgroundTasks):
     """🗑️ Yeet a book into oblivion - delete forever"""
     try:
-        # Find the book
-        book_path = f"data/books/{book_id}.json"
-        if not os.path.exists(book_path):
-            raise HTTPException(status_code=404, detail="Audiobook not found")
-            
-        with open(book_path, "r") as f:
-            book = json.load(f)
-        
-        # Delete the audio if it exists
-        if book.get("audio_path") and os.path.exists(book["audio_path"]):
-            os.remove(book["audio_path"])
-        
-        # Delete the text file
-        if book.get("text_path") and os.path.exists(book["text_path"]):
-            os.remove(book["text_path"])
-        
-        # Delete the metadata
-        os.remove(book_path)
+        # 🪢 Others riding along on this one? The first of them takes over before the render goes down
+        flights.leave(book_id)
+        promoted = await run_in_threadpool(_promote_follower, book_id)
+        if promoted is not None:
+            background_tasks.add_task(
+                process_audiobook, promoted["id"], promoted["text_path"], promoted.get("voice_id", 0),
+                promoted.get("user_id", "anonymous"), promoted.get("seed", 0), promoted.get("profile", False),
+                promoted.get("cast")
+            )
         
-        # Clean up any leftover audio chunks
-        for filename in os.listdir("data/audio"):
-            if filename.startswith(f"{book_id}_"):
-                os.remove(f"data/audio/{filename}")
+        # Find the book and wipe its files off disk
+        await run_in_threadpool(_remove_book_files, book_id)
+        progress.forget(book_id)
         
         return {"message": "Audiobook deleted successfully"}
     except FileNotFoundError:
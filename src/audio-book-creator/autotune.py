@@ -0,0 +1,232 @@
+"""
+🏎️ Startup Autotuner 🏎️
+Picks the fastest dtype and thread count for this particular box.
+
+bf16 flies on CPUs with native bf16 (AVX512-BF16 / AMX) and on most GPUs,
+but on plenty of CPUs it's emulated and way slower than fp32. Thread
+counts are the same story. So instead of guessing we time a few real
+Model.generate_frame steps per candidate and keep the winner.
+
+Results are saved per host fingerprint (CPU, core count, GPU, torch
+version), so each machine benchmarks once and every later start just
+loads its answer.
+
+Switching dtypes back and forth is lossless for the real model because
+the CSM checkpoint is loaded as bf16 to begin with. A trial in another
+dtype is undone as soon as it's timed, so a losing fp32 run never leaves
+the model at twice its size, and on a GPU fp32 is only tried if the
+bigger copy fits in free memory.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import platform
+import statistics
+import threading
+import time
+
+import torch
+
+# 🧪 How much work one candidate gets - enough to be stable, cheap enough for startup
+PROMPT_TOKENS = 32
+WARMUP_FRAMES = 2
+TIMED_FRAMES = 6
+
+DTYPES = {"fp32": torch.float32, "bf16": torch.bfloat16}
+
+# 💾 Spare GPU memory to keep on top of a bigger-dtype trial (KV caches, activations)
+TRIAL_HEADROOM_BYTES = 512 * 1024 * 1024
+
+
+def _cpu_flags():
+    """🔎 The bits of /proc/cpuinfo that matter for bf16 (empty off Linux)"""
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    flags = set(line.split(":", 1)[1].split())
+                    return sorted(flags & {"avx2", "avx512f", "avx512_bf16", "amx_bf16", "amx_tile"})
+    except OSError:
+        pass
+    return []
+
+
+def host_fingerprint(device):
+    """🪪 Stable id for 'this kind of machine' - same hardware + same torch = same answer"""
+    parts = {
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "cpu_flags": _cpu_flags(),
+        "torch": torch.__version__,
+        "device": str(device),
+    }
+    if str(device).startswith("cuda") and torch.cuda.is_available():
+        parts["gpu"] = torch.cuda.get_device_name(torch.device(device))
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:16], parts
+
+
+def _thread_candidates():
+    cpus = os.cpu_count() or 1
+    return sorted({max(1, cpus), max(1, cpus // 2), max(1, cpus // 4)}, reverse=True)
+
+
+def _dtype_candidates(device):
+    if str(device).startswith("cuda"):
+        return ["bf16", "fp32"] if torch.cuda.is_bf16_supported() else ["fp32"]
+    return ["fp32", "bf16"]
+
+
+def _fits(model, device, dtype_name):
+    """💾 Would the model still fit on its GPU in this dtype? (always yes on the CPU)"""
+    if not str(device).startswith("cuda"):
+        return True
+    current = sum(p.numel() * p.element_size() for p in model.parameters())
+    needed = sum(p.numel() for p in model.parameters()) * DTYPES[dtype_name].itemsize
+    free, _ = torch.cuda.mem_get_info(torch.device(device))
+    return needed - current + TRIAL_HEADROOM_BYTES <= free
+
+
+def _restore_dtype(model, device, dtype):
+    """↩️ Back to the dtype we started with - and hand the trial's memory back to the GPU"""
+    model.to(dtype=dtype)
+    model.setup_caches(1)
+    if str(device).startswith("cuda"):
+        torch.cuda.empty_cache()
+
+
+@torch.inference_mode()
+def _time_frames(model, device):
+    """⏱️ Median ms for one generate_frame on a throwaway text-only prompt"""
+    num_codebooks = model.args.audio_num_codebooks
+    tokens = torch.zeros(1, PROMPT_TOKENS, num_codebooks + 1, dtype=torch.long, device=device)
+    tokens[0, :, -1] = torch.randint(0, model.args.text_vocab_size, (PROMPT_TOKENS,), device=device)
+    tokens_mask = torch.zeros_like(tokens, dtype=torch.bool)
+    tokens_mask[0, :, -1] = True
+    input_pos = torch.arange(0, PROMPT_TOKENS, device=device).unsqueeze(0)
+
+    model.ensure_cache_capacity(PROMPT_TOKENS + WARMUP_FRAMES + TIMED_FRAMES + 1)
+    timings = []
+    for i in range(WARMUP_FRAMES + TIMED_FRAMES):
+        started = time.perf_counter()
+        sample = model.generate_frame(tokens, tokens_mask, input_pos, 0.9, 50)
+        if str(device).startswith("cuda"):
+            torch.cuda.synchronize()
+        if i >= WARMUP_FRAMES:
+            timings.append((time.perf_counter() - started) * 1000)
+
+        # Feed the frame back in like the real loop does
+        tokens = torch.cat([sample, torch.zeros(1, 1, dtype=sample.dtype, device=device)], dim=1).unsqueeze(1).long()
+        tokens_mask = torch.cat(
+            [torch.ones_like(sample, dtype=torch.bool), torch.zeros(1, 1, dtype=torch.bool, device=device)], dim=1
+        ).unsqueeze(1)
+        input_pos = input_pos[:, -1:] + 1
+    return statistics.median(timings)
+
+
+def _apply(model, dtype_name, threads, interop_threads):
+    """🔧 Put the model and torch into the chosen configuration"""
+    model.to(dtype=DTYPES[dtype_name])
+    model.setup_caches(1)
+    if threads:
+        torch.set_num_threads(threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Only settable before the first inter-op parallel call - fine, the intra-op count is what matters
+            pass
+
+
+class Autotuner:
+    """🏎️ Benchmark once per host, remember forever"""
+
+    def __init__(self, path="data/autotune.json"):
+        self.path = path
+        self.result = None
+        self._lock = threading.Lock()
+
+    def _load_all(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logging.error(f"Couldn't read autotune results from {self.path}: {e}")
+            return {}
+
+    def _save(self, fingerprint, result):
+        with self._lock:
+            results = self._load_all()
+            results[fingerprint] = result
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(results, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def tune(self, model, device, force=False):
+        """🏁 Configure `model` (a models.Model) for this host - from the saved result, or by benchmarking"""
+        fingerprint, host = host_fingerprint(device)
+        cpu = not str(device).startswith("cuda")
+
+        saved = None if force else self._load_all().get(fingerprint)
+        if saved is not None and not _fits(model, device, saved["dtype"]):
+            logging.info(f"Autotune: saved {saved['dtype']} no longer fits in free GPU memory, re-benchmarking")
+            saved = None
+        if saved is not None:
+            _apply(model, saved["dtype"], saved.get("threads"), saved.get("interop_threads"))
+            self.result = {**saved, "source": "saved"}
+            logging.info(
+                f"Autotune: using saved {saved['dtype']} x {saved.get('threads')} threads for host {fingerprint}"
+            )
+            return self.result
+
+        candidates = []
+        original_dtype = next(model.parameters()).dtype
+        for dtype_name in _dtype_candidates(device):
+            if not _fits(model, device, dtype_name):
+                logging.info(f"Autotune: {dtype_name} won't fit in free GPU memory, skipping it")
+                continue
+            try:
+                _apply(model, dtype_name, None, None)
+                for threads in (_thread_candidates() if cpu else [None]):
+                    if threads:
+                        torch.set_num_threads(threads)
+                    ms = _time_frames(model, device)
+                    candidates.append({"dtype": dtype_name, "threads": threads, "ms_per_frame": round(ms, 2)})
+                    logging.info(f"Autotune: {dtype_name} x {threads} threads -> {ms:.1f} ms/frame")
+            except Exception as e:
+                # Some builds just don't do bf16 on some CPUs - skip it rather than die
+                logging.warning(f"Autotune: {dtype_name} failed ({e}), skipping it")
+            finally:
+                # Don't sit in the trial dtype - the winner gets applied once everything's timed
+                if DTYPES[dtype_name] != original_dtype:
+                    _restore_dtype(model, device, original_dtype)
+
+        if not candidates:
+            raise RuntimeError("Autotune: no candidate configuration ran")
+
+        best = min(candidates, key=lambda c: c["ms_per_frame"])
+        interop_threads = max(1, (os.cpu_count() or 1) // best["threads"]) if best["threads"] else None
+        _apply(model, best["dtype"], best["threads"], interop_threads)
+
+        result = {
+            "fingerprint": fingerprint,
+            "host": host,
+            "dtype": best["dtype"],
+            "threads": best["threads"],
+            "interop_threads": interop_threads,
+            "ms_per_frame": best["ms_per_frame"],
+            "candidates": candidates,
+            "tuned_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        try:
+            self._save(fingerprint, result)
+        except Exception as e:
+            logging.error(f"Couldn't save autotune results to {self.path}: {e}")
+        self.result = {**result, "source": "benchmark"}
+        logging.info(f"Autotune: picked {best['dtype']} x {best['threads']} threads ({best['ms_per_frame']} ms/frame)")
+        return self.result
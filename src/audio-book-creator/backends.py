@@ -0,0 +1,366 @@
+"""
+🔌 Synthesis Backends 🔌
+Whatever CSMGenerator speaks through. Every backend has a `sample_rate`
+and a `generate(text, speaker, context, max_audio_length_ms, ..., seed)`
+that returns a mono audio tensor, same as generator.Generator - split
+into `generate_tokens(...)` (codebook frames) and `decode_tokens(tokens)`
+(codec + watermark) so the two halves can run on different threads.
+Both take an optional `context_key` naming the context, so back-to-back
+calls with the same voice reference skip re-prefilling it, and optional
+`text_tokens` when the text was already encoded (see pretokenize.py).
+
+- csm:  the real thing - Sesame CSM-1b from the Hugging Face checkpoint
+- tiny: the real Generator + Model code path with a randomly initialized
+        toy-sized Model and offline stand-ins for the tokenizer, Mimi and
+        the watermarker. No network, no checkpoint, runs on any CPU.
+- stub: no model at all. Sleeps through a per-token / per-frame cost
+        profile, so queueing, scheduling and API throughput can be
+        load-tested on a laptop. The built-in numbers are estimates; to
+        get real ones, time the csm backend on your box with
+        `python backends.py --calibrate profile.json` and point
+        STUB_PROFILE at the file.
+
+Pick one with CSM_BACKEND (default "csm").
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import statistics
+import time
+
+import torch
+
+from duration import DEFAULT_MS_PER_PHONEME, estimate_phonemes
+
+BACKENDS = ("csm", "tiny", "stub")
+
+# 🎞️ CSM frames are 80ms of 24kHz audio
+FRAME_MS = 80
+SAMPLE_RATE = 24000
+SAMPLES_PER_FRAME = SAMPLE_RATE * FRAME_MS // 1000
+NUM_CODEBOOKS = 32
+
+# ⏱️ Ballpark cost profile for the stub - `python backends.py --calibrate` measures real ones for STUB_PROFILE
+DEFAULT_STUB_PROFILE = {
+    "load_ms": 0.0,
+    "prefill_ms_per_token": 0.4,
+    "frame_ms": 45.0,
+    "frame_ms_per_1k_positions": 6.0,
+    "decode_ms_per_audio_second": 25.0,
+    "watermark_ms_per_audio_second": 35.0,
+}
+
+# 🔬 Calibration - two prompt lengths, so per-token and per-position costs fall out as slopes
+CALIBRATE_PROMPTS = (128, 1024)
+CALIBRATE_FRAMES = 8
+CALIBRATE_AUDIO_S = 5.0
+
+
+class ByteTokenizer:
+    """🔤 Offline text tokenizer - UTF-8 bytes plus BOS/EOS, good enough for the tiny model"""
+
+    bos_token_id = 256
+    eos_token_id = 257
+    vocab_size = 258
+
+    def encode(self, text):
+        return [self.bos_token_id, *text.encode("utf-8"), self.eos_token_id]
+
+
+class StubAudioCodec:
+    """🎛️ Stand-in for Mimi - same shapes and frame rate, tones instead of a neural codec"""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, num_codebooks=NUM_CODEBOOKS):
+        self.sample_rate = sample_rate
+        self.num_codebooks = num_codebooks
+        self.samples_per_frame = sample_rate * FRAME_MS // 1000
+
+    def encode(self, audio):
+        """(B, 1, T) audio -> (B, K, frames) tokens, from per-frame loudness"""
+        b = audio.size(0)
+        frames = max(1, audio.size(-1) // self.samples_per_frame)
+        usable = audio[..., : frames * self.samples_per_frame].reshape(b, frames, -1)
+        if usable.size(-1) == 0:
+            usable = torch.zeros(b, frames, 1, device=audio.device)
+        level = (usable.float().pow(2).mean(dim=-1).sqrt() * 2000).long()
+        offsets = torch.arange(self.num_codebooks, device=audio.device).view(1, -1, 1) * 7
+        return (level.unsqueeze(1) + offsets) % 2048
+
+    def decode(self, tokens):
+        """(B, K, frames) tokens -> (B, 1, frames * samples_per_frame) audio"""
+        b, k, frames = tokens.shape
+        t = torch.arange(self.samples_per_frame, device=tokens.device).float() / self.sample_rate
+        freq = 90.0 + (tokens[:, 0, :].float() % 256) * 1.5
+        amp = 0.05 + 0.25 * ((tokens[:, min(1, k - 1), :].float() % 64) / 63.0)
+        audio = amp.unsqueeze(-1) * torch.sin(2 * math.pi * freq.unsqueeze(-1) * t)
+        return audio.reshape(b, 1, -1)
+
+
+class NullWatermarker:
+    """🚫 Stand-in for silentcipher - passes audio through so the offline path still runs watermark()"""
+
+    def encode_wav(self, audio, sample_rate, key, calc_sdr=False, message_sdr=None):
+        return audio, None
+
+    def decode_wav(self, audio, sample_rate, phase_shift_decoding=True):
+        return {"status": False, "messages": []}
+
+
+class StubBackend:
+    """⏱️ Latency-faithful fake - costs what the real model costs, computes nothing"""
+
+    def __init__(self, profile=None):
+        self.profile = {**DEFAULT_STUB_PROFILE, **(profile or {})}
+        self.codec = StubAudioCodec()
+        self.sample_rate = self.codec.sample_rate
+        # Like Generator: the last context's prefill is still "in the cache"
+        self._cached_context = None
+        self._pause(self.profile["load_ms"], time.perf_counter())
+
+    @staticmethod
+    def _pause(ms, deadline):
+        """😴 Sleep until deadline + ms - deadline-based so many small waits don't drift"""
+        deadline += ms / 1000.0
+        remaining = deadline - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        return deadline
+
+    def _prompt_tokens(self, text, speaker, context):
+        """(context tokens, text tokens) - Llama BPE averages ~4 characters a token, context audio 12.5 frames/s"""
+        context_tokens = 0
+        for segment in context:
+            context_tokens += len(segment.text) // 4 + 2
+            context_tokens += segment.audio.numel() // SAMPLES_PER_FRAME + 1
+        return context_tokens, len(f"[{speaker}]{text}") // 4 + 2
+
+    def encode_texts(self, texts, speakers):
+        """🔤 Placeholder ids, as many as the real tokenizer would give - only the count matters here"""
+        return [[0] * (len(f"[{speaker}]{text}") // 4 + 2) for text, speaker in zip(texts, speakers)]
+
+    def generate(
+        self,
+        text,
+        speaker,
+        context,
+        max_audio_length_ms=90_000,
+        temperature=0.9,
+        topk=50,
+        stop_on_runaway=True,
+        seed=None,
+        context_key=None,
+        text_tokens=None,
+    ):
+        tokens = self.generate_tokens(
+            text, speaker, context, max_audio_length_ms, temperature, topk, stop_on_runaway, seed, context_key,
+            text_tokens,
+        )
+        return self.decode_tokens(tokens)
+
+    def generate_tokens(
+        self,
+        text,
+        speaker,
+        context,
+        max_audio_length_ms=90_000,
+        temperature=0.9,
+        topk=50,
+        stop_on_runaway=True,
+        seed=None,
+        context_key=None,
+        text_tokens=None,
+    ):
+        p = self.profile
+        deadline = time.perf_counter()
+
+        context_tokens, text_token_count = self._prompt_tokens(text, speaker, context)
+        if text_tokens is not None:
+            text_token_count = len(text_tokens)
+        prompt_tokens = context_tokens + text_token_count
+        reused = context_tokens if context_key is not None and context_key == self._cached_context else 0
+        self._cached_context = context_key
+        deadline = self._pause((prompt_tokens - reused) * p["prefill_ms_per_token"], deadline)
+
+        # Stop where the real model would usually hit EOS
+        expected_frames = int(estimate_phonemes(text) * DEFAULT_MS_PER_PHONEME / FRAME_MS)
+        frames = max(1, min(int(max_audio_length_ms / FRAME_MS), expected_frames))
+        for i in range(frames):
+            position = prompt_tokens + i
+            deadline = self._pause(p["frame_ms"] + p["frame_ms_per_1k_positions"] * position / 1000, deadline)
+
+        rng = None
+        if seed is not None:
+            rng = torch.Generator()
+            rng.manual_seed(seed)
+        return torch.randint(1, 2048, (1, NUM_CODEBOOKS, frames), generator=rng)
+
+    def decode_tokens(self, tokens):
+        deadline = time.perf_counter()
+        audio = self.codec.decode(tokens).squeeze(0).squeeze(0)
+
+        seconds = tokens.size(-1) * FRAME_MS / 1000
+        p = self.profile
+        self._pause((p["decode_ms_per_audio_second"] + p["watermark_ms_per_audio_second"]) * seconds, deadline)
+        return audio
+
+
+def _load_csm(device, hf_token=None):
+    from huggingface_hub import hf_hub_download
+    from generator import load_csm_1b
+
+    # Yoink the model from HF
+    model_path = hf_hub_download(repo_id="sesame/csm-1b", filename="ckpt.pt", token=hf_token)
+    return load_csm_1b(model_path, device)
+
+
+def _load_tiny(device, seed=0):
+    from generator import Generator
+    from models import Model, ModelArgs
+
+    tokenizer = ByteTokenizer()
+    model_args = ModelArgs(
+        backbone_flavor="llama-tiny",
+        decoder_flavor="llama-tiny",
+        text_vocab_size=tokenizer.vocab_size,
+        audio_vocab_size=2051,
+        audio_num_codebooks=NUM_CODEBOOKS,
+    )
+    torch.manual_seed(seed)
+    model = Model(model_args)
+    # audio_head is created with torch.empty - give it real numbers
+    torch.nn.init.normal_(model.audio_head, std=0.02)
+    model = model.to(device=device, dtype=torch.float32)
+
+    return Generator(
+        model,
+        text_tokenizer=tokenizer,
+        audio_tokenizer=StubAudioCodec(),
+        watermarker=NullWatermarker(),
+    )
+
+
+def _load_stub_profile(path):
+    if not path:
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def load_backend(name, device, hf_token=None):
+    """🔌 Build the named backend"""
+    if name == "csm":
+        return _load_csm(device, hf_token)
+    if name == "tiny":
+        return _load_tiny(device)
+    if name == "stub":
+        return StubBackend(_load_stub_profile(os.environ.get("STUB_PROFILE")))
+    raise ValueError(f"Unknown backend {name!r}, pick one of {BACKENDS}")
+
+
+def backend_from_env():
+    name = os.environ.get("CSM_BACKEND", "csm").lower()
+    if name not in BACKENDS:
+        logging.warning(f"Unknown CSM_BACKEND {name!r}, falling back to csm")
+        name = "csm"
+    return name
+
+
+def _timed_ms(fn, device):
+    """⏱️ Wall time of fn() in ms, waiting for the GPU to actually finish"""
+    started = time.perf_counter()
+    result = fn()
+    if str(device).startswith("cuda"):
+        torch.cuda.synchronize()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def _text_prompt(model, length, device):
+    """📝 A throwaway text-only prompt of `length` positions"""
+    tokens = torch.zeros(1, length, model.args.audio_num_codebooks + 1, dtype=torch.long, device=device)
+    tokens[0, :, -1] = torch.randint(0, model.args.text_vocab_size, (length,), device=device)
+    tokens_mask = torch.zeros_like(tokens, dtype=torch.bool)
+    tokens_mask[0, :, -1] = True
+    return tokens, tokens_mask
+
+
+@torch.inference_mode()
+def calibrate_stub_profile(generator, load_ms=0.0):
+    """
+    🔬 Time a real generator.Generator and return the matching stub profile
+
+    Prefill is timed at two prompt lengths and frames at two positions, so
+    prefill_ms_per_token, frame_ms and frame_ms_per_1k_positions come from
+    a straight line through the two points. Decode and watermark are timed
+    on CALIBRATE_AUDIO_S of audio.
+    """
+    from watermarking import CSM_1B_GH_WATERMARK, watermark
+
+    model, device = generator._model, generator.device
+    prefill_ms, frame_ms = [], []
+    for length in CALIBRATE_PROMPTS:
+        model.ensure_cache_capacity(length + CALIBRATE_FRAMES + 2)
+        tokens, tokens_mask = _text_prompt(model, length, device)
+        input_pos = torch.arange(0, length, device=device).unsqueeze(0)
+        # Once to warm up, once for real
+        for _ in range(2):
+            ms, _ = _timed_ms(lambda: model.prefill(tokens, tokens_mask, input_pos), device)
+        prefill_ms.append(ms)
+
+        # Then single audio frames right after the prompt, like the real loop
+        frame = torch.ones(1, 1, model.args.audio_num_codebooks + 1, dtype=torch.long, device=device)
+        frame[..., -1] = 0
+        frame_mask = torch.ones_like(frame, dtype=torch.bool)
+        frame_mask[..., -1] = False
+        timings = []
+        for i in range(CALIBRATE_FRAMES + 1):
+            position = torch.tensor([[length + i]], device=device)
+            ms, _ = _timed_ms(lambda: model.generate_frame(frame, frame_mask, position, 0.9, 50), device)
+            timings.append(ms)
+        frame_ms.append(statistics.median(timings[1:]))
+
+    span = CALIBRATE_PROMPTS[1] - CALIBRATE_PROMPTS[0]
+    prefill_per_token = max(0.0, (prefill_ms[1] - prefill_ms[0]) / span)
+    frame_per_position = max(0.0, (frame_ms[1] - frame_ms[0]) / span)
+    frame_base = max(0.0, frame_ms[0] - frame_per_position * CALIBRATE_PROMPTS[0])
+
+    frames = int(CALIBRATE_AUDIO_S * 1000 / FRAME_MS)
+    tokens = torch.randint(1, 2048, (1, model.args.audio_num_codebooks, frames), device=device)
+    for _ in range(2):
+        decode_ms, audio = _timed_ms(lambda: generator._audio_tokenizer.decode(tokens).squeeze(0).squeeze(0), device)
+    for _ in range(2):
+        watermark_ms, _ = _timed_ms(
+            lambda: watermark(generator._watermarker, audio, generator.sample_rate, CSM_1B_GH_WATERMARK), device
+        )
+
+    return {
+        "load_ms": round(load_ms, 1),
+        "prefill_ms_per_token": round(prefill_per_token, 4),
+        "frame_ms": round(frame_base, 2),
+        "frame_ms_per_1k_positions": round(frame_per_position * 1000, 2),
+        "decode_ms_per_audio_second": round(decode_ms / CALIBRATE_AUDIO_S, 2),
+        "watermark_ms_per_audio_second": round(watermark_ms / CALIBRATE_AUDIO_S, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a STUB_PROFILE measured off a real backend on this box")
+    parser.add_argument("--calibrate", required=True, metavar="PROFILE_JSON", help="Where to write the profile")
+    parser.add_argument("--backend", default="csm", choices=("csm", "tiny"))
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generator = load_backend(args.backend, args.device, os.environ.get("HF_TOKEN"))
+    profile = calibrate_stub_profile(generator, load_ms=(time.perf_counter() - started) * 1000)
+
+    with open(f"{args.calibrate}.part", "w") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(f"{args.calibrate}.part", args.calibrate)
+    print(json.dumps(profile, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Iteration-level (continuous) batching for Generator.
+
+One engine thread owns the Model and a slot KV cache with `max_slots` rows, as long as the
+longest prompt + audio budget seen so far. Each loop iteration it:
+
+1. admits queued sequences into free slots - a prefill that also samples their first frame,
+2. runs one batched frame for every occupied slot, each at its own position with its own
+   temperature, topk and RNG,
+3. retires sequences that hit EOS, a runaway tail or their frame budget, freeing the slot
+   for the next admission.
+
+Sequences from any number of callers come and go at frame boundaries, so slots don't sit
+idle while one long chunk finishes. Callers block on a Future, same as Generator.generate_tokens.
+
+Sequences submitted with a context_key (a voice reference) share its prefill: once one row holds
+that context's KV entries, the next sequence with the same key copies them into its own row and
+only prefills its text.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+import torch
+from torch.profiler import record_function
+from generator import Generator, Segment, _runaway_frames
+
+
+@dataclass
+class _Sequence:
+    future: Future
+    prompt_tokens: torch.Tensor
+    prompt_tokens_mask: torch.Tensor
+    max_frames: int
+    temperature: float
+    topk: int
+    stop_on_runaway: bool
+    rng: Optional[torch.Generator]
+    context_key: Optional[Hashable] = None
+    prefix_len: int = 0
+    slot: int = -1
+    position: int = 0
+    last_sample: Optional[torch.Tensor] = None
+    samples: List[torch.Tensor] = field(default_factory=list)
+    codebook0: List[int] = field(default_factory=list)
+
+
+class ContinuousBatcher:
+    def __init__(self, generator: Generator, max_slots: int = 4):
+        if max_slots < 1:
+            raise ValueError("Need at least one batch slot")
+        self._generator = generator
+        self._model = generator._model
+        self._model.setup_caches(max_slots)
+        self.max_slots = max_slots
+        self.device = generator.device
+
+        self._slots: List[Optional[_Sequence]] = [None] * max_slots
+        # (context_key, length) of the prompt prefix each cache row currently holds
+        self._row_prefix: List[Optional[Tuple[Hashable, int]]] = [None] * max_slots
+        self._prefix_hits = 0
+        self._prefill_tokens_saved = 0
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._frames = 0
+        self._steps = 0
+        self._busy_s = 0.0
+
+        self._thread = threading.Thread(target=self._loop, name="continuous-batcher", daemon=True)
+        self._thread.start()
+        logging.info(f"Continuous batcher up with {max_slots} slots")
+
+    def submit(
+        self,
+        text: str,
+        speaker: int,
+        context: List[Segment],
+        max_audio_length_ms: float = 90_000,
+        temperature: float = 0.9,
+        topk: int = 50,
+        stop_on_runaway: bool = True,
+        seed: Optional[int] = None,
+        context_key: Optional[Hashable] = None,
+        text_tokens: Optional[Sequence[int]] = None,
+    ) -> Future:
+        """Queue a sequence; the Future resolves to (1, audio_num_codebooks, frames) tokens."""
+        max_audio_frames = int(max_audio_length_ms / 80)
+        # Tokenizing (and Mimi-encoding the context) happens on the caller's thread, off the engine loop
+        prompt_tokens, prompt_tokens_mask, prefix_len = self._generator.tokenize_prompt(
+            text, speaker, context, max_audio_frames, context_key, text_tokens
+        )
+
+        rng = None
+        if seed is not None:
+            rng = torch.Generator(device=self.device)
+            rng.manual_seed(seed)
+
+        sequence = _Sequence(
+            future=Future(),
+            prompt_tokens=prompt_tokens,
+            prompt_tokens_mask=prompt_tokens_mask,
+            max_frames=max_audio_frames,
+            temperature=temperature,
+            topk=topk,
+            stop_on_runaway=stop_on_runaway,
+            rng=rng,
+            context_key=context_key,
+            prefix_len=prefix_len,
+        )
+        with self._cond:
+            self._pending.append(sequence)
+            self._cond.notify()
+        return sequence.future
+
+    def generate_tokens(self, *args, **kwargs) -> torch.Tensor:
+        """Same call as Generator.generate_tokens, batched with whatever else is in flight."""
+        return self.submit(*args, **kwargs).result()
+
+    def stats(self) -> dict:
+        with self._cond:
+            active = sum(1 for s in self._slots if s is not None)
+            pending = len(self._pending)
+        return {
+            "slots": self.max_slots,
+            "active": active,
+            "pending": pending,
+            "frames": self._frames,
+            "mean_batch": round(self._frames / self._steps, 2) if self._steps else None,
+            "frames_per_sec": round(self._frames / self._busy_s, 2) if self._busy_s else None,
+            "prefix_hits": self._prefix_hits,
+            "prefill_tokens_saved": self._prefill_tokens_saved,
+        }
+
+    def _admit(self) -> List[_Sequence]:
+        """Move queued sequences into free slots, lowest slot first so occupied rows stay packed."""
+        admitted = []
+        with self._cond:
+            while not self._pending and all(s is None for s in self._slots):
+                self._cond.wait()
+            for slot, occupant in enumerate(self._slots):
+                if occupant is not None:
+                    continue
+                while self._pending:
+                    sequence = self._pending.popleft()
+                    if sequence.future.set_running_or_notify_cancel():
+                        sequence.slot = slot
+                        self._slots[slot] = sequence
+                        admitted.append(sequence)
+                        break
+                if not self._pending:
+                    break
+        return admitted
+
+    def _loop(self):
+        while True:
+            admitted = self._admit()
+            started = time.perf_counter()
+            with torch.inference_mode():
+                for sequence in admitted:
+                    try:
+                        self._prefill(sequence)
+                    except Exception as e:
+                        logging.error(f"Prefill failed: {e}")
+                        self._fail(sequence, e)
+                try:
+                    self._step()
+                except Exception as e:
+                    logging.error(f"Batched generation failed: {e}")
+                    for sequence in [s for s in self._slots if s is not None]:
+                        self._fail(sequence, e)
+            self._busy_s += time.perf_counter() - started
+
+    def _reuse_prefix(self, sequence: _Sequence) -> int:
+        """
+        Where the sequence's prefill can start: past its context, copied from a row that already holds
+        it or prefilled on its own - the same entries either way, so reuse never changes seeded audio.
+        """
+        wanted = (sequence.context_key, sequence.prefix_len)
+        if sequence.context_key is None or not sequence.prefix_len:
+            return 0
+        if self._row_prefix[sequence.slot] != wanted:
+            source = next((row for row, prefix in enumerate(self._row_prefix) if prefix == wanted), None)
+            if source is None:
+                self._model.prefill(
+                    sequence.prompt_tokens[:sequence.prefix_len].unsqueeze(0),
+                    sequence.prompt_tokens_mask[:sequence.prefix_len].unsqueeze(0),
+                    torch.arange(0, sequence.prefix_len, device=self.device).unsqueeze(0),
+                    torch.tensor([sequence.slot], device=self.device),
+                )
+                return sequence.prefix_len
+            self._model.copy_cache_prefix(source, sequence.slot, sequence.prefix_len)
+        self._prefix_hits += 1
+        self._prefill_tokens_saved += sequence.prefix_len
+        return sequence.prefix_len
+
+    def _prefill(self, sequence: _Sequence):
+        """Run the prompt through the sequence's own slot and sample its first frame."""
+        n = sequence.prompt_tokens.size(0)
+        # Grows (never shrinks) the shared cache - rows already generating keep their entries
+        self._model.ensure_cache_capacity(n + sequence.max_frames)
+        start = self._reuse_prefix(sequence)
+        self._row_prefix[sequence.slot] = None
+        sample = self._model.generate_frames(
+            sequence.prompt_tokens[start:].unsqueeze(0),
+            sequence.prompt_tokens_mask[start:].unsqueeze(0),
+            torch.arange(start, n, device=self.device).unsqueeze(0),
+            torch.tensor([sequence.slot], device=self.device),
+            torch.tensor([sequence.temperature], device=self.device),
+            torch.tensor([sequence.topk], device=self.device),
+            [sequence.rng],
+        )
+        if sequence.context_key is not None and sequence.prefix_len:
+            self._row_prefix[sequence.slot] = (sequence.context_key, sequence.prefix_len)
+        sequence.position = n
+        self._accept(sequence, sample)
+
+    def _step(self):
+        """One frame for every occupied slot, over rows 0..last occupied so caches are sliced, not gathered."""
+        occupied = [s for s in self._slots if s is not None]
+        if not occupied:
+            return
+        rows = max(s.slot for s in occupied) + 1
+        num_codebooks = self._model.args.audio_num_codebooks
+
+        tokens = torch.zeros(rows, 1, num_codebooks + 1, dtype=torch.long, device=self.device)
+        tokens_mask = torch.zeros(rows, 1, num_codebooks + 1, dtype=torch.bool, device=self.device)
+        input_pos = torch.zeros(rows, 1, dtype=torch.long, device=self.device)
+        temperature = torch.ones(rows, device=self.device)
+        topk = torch.ones(rows, dtype=torch.long, device=self.device)
+        generators: List[Optional[torch.Generator]] = [None] * rows
+        # Free rows inside the range just scribble on their own slot at position 0 - it's rewritten on admission,
+        # but whatever prefix that row held is gone
+        for slot in range(rows):
+            if self._slots[slot] is None:
+                self._row_prefix[slot] = None
+        for s in occupied:
+            tokens[s.slot, 0, :-1] = s.last_sample[0]
+            tokens_mask[s.slot, 0, :-1] = True
+            input_pos[s.slot, 0] = s.position
+            temperature[s.slot] = s.temperature
+            topk[s.slot] = s.topk
+            generators[s.slot] = s.rng
+
+        with record_function("generate_frames"):
+            samples = self._model.generate_frames(tokens, tokens_mask, input_pos, None, temperature, topk, generators)
+        self._steps += 1
+        for s in occupied:
+            s.position += 1
+            self._accept(s, samples[s.slot : s.slot + 1])
+
+    def _accept(self, sequence: _Sequence, sample: torch.Tensor):
+        """Record a sampled (1, audio_num_codebooks) frame and retire the sequence if it's done."""
+        if torch.all(sample == 0):
+            self._retire(sequence)  # eos
+            return
+
+        sequence.samples.append(sample)
+        self._frames += 1
+
+        if sequence.stop_on_runaway:
+            sequence.codebook0.append(int(sample[0, 0]))
+            runaway = _runaway_frames(sequence.codebook0, self._generator.silence_tokens)
+            if runaway:
+                sequence.samples = sequence.samples[:-runaway]
+                self._retire(sequence)
+                return
+
+        if len(sequence.samples) >= sequence.max_frames:
+            self._retire(sequence)
+            return
+        sequence.last_sample = sample
+
+    def _retire(self, sequence: _Sequence):
+        with self._cond:
+            self._slots[sequence.slot] = None
+        if sequence.samples:
+            tokens = torch.stack(sequence.samples).permute(1, 2, 0)
+        else:
+            num_codebooks = self._model.args.audio_num_codebooks
+            tokens = torch.zeros(1, num_codebooks, 0, dtype=torch.long, device=self.device)
+        sequence.future.set_result(tokens)
+
+    def _fail(self, sequence: _Sequence, error: Exception):
+        with self._cond:
+            self._slots[sequence.slot] = None
+        if not sequence.future.done():
+            sequence.future.set_exception(error)
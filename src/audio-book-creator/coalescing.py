@@ -0,0 +1,126 @@
+"""
+🪢 Request Coalescing 🪢
+Retries, double clicks and fan-out mean the same book often gets
+submitted several times within seconds. Rendering it once per submission
+burns GPU time for identical audio, so identical in-flight jobs share
+one render (single-flight):
+
+- every submission gets a fingerprint: its normalized text plus the
+  voice and generation parameters that change the audio
+- the first submission with a fingerprint leads - it actually renders
+- later ones with the same fingerprint, while the leader is still pending
+  or processing, follow it - no render of their own
+- when the leader finishes, its results are handed to every follower
+- when the leader is deleted first, its first follower takes over and
+  renders for the rest
+
+Only in-flight work is shared. Once the leader is done, the next identical
+submission renders from scratch, like it always did.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from text_processing import _CHAR_TABLE, _WHITESPACE_PATTERN
+
+# 📄 Formats we fingerprint by their text - everything else by its bytes
+_TEXT_FORMATS = {".txt": "text", ".md": "markdown", ".markdown": "markdown"}
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _hash_text(path, digest):
+    """🧽 Hash text the way it'll be read - typography and spacing don't change the audio"""
+    started, blank = False, False
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        for line in f:
+            line = _WHITESPACE_PATTERN.sub(" ", line.translate(_CHAR_TABLE)).strip()
+            if not line:
+                blank = started
+                continue
+            # Blank lines can separate chapters - keep that there was one, not how many
+            if blank:
+                digest.update(b"\n")
+            digest.update(line.encode("utf-8") + b"\n")
+            started, blank = True, False
+
+
+def job_fingerprint(text_path, **params):
+    """🪪 Fingerprint of a submission - same text + same params = same audio"""
+    extension = os.path.splitext(text_path)[1].lower()
+    digest = hashlib.sha256()
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8") + b"\0")
+    if extension in _TEXT_FORMATS:
+        digest.update(_TEXT_FORMATS[extension].encode("utf-8") + b"\0")
+        _hash_text(text_path, digest)
+    else:
+        digest.update(extension.encode("utf-8") + b"\0")
+        with open(text_path, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """🪢 Who's rendering what - fingerprint -> leading book, plus the books following it"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leaders = {}  # fingerprint -> leader book_id
+        self._flights = {}  # leader book_id -> (fingerprint, [follower book_ids])
+
+    def join(self, fingerprint, book_id):
+        """🙋 Lead a new flight (returns None) or follow the one in the air (returns its leader)"""
+        with self._lock:
+            leader = self._leaders.get(fingerprint)
+            if leader is None:
+                self._leaders[fingerprint] = book_id
+                self._flights[book_id] = (fingerprint, [])
+                return None
+            self._flights[leader][1].append(book_id)
+            return leader
+
+    def land(self, leader):
+        """🛬 The leader is done - close its flight and hand back its followers"""
+        with self._lock:
+            flight = self._flights.pop(leader, None)
+            if flight is None:
+                return []
+            fingerprint, followers = flight
+            if self._leaders.get(fingerprint) == leader:
+                del self._leaders[fingerprint]
+            return followers
+
+    def leave(self, book_id):
+        """🚪 A follower backs out - it won't be handed anything when its leader lands"""
+        with self._lock:
+            for _, followers in self._flights.values():
+                if book_id in followers:
+                    followers.remove(book_id)
+                    return
+
+    def promote(self, leader):
+        """
+        👑 The leader is gone without landing - its first follower takes over the flight
+
+        Returns (new leader, its followers), or None if nobody was following.
+        """
+        with self._lock:
+            flight = self._flights.pop(leader, None)
+            if flight is None:
+                return None
+            fingerprint, followers = flight
+            if self._leaders.get(fingerprint) == leader:
+                del self._leaders[fingerprint]
+            if not followers:
+                return None
+            new_leader, followers = followers[0], followers[1:]
+            self._leaders[fingerprint] = new_leader
+            self._flights[new_leader] = (fingerprint, followers)
+            return new_leader, list(followers)
+
+    def in_flight(self):
+        with self._lock:
+            return {leader: list(followers) for leader, (_, followers) in self._flights.items()}
@@ -0,0 +1,144 @@
+"""
+🎭 Dialogue & Cast 🎭
+Splits a chapter into who-says-what, so quoted dialogue can be read by a
+different voice than the narration.
+
+A book's cast maps roles to voice ids:
+
+    {"narrator": 0, "dialogue": 1, "Alice": 2, "Bob": 3}
+
+- narrator: everything outside quotes (defaults to the book's voice_id)
+- dialogue: quoted lines we can't pin on a named character (defaults to
+  the narrator)
+- any other key: a character. A quote goes to them when the narration
+  right before or after it says so - `"Run!" shouted Bob.` or
+  `Alice said, "Hello."`
+
+Runs on top of the normal text pipeline (after normalization, so every
+kind of double quote is already a plain ").
+"""
+
+import json
+import re
+
+from text_processing import (
+    MAX_CHUNK_CHARS,
+    _split_long_sentence,
+    iter_decoded,
+    iter_normalized,
+    iter_sentences,
+)
+
+NARRATOR = "narrator"
+DIALOGUE = "dialogue"
+
+# 🗣️ Verbs that pin a quote on whoever is named next to them
+_SPEECH_VERBS = (
+    "said|says|asked|asks|replied|replies|answered|whispered|shouted|yelled|cried|called|"
+    "muttered|murmured|added|continued|exclaimed|snapped|sighed|laughed|began|told"
+)
+# `... said Alice` / `... Alice said` right after a quote
+_AFTER_PATTERN = re.compile(
+    rf"^\W*(?:(?:{_SPEECH_VERBS})\s+([A-Z][\w'-]*)|([A-Z][\w'-]*)\s+(?:{_SPEECH_VERBS})\b)"
+)
+# `Alice said, ...` / `said Alice: ...` right before a quote
+_BEFORE_PATTERN = re.compile(
+    rf"(?:([A-Z][\w'-]*)\s+(?:{_SPEECH_VERBS})|(?:{_SPEECH_VERBS})\s+([A-Z][\w'-]*))\W*$"
+)
+
+
+def parse_cast(raw, default_voice=0):
+    """📜 Cast map from a JSON string or dict - role name -> voice id. ValueError if it's off"""
+    cast = json.loads(raw) if isinstance(raw, str) else dict(raw or {})
+    if not isinstance(cast, dict):
+        raise ValueError("cast must be a JSON object of role -> voice_id")
+    parsed = {}
+    for role, voice_id in cast.items():
+        if not isinstance(role, str) or not role.strip():
+            raise ValueError("cast roles must be non-empty names")
+        if not isinstance(voice_id, int) or isinstance(voice_id, bool) or voice_id < 0:
+            raise ValueError(f"cast voice for {role!r} must be a voice_id (non-negative integer)")
+        parsed[role.strip()] = voice_id
+    parsed.setdefault(NARRATOR, default_voice)
+    parsed.setdefault(DIALOGUE, parsed[NARRATOR])
+    return parsed
+
+
+def speaker_ids(cast):
+    """🔢 Voice id -> CSM speaker id: narrator's voice is 0, the rest in cast order"""
+    speakers = {cast[NARRATOR]: 0}
+    for voice_id in cast.values():
+        speakers.setdefault(voice_id, len(speakers))
+    return speakers
+
+
+def _iter_pieces(sentences):
+    """✂️ Sentences -> (is_quote, text) pieces, tracking open quotes across sentences"""
+    in_quote = False
+    for sentence in sentences:
+        parts = sentence.split('"')
+        for i, part in enumerate(parts):
+            if i:
+                in_quote = not in_quote
+            part = part.strip()
+            if part and any(c.isalnum() for c in part):
+                yield in_quote, part
+
+
+def _speaker_named(match, characters):
+    if match is None:
+        return None
+    name = next(group for group in match.groups() if group)
+    return characters.get(name.lower())
+
+
+def iter_lines(sentences, cast):
+    """🎭 (role, text) for every narration run and quote, roles taken from the cast"""
+    characters = {role.lower(): role for role in cast if role not in (NARRATOR, DIALOGUE)}
+    previous_narration = ""
+    pending = None  # quote waiting to see the narration after it
+
+    for is_quote, text in _iter_pieces(sentences):
+        if is_quote:
+            if pending is not None:
+                yield pending
+            role = _speaker_named(_BEFORE_PATTERN.search(previous_narration), characters)
+            pending = (role or DIALOGUE, text)
+            continue
+
+        if pending is not None:
+            role, quote = pending
+            if role == DIALOGUE:
+                role = _speaker_named(_AFTER_PATTERN.search(text), characters) or DIALOGUE
+            yield role, quote
+            pending = None
+        previous_narration = text
+        yield NARRATOR, text
+
+    if pending is not None:
+        yield pending
+
+
+def iter_dialogue_chunks(path, cast, max_chars=MAX_CHUNK_CHARS):
+    """
+    🚰 Like iter_text_chunks, but each chunk is one voice's - yields (voice_id, text)
+
+    Consecutive lines in the same voice are packed together up to max_chars,
+    so a narrator paragraph is still one chunk, not one per sentence.
+    """
+    sentences = iter_sentences(iter_normalized(iter_decoded(path)))
+    voice, chunk = None, ""
+    for role, text in iter_lines(sentences, cast):
+        line_voice = cast.get(role, cast[DIALOGUE])
+        if line_voice != voice and chunk:
+            yield voice, chunk
+            chunk = ""
+        voice = line_voice
+        for part in _split_long_sentence(text, max_chars):
+            if chunk and len(chunk) + 1 + len(part) > max_chars:
+                yield voice, chunk
+                chunk = part
+            else:
+                chunk = f"{chunk} {part}" if chunk else part
+    if chunk:
+        yield voice, chunk
@@ -0,0 +1,101 @@
+"""
+⏱️ Duration Estimator ⏱️
+Guesses how long a chunk of text will take to say, so the generator's
+max_audio_length_ms cap sits just above reality instead of minutes past it.
+
+The guess starts from a phoneme count (roughly, from letters and tokens)
+and a speaking rate per voice that's learned from every generation that
+ends on its own.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+
+# 🗣️ Out-of-the-box speaking rate - about 13 phonemes a second
+DEFAULT_MS_PER_PHONEME = 75.0
+
+# 🧮 English averages a bit under one phoneme per letter; every token is at least a couple
+PHONEMES_PER_LETTER = 0.8
+MIN_PHONEMES_PER_TOKEN = 2.0
+
+# ⏸️ Pauses the model tends to leave at punctuation
+COMMA_PAUSE_MS = 150
+SENTENCE_PAUSE_MS = 350
+
+# 🧢 Cap = expected * margin + pad, clamped to a sane range
+CAP_MARGIN = 1.4
+CAP_PAD_MS = 1000
+MIN_CAP_MS = 2000
+MAX_CAP_MS = 90000
+
+# 📉 How quickly a voice's learned rate follows new observations
+RATE_SMOOTHING = 0.2
+
+_LETTER_PATTERN = re.compile(r"[^\W\d_]")
+_COMMA_PATTERN = re.compile(r"[,;:]")
+_SENTENCE_PATTERN = re.compile(r"[.!?]+")
+
+
+def estimate_phonemes(text, token_count=None):
+    """🔤 Rough phoneme count for some (already normalized) text"""
+    phonemes = len(_LETTER_PATTERN.findall(text)) * PHONEMES_PER_LETTER
+    if token_count:
+        phonemes = max(phonemes, token_count * MIN_PHONEMES_PER_TOKEN)
+    return max(phonemes, 1.0)
+
+
+def _pause_ms(text):
+    return len(_COMMA_PATTERN.findall(text)) * COMMA_PAUSE_MS + len(_SENTENCE_PATTERN.findall(text)) * SENTENCE_PAUSE_MS
+
+
+class DurationEstimator:
+    """📏 Per-voice speaking rates, learned on the fly and kept on disk"""
+
+    def __init__(self, path="data/voices/speaking_rates.json"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._rates = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self._rates = json.load(f)
+            except Exception as e:
+                logging.error(f"Couldn't read speaking rates from {path}: {e}")
+
+    def ms_per_phoneme(self, voice_key):
+        with self._lock:
+            return self._rates.get(voice_key, {}).get("ms_per_phoneme", DEFAULT_MS_PER_PHONEME)
+
+    def estimate_ms(self, text, voice_key="default", token_count=None):
+        """⏱️ Expected spoken length of the text in this voice"""
+        phonemes = estimate_phonemes(text, token_count)
+        return phonemes * self.ms_per_phoneme(voice_key) + _pause_ms(text)
+
+    def cap_ms(self, text, voice_key="default", token_count=None):
+        """🧢 A max_audio_length_ms just above the expected length"""
+        expected = self.estimate_ms(text, voice_key, token_count)
+        return int(min(MAX_CAP_MS, max(MIN_CAP_MS, expected * CAP_MARGIN + CAP_PAD_MS)))
+
+    def observe(self, text, voice_key, audio_ms, token_count=None):
+        """📈 Learn from a generation that ended on its own (not one that hit the cap)"""
+        speech_ms = audio_ms - _pause_ms(text)
+        if speech_ms <= 0:
+            return
+        observed = speech_ms / estimate_phonemes(text, token_count)
+
+        with self._lock:
+            entry = self._rates.setdefault(voice_key, {"ms_per_phoneme": observed, "samples": 0})
+            if entry["samples"]:
+                entry["ms_per_phoneme"] += RATE_SMOOTHING * (observed - entry["ms_per_phoneme"])
+            entry["samples"] += 1
+
+            try:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(self._rates, f)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logging.error(f"Couldn't save speaking rates to {self.path}: {e}")
@@ -1,16 +1,31 @@
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import AbstractSet, Hashable, List, Optional, Sequence, Tuple
 
 import torch
-import torchaudio
 from huggingface_hub import hf_hub_download
 from models import Model, ModelArgs
 from moshi.models import loaders
+from resampling import resample
 from tokenizers.processors import TemplateProcessing
+from torch.profiler import record_function
 from transformers import AutoTokenizer
 from watermarking import CSM_1B_GH_WATERMARK, load_watermarker, watermark
 
 
+# A missed EOS shows up as a stuck tail: codebook 0 parked on one or two values
+# (a hum) or looping through a short cycle. 75 frames = 6s of audio - far longer
+# than any pause a reader would take. Tails made only of the codec's silence
+# tokens never count: that's a dramatic pause, and the length cap bounds it.
+RUNAWAY_WINDOW_FRAMES = 75
+RUNAWAY_MAX_DISTINCT = 2
+RUNAWAY_MAX_PERIOD = 12
+
+# Mimi-encoded voice contexts kept around, keyed by the caller's context_key
+CONTEXT_CACHE_SIZE = 8
+
+
 @dataclass
 class Segment:
     speaker: int
@@ -36,41 +51,91 @@ def load_llama3_tokenizer():
     return tokenizer
 
 
+def _runaway_frames(codebook0: List[int], silence: AbstractSet[int] = frozenset()) -> int:
+    """
+    Returns how many trailing frames form a runaway tail, or 0 if generation looks healthy.
+    silence: codebook-0 values the codec uses for silence - a tail of only those is a pause, not a runaway.
+    """
+    if len(codebook0) < RUNAWAY_WINDOW_FRAMES:
+        return 0
+
+    window = set(codebook0[-RUNAWAY_WINDOW_FRAMES:])
+    if len(window) <= RUNAWAY_MAX_DISTINCT and not window <= silence:
+        return RUNAWAY_WINDOW_FRAMES
+
+    for period in range(RUNAWAY_MAX_DISTINCT + 1, RUNAWAY_MAX_PERIOD + 1):
+        span = max(RUNAWAY_WINDOW_FRAMES, 3 * period)
+        if len(codebook0) < span:
+            break
+        tail = codebook0[-span:]
+        if all(tail[i] == tail[i - period] for i in range(period, span)) and not set(tail) <= silence:
+            return span
+
+    return 0
+
+
 class Generator:
     def __init__(
         self,
         model: Model,
+        text_tokenizer=None,
+        audio_tokenizer=None,
+        watermarker=None,
     ):
+        """
+        text_tokenizer, audio_tokenizer and watermarker default to Llama 3.2, Mimi and
+        silentcipher; pass stand-ins to run without downloads (see backends.py).
+        """
         self._model = model
         self._model.setup_caches(1)
 
-        self._text_tokenizer = load_llama3_tokenizer()
+        self._text_tokenizer = text_tokenizer if text_tokenizer is not None else load_llama3_tokenizer()
 
         device = next(model.parameters()).device
-        mimi_weight = hf_hub_download(loaders.DEFAULT_REPO, loaders.MIMI_NAME)
-        mimi = loaders.get_mimi(mimi_weight, device=device)
-        mimi.set_num_codebooks(32)
-        self._audio_tokenizer = mimi
+        if audio_tokenizer is None:
+            mimi_weight = hf_hub_download(loaders.DEFAULT_REPO, loaders.MIMI_NAME)
+            audio_tokenizer = loaders.get_mimi(mimi_weight, device=device)
+            audio_tokenizer.set_num_codebooks(32)
+        self._audio_tokenizer = audio_tokenizer
 
-        self._watermarker = load_watermarker(device=device)
+        self._watermarker = watermarker if watermarker is not None else load_watermarker(device=device)
 
-        self.sample_rate = mimi.sample_rate
+        self.sample_rate = audio_tokenizer.sample_rate
         self.device = device
-
-    def _tokenize_text_segment(self, text: str, speaker: int) -> Tuple[torch.Tensor, torch.Tensor]:
-        frame_tokens = []
-        frame_masks = []
-
-        text_tokens = self._text_tokenizer.encode(f"[{speaker}]{text}")
-        text_frame = torch.zeros(len(text_tokens), 33).long()
-        text_frame_mask = torch.zeros(len(text_tokens), 33).bool()
-        text_frame[:, -1] = torch.tensor(text_tokens)
+        self.silence_tokens = self._silence_tokens()
+
+        self._context_tokens: "OrderedDict[Hashable, Tuple[torch.Tensor, torch.Tensor]]" = OrderedDict()
+        self._context_lock = threading.Lock()
+        # (context_key, prefix length, cache) whose prefix row 0 of the backbone cache currently holds
+        self._cached_prefix: Optional[Tuple[Hashable, int, torch.nn.Module]] = None
+
+    def encode_texts(self, texts: Sequence[str], speakers: Sequence[int]) -> List[List[int]]:
+        """Text tokens of many `[speaker]text` segments, in one batch call for fast tokenizers."""
+        prompts = [f"[{speaker}]{text}" for text, speaker in zip(texts, speakers)]
+        if callable(self._text_tokenizer):
+            return self._text_tokenizer(prompts)["input_ids"]
+        return [self._text_tokenizer.encode(prompt) for prompt in prompts]
+
+    def _tokenize_text_segment(
+        self, text: str, speaker: int, text_tokens: Optional[Sequence[int]] = None
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """text_tokens: the already encoded `[speaker]text` (see encode_texts), if the caller has them."""
+        if text_tokens is None:
+            text_tokens = self._text_tokenizer.encode(f"[{speaker}]{text}")
+        text_tokens = torch.as_tensor(text_tokens, device=self.device).long()
+
+        text_frame = torch.zeros(text_tokens.size(0), 33, dtype=torch.long, device=self.device)
+        text_frame_mask = torch.zeros(text_tokens.size(0), 33, dtype=torch.bool, device=self.device)
+        text_frame[:, -1] = text_tokens
         text_frame_mask[:, -1] = True
 
-        frame_tokens.append(text_frame.to(self.device))
-        frame_masks.append(text_frame_mask.to(self.device))
+        return text_frame, text_frame_mask
 
-        return torch.cat(frame_tokens, dim=0), torch.cat(frame_masks, dim=0)
+    @torch.inference_mode()
+    def _silence_tokens(self) -> AbstractSet[int]:
+        """Codebook-0 values the codec gives half a second of silence - what a pause looks like."""
+        silence = torch.zeros(1, 1, self.sample_rate // 2, device=self.device)
+        return frozenset(self._audio_tokenizer.encode(silence)[0, 0].tolist())
 
     def _tokenize_audio(self, audio: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
         frame_tokens = []
@@ -103,6 +168,65 @@ class Generator:
 
         return torch.cat([text_tokens, audio_tokens], dim=0), torch.cat([text_masks, audio_masks], dim=0)
 
+    def tokenize_context(
+        self, context: List[Segment], context_key: Optional[Hashable] = None
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Context segments as prompt frames. With a context_key the result is cached, so the same
+        voice reference isn't Mimi-encoded again for every chunk.
+
+        Returns:
+            (context_len, 33), (context_len, 33)
+        """
+        if context_key is not None:
+            with self._context_lock:
+                cached = self._context_tokens.get(context_key)
+                if cached is not None:
+                    self._context_tokens.move_to_end(context_key)
+                    return cached
+
+        tokens = [torch.zeros(0, 33, dtype=torch.long, device=self.device)]
+        tokens_mask = [torch.zeros(0, 33, dtype=torch.bool, device=self.device)]
+        for segment in context:
+            segment_tokens, segment_tokens_mask = self._tokenize_segment(segment)
+            tokens.append(segment_tokens)
+            tokens_mask.append(segment_tokens_mask)
+        result = torch.cat(tokens, dim=0).long(), torch.cat(tokens_mask, dim=0).bool()
+
+        if context_key is not None:
+            with self._context_lock:
+                self._context_tokens[context_key] = result
+                while len(self._context_tokens) > CONTEXT_CACHE_SIZE:
+                    self._context_tokens.popitem(last=False)
+        return result
+
+    def tokenize_prompt(
+        self,
+        text: str,
+        speaker: int,
+        context: List[Segment],
+        max_audio_frames: int,
+        context_key: Optional[Hashable] = None,
+        text_tokens: Optional[Sequence[int]] = None,
+    ) -> Tuple[torch.Tensor, torch.Tensor, int]:
+        """
+        Context segments followed by the text to speak (pre-encoded if text_tokens is given).
+
+        Returns:
+            (seq_len, 33), (seq_len, 33), and the length of the context prefix
+        """
+        context_tokens, context_tokens_mask = self.tokenize_context(context, context_key)
+        gen_segment_tokens, gen_segment_tokens_mask = self._tokenize_text_segment(text, speaker, text_tokens)
+
+        prompt_tokens = torch.cat([context_tokens, gen_segment_tokens], dim=0).long().to(self.device)
+        prompt_tokens_mask = torch.cat([context_tokens_mask, gen_segment_tokens_mask], dim=0).bool().to(self.device)
+
+        max_seq_len = 2048 - max_audio_frames
+        if prompt_tokens.size(0) >= max_seq_len:
+            raise ValueError(f"Inputs too long, must be below max_seq_len - max_audio_frames: {max_seq_len}")
+
+        return prompt_tokens, prompt_tokens_mask, context_tokens.size(0)
+
     @torch.inference_mode()
     def generate(
         self,
@@ -112,58 +236,128 @@ class Generator:
         max_audio_length_ms: float = 90_000,
         temperature: float = 0.9,
         topk: int = 50,
+        stop_on_runaway: bool = True,
+        seed: Optional[int] = None,
+        context_key: Optional[Hashable] = None,
+        text_tokens: Optional[Sequence[int]] = None,
     ) -> torch.Tensor:
-        self._model.reset_caches()
+        tokens = self.generate_tokens(
+            text, speaker, context, max_audio_length_ms, temperature, topk, stop_on_runaway, seed, context_key,
+            text_tokens,
+        )
+        return self.decode_tokens(tokens)
 
-        max_audio_frames = int(max_audio_length_ms / 80)
-        tokens, tokens_mask = [], []
-        for segment in context:
-            segment_tokens, segment_tokens_mask = self._tokenize_segment(segment)
-            tokens.append(segment_tokens)
-            tokens_mask.append(segment_tokens_mask)
-
-        gen_segment_tokens, gen_segment_tokens_mask = self._tokenize_text_segment(text, speaker)
-        tokens.append(gen_segment_tokens)
-        tokens_mask.append(gen_segment_tokens_mask)
+    @torch.inference_mode()
+    def generate_tokens(
+        self,
+        text: str,
+        speaker: int,
+        context: List[Segment],
+        max_audio_length_ms: float = 90_000,
+        temperature: float = 0.9,
+        topk: int = 50,
+        stop_on_runaway: bool = True,
+        seed: Optional[int] = None,
+        context_key: Optional[Hashable] = None,
+        text_tokens: Optional[Sequence[int]] = None,
+    ) -> torch.Tensor:
+        """
+        Backbone + decoder only. Returns (1, audio_num_codebooks, frames) codebook tokens.
 
-        prompt_tokens = torch.cat(tokens, dim=0).long().to(self.device)
-        prompt_tokens_mask = torch.cat(tokens_mask, dim=0).bool().to(self.device)
+        context_key names the context (e.g. a voice reference). Consecutive calls with the same key
+        reuse its Mimi encoding and the KV entries its prefill left in the cache. text_tokens skips
+        encoding the text (see encode_texts).
+        """
 
-        samples = []
-        curr_tokens = prompt_tokens.unsqueeze(0)
-        curr_tokens_mask = prompt_tokens_mask.unsqueeze(0)
-        curr_pos = torch.arange(0, prompt_tokens.size(0)).unsqueeze(0).long().to(self.device)
+        # A private RNG makes the same (text, context, seed) give the same frames on the same hardware
+        rng = None
+        if seed is not None:
+            rng = torch.Generator(device=self.device)
+            rng.manual_seed(seed)
 
-        max_seq_len = 2048 - max_audio_frames
-        if curr_tokens.size(1) >= max_seq_len:
-            raise ValueError(f"Inputs too long, must be below max_seq_len - max_audio_frames: {max_seq_len}")
+        max_audio_frames = int(max_audio_length_ms / 80)
+        prompt_tokens, prompt_tokens_mask, prefix_len = self.tokenize_prompt(
+            text, speaker, context, max_audio_frames, context_key, text_tokens
+        )
+        # Size the cache to this prompt + audio budget. Stale entries from the last chunk sit past
+        # our positions and are masked, so there's nothing to reset. Resizing keeps the prefix.
+        self._model.ensure_cache_capacity(prompt_tokens.size(0) + max_audio_frames, shrink=True)
+
+        # Same context as the last call, in the same cache? Its entries are still there - start after them.
+        # Otherwise the prefix is prefilled on its own, so the entries (and the audio) never depend on
+        # whether they were cached.
+        cache = self._model.backbone.layers[0].attn.kv_cache
+        start = 0
+        if context_key is not None and prefix_len:
+            start = prefix_len
+            cached = self._cached_prefix
+            if cached is None or cached[0] != context_key or cached[1] != prefix_len or cached[2] is not cache:
+                self._model.prefill(
+                    prompt_tokens[:prefix_len].unsqueeze(0),
+                    prompt_tokens_mask[:prefix_len].unsqueeze(0),
+                    torch.arange(0, prefix_len, device=self.device).unsqueeze(0),
+                )
+        self._cached_prefix = None
 
-        for _ in range(max_audio_frames):
-            sample = self._model.generate_frame(curr_tokens, curr_tokens_mask, curr_pos, temperature, topk)
+        samples = []
+        codebook0 = []
+        curr_tokens = prompt_tokens[start:].unsqueeze(0)
+        curr_tokens_mask = prompt_tokens_mask[start:].unsqueeze(0)
+        curr_pos = torch.arange(start, prompt_tokens.size(0)).unsqueeze(0).long().to(self.device)
+
+        for i in range(max_audio_frames):
+            with record_function("generate_frame"):
+                sample = self._model.generate_frame(curr_tokens, curr_tokens_mask, curr_pos, temperature, topk, rng)
+            if i == 0 and context_key is not None and prefix_len:
+                # The prompt is in - frames only ever write past it, so the prefix stays valid
+                self._cached_prefix = (context_key, prefix_len, cache)
             if torch.all(sample == 0):
                 break  # eos
 
             samples.append(sample)
 
+            if stop_on_runaway:
+                codebook0.append(int(sample[0, 0]))
+                runaway = _runaway_frames(codebook0, self.silence_tokens)
+                if runaway:
+                    samples = samples[:-runaway]
+                    break
+
             curr_tokens = torch.cat([sample, torch.zeros(1, 1).long().to(self.device)], dim=1).unsqueeze(1)
             curr_tokens_mask = torch.cat(
                 [torch.ones_like(sample).bool(), torch.zeros(1, 1).bool().to(self.device)], dim=1
             ).unsqueeze(1)
             curr_pos = curr_pos[:, -1:] + 1
 
-        audio = self._audio_tokenizer.decode(torch.stack(samples).permute(1, 2, 0)).squeeze(0).squeeze(0)
+        if not samples:
+            num_codebooks = self._model.args.audio_num_codebooks
+            return torch.zeros(1, num_codebooks, 0, dtype=torch.long, device=self.device)
+
+        return torch.stack(samples).permute(1, 2, 0)
+
+    @torch.inference_mode()
+    def decode_tokens(self, tokens: torch.Tensor) -> torch.Tensor:
+        """Mimi decode + watermark. Touches neither the backbone nor the KV caches, so it can
+        run on another thread while the next chunk's tokens are generated."""
+        if tokens.size(-1) == 0:
+            return torch.zeros(0, device=self.device)
+
+        with record_function("mimi_decode"):
+            audio = self._audio_tokenizer.decode(tokens.to(self.device)).squeeze(0).squeeze(0)
 
         # This applies an imperceptible watermark to identify audio as AI-generated.
         # Watermarking ensures transparency, dissuades misuse, and enables traceability.
         # Please be a responsible AI citizen and keep the watermarking in place.
         # If using CSM 1B in another application, use your own private key and keep it secret.
-        audio, wm_sample_rate = watermark(self._watermarker, audio, self.sample_rate, CSM_1B_GH_WATERMARK)
-        audio = torchaudio.functional.resample(audio, orig_freq=wm_sample_rate, new_freq=self.sample_rate)
+        with record_function("watermark"):
+            audio, wm_sample_rate = watermark(self._watermarker, audio, self.sample_rate, CSM_1B_GH_WATERMARK)
+        # watermark() already hands back min(44.1k, our rate) - only convert if that isn't ours
+        audio = resample(audio, wm_sample_rate, self.sample_rate)
 
         return audio
 
 
-def load_csm_1b(ckpt_path: str = "ckpt.pt", device: str = "cuda") -> Generator:
+def load_csm_1b(ckpt_path: str = "ckpt.pt", device: str = "cuda", dtype: torch.dtype = torch.bfloat16) -> Generator:
     model_args = ModelArgs(
         backbone_flavor="llama-1B",
         decoder_flavor="llama-100M",
@@ -171,7 +365,7 @@ def load_csm_1b(ckpt_path: str = "ckpt.pt", device: str = "cuda") -> Generator:
         audio_vocab_size=2051,
         audio_num_codebooks=32,
     )
-    model = Model(model_args).to(device=device, dtype=torch.bfloat16)
+    model = Model(model_args).to(device=device, dtype=dtype)
     state_dict = torch.load(ckpt_path)
     model.load_state_dict(state_dict)
 
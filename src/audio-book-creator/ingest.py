@@ -0,0 +1,309 @@
+"""
+📚 Book Ingestion 📚
+Cracks open .txt, .md, .epub and .pdf files and splits them into chapters.
+
+Each chapter lands in its own plain-text file so it can be rendered,
+served and retried on its own. Text files are read line by line, so
+even a huge manuscript never has to fit in memory.
+"""
+
+import os
+import posixpath
+import re
+import zipfile
+from html.parser import HTMLParser
+from xml.etree import ElementTree
+
+# 📎 What we know how to read
+SUPPORTED_EXTENSIONS = {".txt", ".md", ".markdown", ".epub", ".pdf"}
+
+# 🔖 "Chapter 12", "PART ONE", "Book IV: The Return", "Prologue" - lines that start a new chapter in plain text
+# Just the keyword, or the keyword and a number - a title only after a separator, so prose like
+# "part of him wanted to stay" never counts
+_NUMBER_WORD = (
+    r"(?:one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|thirteen|fourteen|fifteen|sixteen|"
+    r"seventeen|eighteen|nineteen|twenty|thirty|forty|fifty|sixty|seventy|eighty|ninety|hundred)"
+)
+_ROMAN_NUMERAL = r"(?=[mdclxvi])m{0,3}(?:cm|cd|d?c{0,3})(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})"
+_TEXT_HEADING_PATTERN = re.compile(
+    r"^\s*(?:chapter|part|book|prologue|epilogue|interlude)"
+    rf"(?:\s+(?:\d+|{_ROMAN_NUMERAL}|{_NUMBER_WORD}(?:[-\s]{_NUMBER_WORD})*))?"
+    r"(?:\s*[:.\u2013\u2014-]\s*.*|\s*)$",
+    re.IGNORECASE,
+)
+_MAX_HEADING_CHARS = 80
+
+# ✍️ Markdown bits that shouldn't be read out loud
+_MD_HEADING_PATTERN = re.compile(r"^(#{1,2})\s+(.*?)\s*#*\s*$")
+_MD_IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_MD_LINK_PATTERN = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_MD_PREFIX_PATTERN = re.compile(r"^\s*(#{1,6}\s+|>\s?|[-*+]\s+|\d+\.\s+)")
+# Only markers wrapping text at word edges - snake_case_name and 2*3 keep theirs
+_MD_EMPHASIS_PATTERN = re.compile(r"(?<![\w*_~`])(\*\*|__|\*|_|~~|`)(?=\S)(.+?)(?<=\S)\1(?![\w*_~`])")
+
+_OPF_NS = {"opf": "http://www.idpf.org/2007/opf"}
+_CONTAINER_NS = {"c": "urn:oasis:names:tc:opendocument:xmlns:container"}
+
+
+class _ChapterWriter:
+    """
+    🗂️ Writes chapters to numbered text files, skipping any that end up empty
+
+    A chapter's file is only opened once real text shows up for it. A heading
+    line whose chapter never gets any (two headings in a row, or one at the
+    very end) isn't thrown away - it's read out as text instead.
+    """
+
+    def __init__(self, path_prefix):
+        self.path_prefix = path_prefix
+        self.chapters = []
+        self._file = None
+        self._pending = None  # (title, heading line) of a chapter still waiting for text
+        self._carried = []  # heading lines of chapters that never got any
+
+    def start(self, title, heading=None):
+        """heading: the line that started the chapter, if it came from the text itself"""
+        self._close()
+        self._carry_pending()
+        self._pending = (title, heading)
+
+    def write(self, text):
+        if self._file is None:
+            if not text.strip():
+                return  # Nothing but whitespace - not worth a chapter
+            self._open(self._pending[0] if self._pending else "Opening")
+            self._pending = None
+        self._file.write(text)
+
+    def _carry_pending(self):
+        if self._pending is not None and self._pending[1]:
+            self._carried.append(self._pending[1].strip() + "\n")
+        self._pending = None
+
+    def _open(self, title):
+        index = len(self.chapters)
+        text_path = f"{self.path_prefix}{index:03d}.txt"
+        self.chapters.append({"index": index, "title": title, "text_path": text_path})
+        self._file = open(text_path, "w", encoding="utf-8")
+        # Headings that never got a chapter of their own lead into this one
+        for line in self._carried:
+            self._file.write(line)
+        self._carried = []
+
+    def _close(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+
+    def finish(self):
+        self._close()
+        title = self._pending[0] if self._pending else None
+        self._carry_pending()
+        if self._carried:
+            if self.chapters:
+                # Trailing headings go on the end of the last chapter
+                with open(self.chapters[-1]["text_path"], "a", encoding="utf-8") as f:
+                    f.write("\n" + "".join(self._carried))
+                self._carried = []
+            else:
+                self._open(title or "Opening")
+                self._close()
+        return self.chapters
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """🧾 Strips XHTML down to readable text, remembering the first heading"""
+
+    _BLOCK_TAGS = {"p", "div", "br", "li", "tr", "section", "blockquote", "h1", "h2", "h3", "h4", "h5", "h6"}
+    _SKIP_TAGS = {"script", "style", "head"}
+    _HEADING_TAGS = {"h1", "h2", "h3"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.title = None
+        self._skip_depth = 0
+        self._heading = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self._HEADING_TAGS and self.title is None:
+            self._heading = []
+        if tag in self._BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in self._HEADING_TAGS and self._heading is not None:
+            self.title = " ".join("".join(self._heading).split()) or None
+            self._heading = None
+        if tag in self._BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._heading is not None:
+            self._heading.append(data)
+        self.parts.append(data)
+
+    def text(self):
+        return "".join(self.parts)
+
+
+def _is_text_heading(line):
+    stripped = line.strip()
+    return 0 < len(stripped) <= _MAX_HEADING_CHARS and bool(_TEXT_HEADING_PATTERN.match(stripped))
+
+
+def _split_plain_lines(lines, writer):
+    """📄 Shared by .txt and PDF - start a chapter at every heading-looking line after a blank one"""
+    after_blank = True  # the start counts as one
+    for line in lines:
+        if after_blank and _is_text_heading(line):
+            writer.start(line.strip(), heading=line)
+        else:
+            writer.write(line)
+        after_blank = not line.strip()
+
+
+def _extract_text(source_path, writer):
+    with open(source_path, "r", encoding="utf-8-sig", errors="replace") as f:
+        _split_plain_lines(f, writer)
+
+
+def _clean_markdown_line(line):
+    line = _MD_IMAGE_PATTERN.sub("", line)
+    line = _MD_LINK_PATTERN.sub(r"\1", line)
+    line = _MD_PREFIX_PATTERN.sub("", line)
+    # Again until nothing's left - ***both*** is emphasis inside emphasis
+    while True:
+        cleaned = _MD_EMPHASIS_PATTERN.sub(r"\2", line)
+        if cleaned == line:
+            return line
+        line = cleaned
+
+
+def _extract_markdown(source_path, writer):
+    in_code_block = False
+    with open(source_path, "r", encoding="utf-8-sig", errors="replace") as f:
+        for line in f:
+            if line.lstrip().startswith("```"):
+                # Code doesn't make for great listening
+                in_code_block = not in_code_block
+                continue
+            if in_code_block:
+                continue
+            heading = _MD_HEADING_PATTERN.match(line)
+            if heading:
+                writer.start(_clean_markdown_line(heading.group(2)).strip())
+            else:
+                writer.write(_clean_markdown_line(line))
+
+
+def _extract_epub(source_path, writer):
+    with zipfile.ZipFile(source_path) as epub:
+        container = ElementTree.fromstring(epub.read("META-INF/container.xml"))
+        rootfile = container.find(".//c:rootfile", _CONTAINER_NS)
+        if rootfile is None:
+            raise ValueError("EPUB has no rootfile in META-INF/container.xml")
+        opf_path = rootfile.attrib["full-path"]
+        opf_dir = posixpath.dirname(opf_path)
+        opf = ElementTree.fromstring(epub.read(opf_path))
+
+        manifest = {}
+        for item in opf.findall(".//opf:manifest/opf:item", _OPF_NS):
+            manifest[item.attrib["id"]] = item.attrib
+
+        # The spine is the reading order
+        for itemref in opf.findall(".//opf:spine/opf:itemref", _OPF_NS):
+            item = manifest.get(itemref.attrib.get("idref"))
+            if item is None or "nav" in item.get("properties", "").split():
+                continue
+            if "html" not in item.get("media-type", ""):
+                continue
+
+            href = posixpath.normpath(posixpath.join(opf_dir, item["href"].split("#")[0]))
+            parser = _HTMLTextExtractor()
+            parser.feed(epub.read(href).decode("utf-8", errors="replace"))
+            parser.close()
+
+            writer.start(parser.title or f"Chapter {len(writer.chapters) + 1}")
+            writer.write(parser.text())
+
+
+def _pdf_outline_starts(reader):
+    """🧭 (first page, title) for every top-level bookmark in the PDF"""
+    starts = []
+    for entry in reader.outline:
+        if isinstance(entry, list):
+            continue  # nested bookmarks are sections, not chapters
+        try:
+            starts.append((reader.get_destination_page_number(entry), entry.title))
+        except Exception:
+            continue
+    return sorted(starts)
+
+
+def _extract_pdf(source_path, writer):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ValueError("PDF ingestion needs pypdf - pip install pypdf")
+
+    reader = PdfReader(source_path)
+    starts = dict(_pdf_outline_starts(reader))
+    found_text = False
+
+    for page_number, page in enumerate(reader.pages):
+        text = page.extract_text() or ""
+        found_text = found_text or bool(text.strip())
+        if starts:
+            if page_number in starts:
+                writer.start(starts[page_number])
+            writer.write(text + "\n")
+        else:
+            # No bookmarks - fall back to spotting headings in the text itself
+            _split_plain_lines(text.splitlines(keepends=True), writer)
+            writer.write("\n")
+
+    if not found_text:
+        raise ValueError("PDF has no extractable text (scanned pages need OCR first)")
+
+
+_EXTRACTORS = {
+    ".txt": _extract_text,
+    ".md": _extract_markdown,
+    ".markdown": _extract_markdown,
+    ".epub": _extract_epub,
+    ".pdf": _extract_pdf,
+}
+
+
+def extract_chapters(source_path, path_prefix):
+    """
+    📖 Split a book into per-chapter text files
+
+    Args:
+        source_path: The uploaded book (.txt, .md, .epub or .pdf)
+        path_prefix: Chapter files are written to f"{path_prefix}{index:03d}.txt"
+
+    Returns:
+        chapters: [{"index", "title", "text_path"}, ...] in reading order
+    """
+    extension = os.path.splitext(source_path)[1].lower()
+    if extension not in _EXTRACTORS:
+        raise ValueError(f"Unsupported book format: {extension or 'no extension'}")
+
+    writer = _ChapterWriter(path_prefix)
+    try:
+        _EXTRACTORS[extension](source_path, writer)
+    finally:
+        chapters = writer.finish()
+
+    if not chapters:
+        raise ValueError("No readable text found in the book")
+    return chapters
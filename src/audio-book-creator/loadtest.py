@@ -0,0 +1,319 @@
+"""
+🏋️ API Load Test 🏋️
+Hammers the audiobook API with concurrent clients and reports throughput
+and p50/p95/p99 latency per endpoint:
+
+    python loadtest.py                                  # starts its own stub server
+    python loadtest.py --duration 120 --create-rate 2 --status-rate 50
+    python loadtest.py --url http://localhost:8000      # an already running server
+
+Without --url it starts `uvicorn app:app` on a spare port with
+CSM_BACKEND=stub, so the model costs what the stub profile says and the
+numbers are about the request path: scans, blocking I/O, event-loop stalls.
+
+Each endpoint gets its own open-loop arrival stream (Poisson at the given
+rate). Requests don't wait for earlier ones to finish, and latency is
+measured from when a request was due, not when it got sent, so a stalled
+server can't hide behind a slowed-down client.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import aiohttp
+
+ENDPOINTS = ("create", "status", "list", "download")
+
+# 📝 Filler for generated books - every book also gets a unique line so identical submissions don't coalesce
+WORDS = (
+    "the quick brown fox jumps over a lazy dog while the river runs past old stone bridges and "
+    "quiet houses where lamps glow softly in the evening as people read long letters aloud"
+).split()
+
+DOWNLOAD_BLOCK = 64 * 1024
+
+
+class EndpointStats:
+    """📊 Latencies and outcomes for one endpoint"""
+
+    def __init__(self):
+        self.latencies_ms = []
+        self.statuses = {}
+        self.errors = 0
+        self.skipped = 0
+        self.bytes = 0
+
+    def record(self, latency_ms, status):
+        self.latencies_ms.append(latency_ms)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def summary(self, duration_s):
+        latencies = sorted(self.latencies_ms)
+        ok = sum(count for status, count in self.statuses.items() if 200 <= status < 300)
+        return {
+            "requests": len(latencies) + self.errors,
+            "ok": ok,
+            "errors": self.errors + len(latencies) - ok,
+            "skipped": self.skipped,
+            "throughput_rps": round(ok / duration_s, 2) if duration_s else 0.0,
+            "p50_ms": _percentile(latencies, 50),
+            "p95_ms": _percentile(latencies, 95),
+            "p99_ms": _percentile(latencies, 99),
+            "max_ms": round(latencies[-1], 1) if latencies else None,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "mb": round(self.bytes / 1e6, 1),
+        }
+
+
+def _percentile(sorted_values, p):
+    """📐 Nearest-rank percentile"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return round(sorted_values[int(rank) - 1], 1)
+
+
+def _book_text(chapters, chars_per_chapter):
+    """📖 A small random book - chapter headings so the splitter has something to find"""
+    parts = [f"Load test {uuid.uuid4()}."]
+    for chapter in range(1, chapters + 1):
+        words = []
+        while sum(len(word) + 1 for word in words) < chars_per_chapter:
+            words.append(random.choice(WORDS))
+        parts.append(f"Chapter {chapter}\n\n{' '.join(words).capitalize()}.")
+    return "\n\n".join(parts)
+
+
+class LoadTest:
+    """🏋️ One run - arrival streams, the books they made and what it all cost"""
+
+    def __init__(self, args):
+        self.args = args
+        self.stats = {name: EndpointStats() for name in ENDPOINTS}
+        self.books = []  # every book we created
+        self.completed = []  # the ones we've seen finish - download targets
+        self.inflight = set()
+        self.max_loop_lag_ms = 0.0
+        self._slots = asyncio.Semaphore(args.max_inflight)
+        self._session = None
+
+    async def _timed(self, name, due, request):
+        """⏱️ Run request(session) once a slot frees up - latency counted from when it was due"""
+        stats = self.stats[name]
+        async with self._slots:
+            try:
+                status = await request(self._session)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                stats.errors += 1
+                return
+            if status is None:
+                stats.skipped += 1
+                return
+            stats.record((time.perf_counter() - due) * 1000, status)
+
+    async def _create(self, session):
+        data = aiohttp.FormData()
+        data.add_field("title", f"Load test {len(self.books)}")
+        data.add_field("author", "loadtest")
+        data.add_field("voice_id", "0")
+        data.add_field("text_content", _book_text(self.args.chapters, self.args.chapter_chars))
+        headers = {"X-User-Id": f"user-{random.randrange(self.args.users)}"}
+        async with session.post(f"{self.args.url}/audiobook/", data=data, headers=headers) as response:
+            if response.status == 200:
+                self.books.append((await response.json())["book_id"])
+            else:
+                await response.read()
+            return response.status
+
+    async def _status(self, session):
+        if not self.books:
+            return None
+        book_id = random.choice(self.books)
+        async with session.get(f"{self.args.url}/audiobook/{book_id}") as response:
+            if response.status == 200:
+                book = await response.json()
+                if book.get("status") == "completed" and book_id not in self.completed:
+                    self.completed.append(book_id)
+            else:
+                await response.read()
+            return response.status
+
+    async def _list(self, session):
+        async with session.get(f"{self.args.url}/audiobooks/") as response:
+            await response.read()
+            return response.status
+
+    async def _download(self, session):
+        if not self.completed:
+            return None
+        book_id = random.choice(self.completed)
+        async with session.get(f"{self.args.url}/audiobook/{book_id}/audio") as response:
+            async for block in response.content.iter_chunked(DOWNLOAD_BLOCK):
+                self.stats["download"].bytes += len(block)
+            return response.status
+
+    async def _arrivals(self, name, rate, request, until):
+        """🚰 Poisson arrivals at rate/sec until the deadline - fire and forget"""
+        if rate <= 0:
+            return
+        due = time.perf_counter()
+        while True:
+            due += random.expovariate(rate)
+            if due >= until:
+                return
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            task = asyncio.create_task(self._timed(name, due, request))
+            self.inflight.add(task)
+            task.add_done_callback(self.inflight.discard)
+
+    async def _watch_loop(self, until):
+        """🐢 Our own event-loop lag - if this is high, the client is the bottleneck, not the server"""
+        interval = 0.05
+        while time.perf_counter() < until:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag_ms = (time.perf_counter() - started - interval) * 1000
+            self.max_loop_lag_ms = max(self.max_loop_lag_ms, lag_ms)
+
+    async def run(self):
+        args = self.args
+        timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+        connector = aiohttp.TCPConnector(limit=args.max_inflight)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            self._session = session
+            started = time.perf_counter()
+            until = started + args.duration
+            await asyncio.gather(
+                self._arrivals("create", args.create_rate, self._create, until),
+                self._arrivals("status", args.status_rate, self._status, until),
+                self._arrivals("list", args.list_rate, self._list, until),
+                self._arrivals("download", args.download_rate, self._download, until),
+                self._watch_loop(until),
+            )
+            # Let the stragglers land - they count, they were due inside the window
+            if self.inflight:
+                await asyncio.wait(set(self.inflight), timeout=args.request_timeout)
+            elapsed = time.perf_counter() - started
+
+            if not args.keep_books:
+                for book_id in self.books:
+                    try:
+                        async with session.delete(f"{args.url}/audiobook/{book_id}") as response:
+                            await response.read()
+                    except aiohttp.ClientError:
+                        pass
+        return elapsed
+
+    def report(self, elapsed):
+        return {
+            "duration_s": round(elapsed, 1),
+            "books_created": len(self.books),
+            "books_completed": len(self.completed),
+            "client_max_loop_lag_ms": round(self.max_loop_lag_ms, 1),
+            "endpoints": {name: stats.summary(elapsed) for name, stats in self.stats.items()},
+        }
+
+
+def _print_report(report):
+    print(
+        f"\n{report['duration_s']}s, {report['books_created']} books created, "
+        f"{report['books_completed']} seen completed, client loop lag max {report['client_max_loop_lag_ms']}ms\n"
+    )
+    print(
+        f"{'endpoint':<10}{'reqs':>8}{'ok':>8}{'err':>6}{'rps':>9}"
+        + "".join(f"{header:>10}" for header in ("p50 ms", "p95 ms", "p99 ms", "max ms"))
+    )
+    for name, s in report["endpoints"].items():
+        cells = [s[key] if s[key] is not None else "-" for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms")]
+        print(
+            f"{name:<10}{s['requests']:>8}{s['ok']:>8}{s['errors']:>6}{s['throughput_rps']:>9}"
+            + "".join(f"{cell:>10}" for cell in cells)
+        )
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(port, stub_profile=None):
+    """🚀 uvicorn app:app on the stub backend - returns the process once GET /audiobooks/ answers"""
+    env = {**os.environ, "CSM_BACKEND": "stub"}
+    if stub_profile:
+        env["STUB_PROFILE"] = stub_profile
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with code {server.returncode}")
+        # An open port isn't enough - wait for the app to actually serve, so startup doesn't count as load
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/audiobooks/", timeout=5) as response:
+                if response.status == 200:
+                    return server
+        except (OSError, urllib.error.URLError):
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("server didn't come up within 120s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the audiobook API")
+    parser.add_argument("--url", default=None, help="Test a running server instead of starting a stub one")
+    parser.add_argument("--stub-profile", default=None, help="STUB_PROFILE for the server we start")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of load")
+    parser.add_argument("--create-rate", type=float, default=0.5, help="POST /audiobook/ per second")
+    parser.add_argument("--status-rate", type=float, default=20.0, help="GET /audiobook/{id} per second")
+    parser.add_argument("--list-rate", type=float, default=2.0, help="GET /audiobooks/ per second")
+    parser.add_argument("--download-rate", type=float, default=1.0, help="GET /audiobook/{id}/audio per second")
+    parser.add_argument("--chapters", type=int, default=2, help="Chapters per generated book")
+    parser.add_argument("--chapter-chars", type=int, default=400, help="Characters per generated chapter")
+    parser.add_argument("--users", type=int, default=4, help="Distinct X-User-Id values to spread books over")
+    parser.add_argument("--max-inflight", type=int, default=256, help="Requests open at once")
+    parser.add_argument("--request-timeout", type=float, default=60.0)
+    parser.add_argument("--keep-books", action="store_true", help="Don't delete the generated books afterwards")
+    parser.add_argument("--json", default=None, help="Also write the report here")
+    args = parser.parse_args()
+
+    server = None
+    if args.url is None:
+        port = _free_port()
+        server = _start_server(port, args.stub_profile)
+        args.url = f"http://127.0.0.1:{port}"
+    try:
+        test = LoadTest(args)
+        report = test.report(asyncio.run(test.run()))
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGINT)
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
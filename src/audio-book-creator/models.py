@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import List, Optional, Sequence
 
 import torch
 import torch.nn as nn
@@ -38,9 +39,27 @@ def llama3_2_100M() -> torchtune.modules.transformer.TransformerDecoder:
     )
 
 
+def llama3_2_tiny() -> torchtune.modules.transformer.TransformerDecoder:
+    # Same architecture at toy scale, for running the real generation path on a CPU without the checkpoint
+    return llama3_2.llama3_2(
+        vocab_size=1024,
+        num_layers=2,
+        num_heads=4,
+        num_kv_heads=2,
+        embed_dim=128,
+        max_seq_len=2048,
+        intermediate_dim=256,
+        attn_dropout=0.0,
+        norm_eps=1e-5,
+        rope_base=500_000,
+        scale_factor=32,
+    )
+
+
 FLAVORS = {
     "llama-1B": llama3_2_1B,
     "llama-100M": llama3_2_100M,
+    "llama-tiny": llama3_2_tiny,
 }
 
 
@@ -51,29 +70,34 @@ def _prepare_transformer(model):
     return model, embed_dim
 
 
-def _create_causal_mask(seq_len: int, device: torch.device):
-    return torch.tril(torch.ones(seq_len, seq_len, dtype=torch.bool, device=device))
+# Backbone caches grow/shrink in steps of this many positions
+CACHE_BLOCK = 256
 
 
-def _index_causal_mask(mask: torch.Tensor, input_pos: torch.Tensor):
+def _causal_mask(input_pos: torch.Tensor, cache_len: int):
     """
+    Computed per call instead of indexing a materialized (max_seq_len, max_seq_len) tril.
+
     Args:
-        mask: (max_seq_len, max_seq_len)
         input_pos: (batch_size, seq_len)
+        cache_len: length of the KV cache being attended over
 
     Returns:
-        (batch_size, seq_len, max_seq_len)
+        (batch_size, seq_len, cache_len)
     """
-    r = mask[input_pos, :]
-    return r
+    return torch.arange(cache_len, device=input_pos.device) <= input_pos.unsqueeze(-1)
 
 
-def _multinomial_sample_one_no_sync(probs):  # Does multinomial sampling without a cuda synchronization
-    q = torch.empty_like(probs).exponential_(1)
+def _multinomial_sample_one_no_sync(
+    probs, generator: Optional[torch.Generator] = None
+):  # Does multinomial sampling without a cuda synchronization
+    q = torch.empty_like(probs).exponential_(1, generator=generator)
     return torch.argmax(probs / q, dim=-1, keepdim=True).to(dtype=torch.int)
 
 
-def sample_topk(logits: torch.Tensor, topk: int, temperature: float):
+def sample_topk(
+    logits: torch.Tensor, topk: int, temperature: float, generator: Optional[torch.Generator] = None
+):
     logits = logits / temperature
 
     filter_value: float = -float("Inf")
@@ -82,10 +106,108 @@ def sample_topk(logits: torch.Tensor, topk: int, temperature: float):
     scores_processed = torch.nn.functional.log_softmax(scores_processed, dim=-1)
     probs = torch.nn.functional.softmax(scores_processed, dim=-1)
 
-    sample_token = _multinomial_sample_one_no_sync(probs)
+    sample_token = _multinomial_sample_one_no_sync(probs, generator)
     return sample_token
 
 
+def sample_topk_rows(
+    logits: torch.Tensor,
+    topk: torch.Tensor,
+    temperature: torch.Tensor,
+    generators: Sequence[Optional[torch.Generator]],
+):
+    """
+    sample_topk with per-row topk / temperature / RNG. With the same generator state a row
+    draws exactly what sample_topk would draw for it alone.
+
+    Args:
+        logits: (batch_size, vocab_size)
+        topk, temperature: (batch_size,)
+        generators: one per row, None for the global RNG
+    """
+    logits = logits / temperature.unsqueeze(-1).to(logits.dtype)
+
+    filter_value: float = -float("Inf")
+    kth_values = torch.topk(logits, int(topk.max()))[0].gather(-1, (topk - 1).unsqueeze(-1))
+    scores_processed = logits.masked_fill(logits < kth_values, filter_value)
+    scores_processed = torch.nn.functional.log_softmax(scores_processed, dim=-1)
+    probs = torch.nn.functional.softmax(scores_processed, dim=-1)
+
+    q = torch.empty_like(probs)
+    if all(g is None for g in generators):
+        q.exponential_(1)
+    else:
+        for row, g in enumerate(generators):
+            q[row].exponential_(1, generator=g)
+    return torch.argmax(probs / q, dim=-1, keepdim=True).to(dtype=torch.int)
+
+
+class SlotKVCache(nn.Module):
+    """
+    Drop-in for torchtune's KVCache where every batch row is an independent sequence.
+
+    torchtune's cache writes all rows at one shared cursor. Here the caller points the
+    cache at `rows` (cache rows for the batch, None = rows 0..b-1) and `positions`
+    ((b, s) token positions) before each forward, so sequences can start, finish and be
+    replaced at different times. Entries past a row's position are stale but masked.
+    """
+
+    def __init__(self, batch_size: int, max_seq_len: int, num_heads: int, head_dim: int, dtype: torch.dtype):
+        super().__init__()
+        cache_shape = (batch_size, num_heads, max_seq_len, head_dim)
+        self.register_buffer("k_cache", torch.zeros(cache_shape, dtype=dtype), persistent=False)
+        self.register_buffer("v_cache", torch.zeros(cache_shape, dtype=dtype), persistent=False)
+        self.batch_size = batch_size
+        self.rows: Optional[torch.Tensor] = None
+        self.positions: Optional[torch.Tensor] = None
+
+    def reset(self) -> None:
+        self.k_cache.zero_()
+        self.v_cache.zero_()
+
+    @property
+    def max_seq_len(self) -> int:
+        return self.k_cache.size(2)
+
+    def resize(self, max_seq_len: int) -> None:
+        """Reallocate to max_seq_len positions, keeping every entry that still fits."""
+        keep = min(max_seq_len, self.max_seq_len)
+        for name in ("k_cache", "v_cache"):
+            old = getattr(self, name)
+            new = old.new_zeros(old.size(0), old.size(1), max_seq_len, old.size(3))
+            new[:, :, :keep] = old[:, :, :keep]
+            setattr(self, name, new)
+
+    @property
+    def size(self) -> int:
+        return 0 if self.positions is None else int(self.positions.max()) + 1
+
+    def copy_prefix(self, src_row: int, dst_row: int, length: int) -> None:
+        """Copy positions [0, length) of one row into another, e.g. a prompt prefix both rows share."""
+        self.k_cache[dst_row, :, :length] = self.k_cache[src_row, :, :length]
+        self.v_cache[dst_row, :, :length] = self.v_cache[src_row, :, :length]
+
+    def update(self, k_val: torch.Tensor, v_val: torch.Tensor):
+        b = k_val.size(0)
+        rows = self.rows if self.rows is not None else torch.arange(b, device=k_val.device)
+        # (B, S, H, D) views so each (row, position) pair indexes one cache entry
+        self.k_cache.transpose(1, 2)[rows.unsqueeze(-1), self.positions] = k_val.transpose(1, 2)
+        self.v_cache.transpose(1, 2)[rows.unsqueeze(-1), self.positions] = v_val.transpose(1, 2)
+        if self.rows is None:
+            return self.k_cache[:b], self.v_cache[:b]
+        return self.k_cache[self.rows], self.v_cache[self.rows]
+
+
+def _route_slot_caches(
+    transformer: torchtune.modules.transformer.TransformerDecoder,
+    rows: Optional[torch.Tensor],
+    positions: torch.Tensor,
+):
+    for layer in transformer.layers:
+        layer.attn.kv_cache.rows = rows
+        layer.attn.kv_cache.positions = positions
+
+
 @dataclass
 class ModelArgs:
     backbone_flavor: str
@@ -110,32 +232,97 @@ class Model(nn.Module):
         self.codebook0_head = nn.Linear(backbone_dim, args.audio_vocab_size, bias=False)
         self.audio_head = nn.Parameter(torch.empty(args.audio_num_codebooks - 1, decoder_dim, args.audio_vocab_size))
 
-    def setup_caches(self, max_batch_size: int) -> torch.Tensor:
-        """Setup KV caches and return a causal mask."""
+    def setup_caches(self, max_batch_size: int, max_seq_len: int = CACHE_BLOCK):
+        """
+        Setup KV caches - one independent SlotKVCache row per batch slot.
+
+        The backbone cache starts at max_seq_len positions and is sized to the actual
+        prompt + audio budget by ensure_cache_capacity; the decoder only ever needs
+        audio_num_codebooks positions.
+        """
         dtype = next(self.parameters()).dtype
         device = next(self.parameters()).device
 
-        with device:
-            self.backbone.setup_caches(max_batch_size, dtype)
-            self.decoder.setup_caches(max_batch_size, dtype, decoder_max_seq_len=self.args.audio_num_codebooks)
+        for transformer, cache_len in (
+            (self.backbone, min(max_seq_len, self.backbone.max_seq_len)),
+            (self.decoder, self.args.audio_num_codebooks),
+        ):
+            for layer in transformer.layers:
+                attn = layer.attn
+                with device:
+                    attn.kv_cache = SlotKVCache(max_batch_size, cache_len, attn.num_heads, attn.head_dim, dtype)
+                attn.cache_enabled = True
+
+    @property
+    def backbone_cache_len(self) -> int:
+        return self.backbone.layers[0].attn.kv_cache.max_seq_len
+
+    def ensure_cache_capacity(self, seq_len: int, shrink: bool = False) -> int:
+        """
+        Make the backbone caches hold at least seq_len positions (rounded up to CACHE_BLOCK).
+        Existing entries are kept, so this is safe mid-generation. With shrink, a cache more than
+        twice the size needed is cut down too. Returns the capacity.
+        """
+        target = min(-(-seq_len // CACHE_BLOCK) * CACHE_BLOCK, self.backbone.max_seq_len)
+        current = self.backbone_cache_len
+        if current < target or (shrink and current >= 2 * target):
+            for layer in self.backbone.layers:
+                layer.attn.kv_cache.resize(target)
+            return target
+        return current
+
+    def copy_cache_prefix(self, src_row: int, dst_row: int, length: int) -> None:
+        """
+        Give dst_row the backbone KV entries of src_row's first `length` positions.
+
+        Causal attention means a prompt prefix's entries don't depend on what follows it, so a
+        sequence starting with the same prefix can skip prefilling it. The decoder cache is
+        rewritten every frame and needs nothing.
+        """
+        for layer in self.backbone.layers:
+            layer.attn.kv_cache.copy_prefix(src_row, dst_row, length)
 
-        self.register_buffer("backbone_causal_mask", _create_causal_mask(self.backbone.max_seq_len, device))
-        self.register_buffer("decoder_causal_mask", _create_causal_mask(self.args.audio_num_codebooks, device))
+    def prefill(
+        self,
+        tokens: torch.Tensor,
+        tokens_mask: torch.Tensor,
+        input_pos: torch.Tensor,
+        rows: Optional[torch.Tensor] = None,
+    ) -> None:
+        """
+        Backbone-only forward that just writes the KV entries for these positions, nothing sampled.
 
-    def generate_frame(
+        Prompts with a reusable prefix always prefill it on its own first, so its entries come out
+        the same whether they were computed now or copied from an earlier call - a seeded
+        generation then doesn't depend on what the cache happened to hold.
+        """
+        dtype = next(self.parameters()).dtype
+        assert self.backbone.caches_are_enabled(), "backbone caches are not enabled"
+        _route_slot_caches(self.backbone, rows, input_pos)
+        curr_backbone_mask = _causal_mask(input_pos, self.backbone_cache_len)
+        h = (self._embed_tokens(tokens) * tokens_mask.unsqueeze(-1)).sum(dim=2)
+        self.backbone(h, input_pos=input_pos, mask=curr_backbone_mask).to(dtype=dtype)
+
+    def generate_frames(
         self,
         tokens: torch.Tensor,
         tokens_mask: torch.Tensor,
         input_pos: torch.Tensor,
-        temperature: float,
-        topk: int,
+        rows: Optional[torch.Tensor],
+        temperature: torch.Tensor,
+        topk: torch.Tensor,
+        generators: List[Optional[torch.Generator]],
     ) -> torch.Tensor:
         """
+        generate_frame for several independent sequences living in slot caches.
+
         Args:
             tokens: (batch_size, seq_len, audio_num_codebooks+1)
             tokens_mask: (batch_size, seq_len, audio_num_codebooks+1)
-            input_pos: (batch_size, seq_len) positions for each token
-            mask: (batch_size, seq_len, max_seq_len
+            input_pos: (batch_size, seq_len) each sequence's own positions
+            rows: (batch_size,) slot-cache row of each sequence, None for rows 0..batch_size-1
+            temperature, topk: (batch_size,) per-sequence sampling parameters
+            generators: per-sequence RNGs, None entries use the global RNG
 
         Returns:
             (batch_size, audio_num_codebooks) sampled tokens
@@ -144,7 +331,8 @@ class Model(nn.Module):
         b, s, _ = tokens.size()
 
         assert self.backbone.caches_are_enabled(), "backbone caches are not enabled"
-        curr_backbone_mask = _index_causal_mask(self.backbone_causal_mask, input_pos)
+        _route_slot_caches(self.backbone, rows, input_pos)
+        curr_backbone_mask = _causal_mask(input_pos, self.backbone_cache_len)
         embeds = self._embed_tokens(tokens)
         masked_embeds = embeds * tokens_mask.unsqueeze(-1)
         h = masked_embeds.sum(dim=2)
@@ -152,22 +340,22 @@ class Model(nn.Module):
 
         last_h = h[:, -1, :]
         c0_logits = self.codebook0_head(last_h)
-        c0_sample = sample_topk(c0_logits, topk, temperature)
+        c0_sample = sample_topk_rows(c0_logits, topk, temperature, generators)
         c0_embed = self._embed_audio(0, c0_sample)
 
         curr_h = torch.cat([last_h.unsqueeze(1), c0_embed], dim=1)
         curr_sample = c0_sample.clone()
         curr_pos = torch.arange(0, curr_h.size(1), device=curr_h.device).unsqueeze(0).repeat(curr_h.size(0), 1)
 
-        # Decoder caches must be reset every frame.
-        self.decoder.reset_caches()
+        # Slot caches write at explicit positions, so the decoder needs no reset between frames
         for i in range(1, self.args.audio_num_codebooks):
-            curr_decoder_mask = _index_causal_mask(self.decoder_causal_mask, curr_pos)
+            _route_slot_caches(self.decoder, rows, curr_pos)
+            curr_decoder_mask = _causal_mask(curr_pos, self.args.audio_num_codebooks)
             decoder_h = self.decoder(self.projection(curr_h), input_pos=curr_pos, mask=curr_decoder_mask).to(
                 dtype=dtype
             )
             ci_logits = torch.mm(decoder_h[:, -1, :], self.audio_head[i - 1])
-            ci_sample = sample_topk(ci_logits, topk, temperature)
+            ci_sample = sample_topk_rows(ci_logits, topk, temperature, generators)
             ci_embed = self._embed_audio(i, ci_sample)
 
             curr_h = ci_embed
@@ -176,6 +364,36 @@ class Model(nn.Module):
 
         return curr_sample
 
+    def generate_frame(
+        self,
+        tokens: torch.Tensor,
+        tokens_mask: torch.Tensor,
+        input_pos: torch.Tensor,
+        temperature: float,
+        topk: int,
+        generator: Optional[torch.Generator] = None,
+    ) -> torch.Tensor:
+        """
+        Args:
+            tokens: (batch_size, seq_len, audio_num_codebooks+1)
+            tokens_mask: (batch_size, seq_len, audio_num_codebooks+1)
+            input_pos: (batch_size, seq_len) positions for each token
+            generator: RNG for sampling; the global RNG when None
+
+        Returns:
+            (batch_size, audio_num_codebooks) sampled tokens
+        """
+        b = tokens.size(0)
+        return self.generate_frames(
+            tokens,
+            tokens_mask,
+            input_pos,
+            None,
+            torch.full((b,), temperature, device=tokens.device),
+            torch.full((b,), topk, dtype=torch.long, device=tokens.device),
+            [generator] * b,
+        )
+
     def reset_caches(self):
         self.backbone.reset_caches()
         self.decoder.reset_caches()
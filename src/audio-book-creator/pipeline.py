@@ -0,0 +1,73 @@
+"""
+🏭 Decode Pipeline 🏭
+Overlaps token generation with everything that comes after it.
+
+Generating a chunk's codebook tokens needs the model (and its lock).
+Turning those tokens into audio - Mimi decode, watermark, resample,
+post-processing - doesn't. Run back to back, the model sits idle while the
+codec and watermarker work.
+
+Here the rendering thread generates tokens and pushes them onto the decode
+stage's queue, then goes straight on to the next chunk. Decode threads pick
+the tokens up, and the finished audio comes back out in the order it went
+in, ready to be written to the chapter file. Torch drops the GIL inside its
+ops, so plain threads are enough to put the decode on other cores.
+"""
+
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# 🚧 Chunks a chapter may have in flight before the generating thread waits on the oldest
+MAX_PENDING = 2
+
+
+class DecodeStage:
+    """🧵 A few decode threads shared by every chapter being rendered"""
+
+    def __init__(self, workers=1):
+        if workers < 1:
+            raise ValueError("Need at least one decode thread")
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode")
+        logging.info(f"Decode stage up with {workers} thread(s)")
+
+    def pipeline(self, decode_fn, max_pending=MAX_PENDING):
+        """🏭 A fresh in-order pipeline for one chapter, decoding with decode_fn(tokens)"""
+        return ChunkPipeline(self._executor, decode_fn, max_pending)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ChunkPipeline:
+    """📬 Tokens in, audio out - same order, at most max_pending chunks behind"""
+
+    def __init__(self, executor, decode_fn, max_pending=MAX_PENDING):
+        self._executor = executor
+        self._decode_fn = decode_fn
+        self._max_pending = max(1, max_pending)
+        self._pending = deque()
+
+    def push(self, tokens):
+        """➕ Queue a chunk's tokens for decoding; returns whatever audio is ready, in order"""
+        self._pending.append(self._executor.submit(self._decode_fn, tokens))
+        ready = []
+        # Don't let generation run off ahead of a slow decoder - RAM stays bounded
+        while len(self._pending) > self._max_pending:
+            ready.append(self._pending.popleft().result())
+        while self._pending and self._pending[0].done():
+            ready.append(self._pending.popleft().result())
+        return ready
+
+    def drain(self):
+        """⏳ Wait for everything still in flight, oldest first"""
+        ready = []
+        while self._pending:
+            ready.append(self._pending.popleft().result())
+        return ready
+
+    def cancel(self):
+        """🗑️ Drop chunks that haven't started decoding (the chapter failed anyway)"""
+        while self._pending:
+            self._pending.popleft().cancel()
@@ -0,0 +1,213 @@
+"""
+🎚️ Audio Post-Processing 🎚️
+Cleans up every generated chunk before it hits disk:
+
+- trims leading/trailing dead air (frame RMS, fully vectorized)
+- normalizes loudness to a target LUFS (EBU R128 / BS.1770 K-weighting + gating)
+- peak-limits so nothing clips after the gain boost
+
+Loudness is the chapter's, not the chunk's: one processor per chapter keeps
+the gated block powers of everything so far, and the gain follows that
+running integrated loudness, moving at most MAX_GAIN_STEP_DB per chunk.
+Leveling every chunk on its own pumps - a quiet line gets pushed up to the
+same level as a shout. Audio is still only held a chunk at a time; the
+history is one float per 100ms block.
+"""
+
+import math
+
+import torch
+import torch.nn.functional as F
+import torchaudio
+
+# 🎯 Where we want the book to sit - -18 LUFS is comfy for spoken word
+TARGET_LUFS = -18.0
+PEAK_CEILING_DB = -1.0
+MAX_GAIN_DB = 20.0
+MAX_GAIN_STEP_DB = 1.5
+
+# 🤫 Dead air detection
+FRAME_MS = 10
+SILENCE_THRESHOLD_DB = -45.0
+SILENCE_BELOW_PEAK_DB = 40.0
+KEEP_HEAD_MS = 40
+KEEP_TAIL_MS = 200
+
+# 📏 BS.1770 gating - 400ms blocks, 75% overlap
+GATE_BLOCK_MS = 400
+GATE_HOP_MS = 100
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+
+# 🧱 Limiter - gain reduction reacts over this window on both sides of a peak
+LIMITER_FRAME_MS = 5
+LIMITER_SMOOTH_MS = 50
+
+
+def _db_to_gain(db):
+    return 10.0 ** (db / 20.0)
+
+
+def _k_weighting_coeffs(sample_rate):
+    """🧮 BS.1770 K-weighting (high shelf + high pass) as two biquads for any sample rate"""
+    # Stage 1: head-related high shelf
+    gain_db, q, fc = 3.99984385397, 0.7071752369554193, 1681.9744509555319
+    a = 10.0 ** (gain_db / 40.0)
+    w0 = 2.0 * math.pi * fc / sample_rate
+    alpha = math.sin(w0) / (2.0 * q)
+    cos_w0 = math.cos(w0)
+    sqrt_a = math.sqrt(a)
+    shelf_b = [
+        a * ((a + 1) + (a - 1) * cos_w0 + 2 * sqrt_a * alpha),
+        -2 * a * ((a - 1) + (a + 1) * cos_w0),
+        a * ((a + 1) + (a - 1) * cos_w0 - 2 * sqrt_a * alpha),
+    ]
+    shelf_a = [
+        (a + 1) - (a - 1) * cos_w0 + 2 * sqrt_a * alpha,
+        2 * ((a - 1) - (a + 1) * cos_w0),
+        (a + 1) - (a - 1) * cos_w0 - 2 * sqrt_a * alpha,
+    ]
+
+    # Stage 2: RLB high pass
+    q, fc = 0.5003270373253953, 38.13547087613982
+    w0 = 2.0 * math.pi * fc / sample_rate
+    alpha = math.sin(w0) / (2.0 * q)
+    cos_w0 = math.cos(w0)
+    highpass_b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+    highpass_a = [1 + alpha, -2 * cos_w0, 1 - alpha]
+
+    # Normalize so a0 == 1
+    return [
+        ([x / a_[0] for x in b_], [x / a_[0] for x in a_])
+        for b_, a_ in ((shelf_b, shelf_a), (highpass_b, highpass_a))
+    ]
+
+
+class AudioPostProcessor:
+    """
+    🎛️ Trim, level and limit a chapter's mono chunks, one chunk at a time
+
+    prepare() is stateless and fine on any thread. level() tracks the
+    chapter's loudness, so it has to see the chunks in reading order.
+    """
+
+    def __init__(self, sample_rate=24000, target_lufs=TARGET_LUFS, peak_ceiling_db=PEAK_CEILING_DB):
+        self.sample_rate = sample_rate
+        self.target_lufs = target_lufs
+        self.peak_ceiling = _db_to_gain(peak_ceiling_db)
+        self._k_filters = [
+            (torch.tensor(b, dtype=torch.float32), torch.tensor(a, dtype=torch.float32))
+            for b, a in _k_weighting_coeffs(sample_rate)
+        ]
+        # 📈 Chapter so far - block powers above the absolute gate, and the gain we last applied
+        self._powers = torch.zeros(0)
+        self._gain_db = None
+
+    def _samples(self, ms):
+        return max(1, int(self.sample_rate * ms / 1000))
+
+    def trim_silence(self, audio):
+        """✂️ Drop leading/trailing dead air, keeping a little breathing room"""
+        frame = self._samples(FRAME_MS)
+        n_frames = audio.numel() // frame
+        if n_frames == 0:
+            return audio
+
+        frames = audio[: n_frames * frame].view(n_frames, frame)
+        rms_db = 10.0 * torch.log10(frames.pow(2).mean(dim=1) + 1e-10)
+        threshold = max(SILENCE_THRESHOLD_DB, rms_db.max().item() - SILENCE_BELOW_PEAK_DB)
+
+        voiced = torch.nonzero(rms_db > threshold).flatten()
+        if voiced.numel() == 0:
+            return audio[:0]
+
+        start = max(0, voiced[0].item() * frame - self._samples(KEEP_HEAD_MS))
+        end = min(audio.numel(), (voiced[-1].item() + 1) * frame + self._samples(KEEP_TAIL_MS))
+        return audio[start:end]
+
+    def _block_powers(self, audio):
+        """⚡ K-weighted mean square of every 400ms gating block"""
+        weighted = audio.unsqueeze(0)
+        for b, a in self._k_filters:
+            weighted = torchaudio.functional.lfilter(weighted, a, b, clamp=False)
+        weighted = weighted.squeeze(0)
+
+        block, hop = self._samples(GATE_BLOCK_MS), self._samples(GATE_HOP_MS)
+        if weighted.numel() < block:
+            power = weighted.pow(2).mean().unsqueeze(0)
+        else:
+            power = weighted.unfold(0, block, hop).pow(2).mean(dim=1)
+        return power
+
+    @staticmethod
+    def _gated_loudness(power):
+        """🚪 BS.1770 absolute + relative gating over block powers -> LUFS (None if all silent)"""
+        block_lufs = -0.691 + 10.0 * torch.log10(power + 1e-12)
+        gated = power[block_lufs > ABSOLUTE_GATE_LUFS]
+        if gated.numel() == 0:
+            return None
+
+        relative_gate = -0.691 + 10.0 * math.log10(gated.mean().item() + 1e-12) + RELATIVE_GATE_LU
+        gated = power[block_lufs > max(ABSOLUTE_GATE_LUFS, relative_gate)]
+        return -0.691 + 10.0 * math.log10(gated.mean().item() + 1e-12)
+
+    def loudness(self, audio):
+        """📏 Integrated loudness (LUFS) of a chunk, BS.1770 style"""
+        return self._gated_loudness(self._block_powers(audio))
+
+    def limit_peaks(self, audio):
+        """🧱 Smooth look-around limiter, then a hard ceiling just in case"""
+        frame = self._samples(LIMITER_FRAME_MS)
+        padded = F.pad(audio, (0, (-audio.numel()) % frame))
+        peaks = padded.abs().view(-1, frame).amax(dim=1)
+
+        gain = (self.peak_ceiling / peaks.clamp(min=1e-9)).clamp(max=1.0)
+        if gain.min().item() < 1.0:
+            # Spread each reduction over its neighbours so it ramps instead of clicking
+            reach = max(1, LIMITER_SMOOTH_MS // LIMITER_FRAME_MS)
+            gain = -F.max_pool1d(-gain.view(1, 1, -1), 2 * reach + 1, stride=1, padding=reach).view(-1)
+            gain = F.avg_pool1d(gain.view(1, 1, -1), 2 * reach + 1, stride=1, padding=reach,
+                                count_include_pad=False).view(-1)
+            gain = F.interpolate(gain.view(1, 1, -1), size=padded.numel(), mode="linear",
+                                 align_corners=False).view(-1)
+            audio = audio * gain[: audio.numel()]
+
+        return audio.clamp(-self.peak_ceiling, self.peak_ceiling)
+
+    @torch.inference_mode()
+    def prepare(self, audio):
+        """✂️ The stateless half - float32 mono on the CPU with the dead air trimmed"""
+        return self.trim_silence(audio.detach().float().cpu().reshape(-1))
+
+    @torch.inference_mode()
+    def level(self, audio):
+        """🎚️ The stateful half - gain from the chapter's loudness so far, then the limiter"""
+        if audio.numel() == 0:
+            return audio
+
+        power = self._block_powers(audio)
+        # Blocks under the absolute gate never count, so there's no point keeping them
+        audible = -0.691 + 10.0 * torch.log10(power + 1e-12) > ABSOLUTE_GATE_LUFS
+        self._powers = torch.cat([self._powers, power[audible]])
+        loudness = self._gated_loudness(self._powers)
+        if loudness is not None:
+            gain_db = max(-MAX_GAIN_DB, min(MAX_GAIN_DB, self.target_lufs - loudness))
+            if self._gain_db is not None:
+                # Ease towards the new gain instead of jumping - no pumping between chunks
+                gain_db = max(self._gain_db - MAX_GAIN_STEP_DB, min(self._gain_db + MAX_GAIN_STEP_DB, gain_db))
+            self._gain_db = gain_db
+        if self._gain_db is not None:
+            audio = audio * _db_to_gain(self._gain_db)
+
+        return self.limit_peaks(audio)
+
+    def process(self, audio):
+        """🎚️ The full treatment for one chunk - returns float32 mono on the CPU"""
+        return self.level(self.prepare(audio))
+
+    def iter_leveled(self, chunks):
+        """🚰 Level a run of prepare()d chunks in reading order, skipping any that were pure silence"""
+        for chunk in chunks:
+            leveled = self.level(chunk)
+            if leveled.numel():
+                yield leveled
@@ -0,0 +1,153 @@
+"""
+🔤 Bulk Pre-Tokenization 🔤
+Chunks a whole book and text-tokenizes every chunk up front, in batch
+calls to the (Rust) fast tokenizer, instead of one encode() per chunk on
+the render path. Chunks stream through in batches of PRETOKENIZE_BATCH
+and land in compact arrays, so memory stays flat however long the book.
+
+Each chapter's chunks are packed into one small file next to its text,
+data/books/{id}_chapter_{n:03d}.tokens.npz:
+
+- ids / offsets: every chunk's text tokens back to back (int32), and
+  where each chunk starts
+- text / text_offsets: the chunk texts as UTF-8, same layout
+- voices / speakers: who reads each chunk (see dialogue.py)
+
+Rendering just walks that file. And since the token counts are known
+before the first frame, progress can estimate time left by tokens instead
+of chunks.
+"""
+
+import numpy as np
+
+from dialogue import iter_dialogue_chunks, speaker_ids
+from text_processing import iter_text_chunks
+
+# 📦 Chunks per encode call - big enough to keep the tokenizer busy, small enough to stay flat on memory
+PRETOKENIZE_BATCH = 256
+
+
+class PackedChunks:
+    """📦 One chapter's chunks + their text tokens in a handful of flat arrays"""
+
+    def __init__(self, ids, offsets, text, text_offsets, voices, speakers):
+        self.ids = ids
+        self.offsets = offsets
+        self.text = text
+        self.text_offsets = text_offsets
+        self.voices = voices
+        self.speakers = speakers
+
+    @classmethod
+    def pack(cls, chunks):
+        """📦 From (voice_id, speaker, text, token ids) tuples"""
+        encoded = [text.encode("utf-8") for _, _, text, _ in chunks]
+        token_lengths = [len(ids) for _, _, _, ids in chunks]
+        return cls(
+            ids=np.fromiter((t for _, _, _, ids in chunks for t in ids), dtype=np.int32, count=sum(token_lengths)),
+            offsets=np.concatenate([[0], np.cumsum(token_lengths, dtype=np.int64)]),
+            text=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            text_offsets=np.concatenate([[0], np.cumsum([len(e) for e in encoded], dtype=np.int64)]),
+            voices=np.array([voice_id for voice_id, _, _, _ in chunks], dtype=np.int32),
+            speakers=np.array([speaker for _, speaker, _, _ in chunks], dtype=np.int32),
+        )
+
+    @classmethod
+    def concat(cls, parts):
+        """🔗 Glue packed batches of one chapter back together"""
+        parts = list(parts)
+        if len(parts) == 1:
+            return parts[0]
+
+        def _joined(values, offsets):
+            starts = np.cumsum([0] + [int(o[-1]) for o in offsets[:-1]])
+            joined_offsets = np.concatenate([[0]] + [o[1:] + start for o, start in zip(offsets, starts)])
+            return np.concatenate(values), joined_offsets.astype(np.int64)
+
+        ids, offsets = _joined([p.ids for p in parts], [p.offsets for p in parts])
+        text, text_offsets = _joined([p.text for p in parts], [p.text_offsets for p in parts])
+        return cls(
+            ids=ids.astype(np.int32),
+            offsets=offsets,
+            text=text.astype(np.uint8),
+            text_offsets=text_offsets,
+            voices=np.concatenate([p.voices for p in parts]).astype(np.int32),
+            speakers=np.concatenate([p.speakers for p in parts]).astype(np.int32),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in data.files})
+
+    def save(self, path):
+        """💾 path should end in .npz - numpy adds it otherwise"""
+        np.savez(
+            path,
+            ids=self.ids,
+            offsets=self.offsets,
+            text=self.text,
+            text_offsets=self.text_offsets,
+            voices=self.voices,
+            speakers=self.speakers,
+        )
+
+    def __len__(self):
+        return len(self.voices)
+
+    def __getitem__(self, i):
+        """(voice_id, speaker, text, token ids) of chunk i"""
+        text = self.text[self.text_offsets[i]:self.text_offsets[i + 1]].tobytes().decode("utf-8")
+        return int(self.voices[i]), int(self.speakers[i]), text, self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def token_counts(self):
+        return np.diff(self.offsets)
+
+    @property
+    def total_tokens(self):
+        return int(self.offsets[-1])
+
+
+def iter_chapter_chunks(text_path, voice_id=0, cast=None):
+    """🚰 (voice_id, speaker, text) for every chunk of a chapter - same chunks render would make"""
+    if not cast:
+        for text in iter_text_chunks(text_path):
+            yield voice_id, 0, text
+        return
+    speakers = speaker_ids(cast)
+    for chunk_voice, text in iter_dialogue_chunks(text_path, cast):
+        yield chunk_voice, speakers[chunk_voice], text
+
+
+def _encode_batch(batch, encode_texts):
+    ids = encode_texts([text for _, _, text in batch], [speaker for _, speaker, _ in batch])
+    return PackedChunks.pack(
+        [(voice, speaker, text, chunk_ids) for (voice, speaker, text), chunk_ids in zip(batch, ids)]
+    )
+
+
+def pretokenize_chapter(text_path, encode_texts, voice_id=0, cast=None, batch_size=PRETOKENIZE_BATCH):
+    """
+    🔤 Chunk a chapter and tokenize it batch_size chunks per encode_texts(texts, speakers) call
+
+    Only one batch of chunk strings is ever alive - the rest are already packed.
+    """
+    parts, batch = [], []
+    for chunk in iter_chapter_chunks(text_path, voice_id, cast):
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            parts.append(_encode_batch(batch, encode_texts))
+            batch = []
+    if batch or not parts:
+        parts.append(_encode_batch(batch, encode_texts) if batch else PackedChunks.pack([]))
+    return PackedChunks.concat(parts)
+
+
+def iter_pretokenized(text_paths, encode_texts, voice_id=0, cast=None, batch_size=PRETOKENIZE_BATCH):
+    """🚰 A PackedChunks per chapter, one chapter at a time - save each before asking for the next"""
+    for path in text_paths:
+        yield pretokenize_chapter(path, encode_texts, voice_id, cast, batch_size)
@@ -0,0 +1,123 @@
+"""
+🔬 Per-Job Profiling 🔬
+Runs torch.profiler over one book's render, on request, so a slow book
+can be diagnosed from its real text and voice instead of a hand-made repro.
+
+Each chunk is profiled on its own (start and stop on the thread that
+speaks it, no yields in between), and only the first `max_chunks` chunks
+of the book are captured, so the trace stays a reasonable size. When the
+book is done we write, next to its metadata:
+
+- data/books/{id}_profile.json - every captured chunk merged into one
+  Chrome trace (open it in chrome://tracing or ui.perfetto.dev)
+- data/books/{id}_profile.txt  - top ops by self time, summed over chunks
+
+generate_frame, Mimi decode and watermark() show up as named ranges
+(see the record_function calls in generator.py).
+"""
+
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+import torch
+
+# 🔒 torch.profiler is one per process - profiled chunks take turns
+_PROFILER_LOCK = threading.Lock()
+
+
+def _device_time(event):
+    # Renamed from self_cuda_time_total in newer torch
+    return getattr(event, "self_device_time_total", None) or getattr(event, "self_cuda_time_total", 0)
+
+
+class JobProfiler:
+    """🔬 Profiles the first few chunks of one book and writes a trace + summary"""
+
+    def __init__(self, book_id, root="data/books", max_chunks=8, top_ops=30):
+        self.book_id = book_id
+        self.trace_path = os.path.join(root, f"{book_id}_profile.json")
+        self.summary_path = os.path.join(root, f"{book_id}_profile.txt")
+        self.max_chunks = max_chunks
+        self.top_ops = top_ops
+        self.chunks = 0
+        self._claimed = 0
+        self._events = []
+        # op name -> [calls, self cpu us, total cpu us, self device us]
+        self._ops = {}
+        self._lock = threading.Lock()
+        self._activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            self._activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+    def _claim(self):
+        """🎟️ One of the first max_chunks chunks? (chapters render in parallel, so count under a lock)"""
+        with self._lock:
+            if self._claimed >= self.max_chunks:
+                return False
+            self._claimed += 1
+            return True
+
+    @contextlib.contextmanager
+    def chunk(self):
+        """⏱️ Profile whatever runs inside - a no-op once the chunk budget is spent"""
+        if not self._claim():
+            yield
+            return
+        with _PROFILER_LOCK:
+            with torch.profiler.profile(activities=self._activities) as prof:
+                yield
+            self._collect(prof)
+
+    def _collect(self, prof):
+        # export_chrome_trace only writes files - round-trip through a temp one to merge chunks
+        fd, tmp_path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            prof.export_chrome_trace(tmp_path)
+            with open(tmp_path, "r") as f:
+                events = json.load(f).get("traceEvents", [])
+        finally:
+            os.remove(tmp_path)
+
+        with self._lock:
+            self._events.extend(events)
+            for event in prof.key_averages():
+                op = self._ops.setdefault(event.key, [0, 0.0, 0.0, 0.0])
+                op[0] += event.count
+                op[1] += event.self_cpu_time_total
+                op[2] += event.cpu_time_total
+                op[3] += _device_time(event)
+            self.chunks += 1
+
+    def summary(self):
+        """📋 Top ops by self time, as a plain-text table"""
+        with self._lock:
+            ops = sorted(self._ops.items(), key=lambda item: item[1][1] + item[1][3], reverse=True)
+            chunks = self.chunks
+        lines = [
+            f"Profile of book {self.book_id} - {chunks} chunk(s)",
+            "",
+            f"{'op':<60} {'calls':>8} {'self cpu ms':>12} {'cpu total ms':>13} {'self device ms':>15}",
+        ]
+        for name, (calls, self_cpu, cpu_total, device) in ops[: self.top_ops]:
+            lines.append(
+                f"{name[:60]:<60} {calls:>8} {self_cpu / 1000:>12.1f} {cpu_total / 1000:>13.1f} {device / 1000:>15.1f}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """💾 Dump the merged trace and the summary - returns their paths, or None if nothing was captured"""
+        with self._lock:
+            if not self.chunks:
+                return None
+            trace = {"traceEvents": list(self._events)}
+        with open(self.trace_path, "w") as f:
+            json.dump(trace, f)
+        with open(self.summary_path, "w") as f:
+            f.write(self.summary())
+        logging.info(f"Profile of book {self.book_id} written to {self.trace_path} and {self.summary_path}")
+        return self.trace_path, self.summary_path
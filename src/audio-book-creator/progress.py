@@ -0,0 +1,184 @@
+"""
+📡 Live Progress 📡
+Fine-grained progress for every book being rendered, pushed to whoever is
+listening instead of being polled for.
+
+The render loop reports each finished chunk: which chapter it belongs to,
+how many audio frames it made and how long the model took. From that we
+keep per-book counters and work out frames/sec and an ETA. When the book
+was pre-tokenized (see pretokenize.py) the ETA goes by text tokens, so a
+chapter of long chunks doesn't look as quick as one of short ones. Every update is
+fanned out to asyncio subscribers (the SSE endpoints) with
+call_soon_threadsafe, so the generating threads never block on a slow
+client.
+"""
+
+import asyncio
+import threading
+import time
+
+# 🏁 Statuses after which a book's stream is finished
+TERMINAL_STATUSES = ("completed", "failed")
+
+# 📬 Updates a subscriber may fall behind by before old ones get dropped
+SUBSCRIBER_BACKLOG = 64
+
+
+class _BookProgress:
+    """📊 Counters for one book's current render"""
+
+    def __init__(self, chunk_counts, token_counts=None):
+        self.chunk_counts = dict(chunk_counts)
+        self.chunks_done = {index: 0 for index in chunk_counts}
+        self.token_counts = dict(token_counts) if token_counts else None
+        self.tokens_done = {index: 0 for index in chunk_counts}
+        self.chapters_done = set()
+        self.chapters_failed = set()
+        self.frames = 0
+        self.busy_s = 0.0
+        self.status = "processing"
+        self.started_at = time.time()
+        self.finished_at = None
+
+
+class ProgressTracker:
+    """📡 Per-book progress, published to SSE subscribers as it happens"""
+
+    def __init__(self, frame_ms=80):
+        self.frame_ms = frame_ms
+        self._lock = threading.Lock()
+        self._books = {}
+        # book_id (None = every book) -> set of (loop, queue)
+        self._subscribers = {}
+
+    def start(self, book_id, chunk_counts, token_counts=None):
+        """
+        🚦 A (re-)render begins - chunk_counts maps chapter index -> chunks in it,
+        token_counts (when we know them) chapter index -> text tokens in it
+        """
+        with self._lock:
+            self._books[book_id] = _BookProgress(chunk_counts, token_counts)
+        self._publish(book_id)
+
+    def chunk_done(self, book_id, index, frames, seconds, tokens=0):
+        """✅ One chunk spoken - called from the render loop"""
+        with self._lock:
+            book = self._books.get(book_id)
+            if book is None or index not in book.chunks_done:
+                return
+            book.chunks_done[index] += 1
+            book.tokens_done[index] += tokens
+            book.frames += frames
+            book.busy_s += seconds
+        self._publish(book_id)
+
+    def chapter_done(self, book_id, index, ok):
+        """📗 A chapter finished (or didn't)"""
+        with self._lock:
+            book = self._books.get(book_id)
+            if book is None or index not in book.chunks_done:
+                return
+            if ok:
+                book.chapters_done.add(index)
+                # The pre-count and the render can disagree by a chunk - trust the render
+                book.chunk_counts[index] = book.chunks_done[index]
+                if book.token_counts is not None:
+                    book.token_counts[index] = book.tokens_done[index]
+            else:
+                book.chapters_failed.add(index)
+        self._publish(book_id)
+
+    def finish(self, book_id, status):
+        """🏁 The book is done one way or another"""
+        with self._lock:
+            book = self._books.get(book_id)
+            if book is None:
+                return
+            book.status = status
+            book.finished_at = time.time()
+        self._publish(book_id)
+
+    def forget(self, book_id):
+        with self._lock:
+            self._books.pop(book_id, None)
+
+    def snapshot(self, book_id):
+        """📸 Where a book is at right now (None if we aren't tracking it)"""
+        with self._lock:
+            book = self._books.get(book_id)
+            return self._snapshot(book_id, book) if book is not None else None
+
+    def snapshots(self):
+        with self._lock:
+            return [self._snapshot(book_id, book) for book_id, book in self._books.items()]
+
+    def _snapshot(self, book_id, book):
+        chunks_total = sum(book.chunk_counts.values())
+        chunks_done = sum(book.chunks_done.values())
+        now = book.finished_at or time.time()
+        elapsed = now - book.started_at
+
+        # Pre-tokenized? Then we know how much text is left, not just how many chunks
+        tokens_total = sum(book.token_counts.values()) if book.token_counts is not None else None
+        tokens_done = sum(book.tokens_done.values())
+
+        # ETA from wall-clock throughput - that already accounts for sharing the model
+        eta_s = None
+        if book.status == "processing" and tokens_total and tokens_done:
+            eta_s = round(max(tokens_total - tokens_done, 0) * elapsed / tokens_done, 1)
+        elif book.status == "processing" and chunks_done:
+            eta_s = round((chunks_total - chunks_done) * elapsed / chunks_done, 1)
+
+        return {
+            "book_id": book_id,
+            "status": book.status,
+            "chapters_total": len(book.chunk_counts),
+            "chapters_done": len(book.chapters_done),
+            "chapters_failed": len(book.chapters_failed),
+            "chunks_total": chunks_total,
+            "chunks_done": chunks_done,
+            "tokens_total": tokens_total,
+            "tokens_done": tokens_done if tokens_total is not None else None,
+            "percent": round(100.0 * chunks_done / chunks_total, 1) if chunks_total else 0.0,
+            "audio_s": round(book.frames * self.frame_ms / 1000, 1),
+            "frames_per_sec": round(book.frames / book.busy_s, 2) if book.busy_s else None,
+            "elapsed_s": round(elapsed, 1),
+            "eta_s": eta_s,
+        }
+
+    def subscribe(self, book_id=None):
+        """👂 An asyncio.Queue of snapshots for one book (or all of them) - call from the event loop"""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_BACKLOG)
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(book_id, set()).add(entry)
+        return queue
+
+    def unsubscribe(self, queue, book_id=None):
+        with self._lock:
+            subscribers = self._subscribers.get(book_id, set())
+            for entry in [e for e in subscribers if e[1] is queue]:
+                subscribers.discard(entry)
+            if not subscribers:
+                self._subscribers.pop(book_id, None)
+
+    def _publish(self, book_id):
+        with self._lock:
+            book = self._books.get(book_id)
+            if book is None:
+                return
+            snapshot = self._snapshot(book_id, book)
+            targets = list(self._subscribers.get(book_id, ())) + list(self._subscribers.get(None, ()))
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, snapshot)
+            except RuntimeError:
+                # That subscriber's loop is gone - it'll unsubscribe itself on the way out
+                pass
+
+
+def _offer(queue, snapshot):
+    """📮 Runs on the subscriber's loop - drop the oldest update rather than block"""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(snapshot)
@@ -0,0 +1,49 @@
+"""
+Shared resampler registry.
+
+torchaudio.functional.resample rebuilds its sinc kernel on every call, and
+transforms.Resample only helps if somebody keeps it around. This keeps one
+transform per (orig_freq, new_freq, dtype, device) so the kernel is computed
+once per process and reused by every caller.
+"""
+
+import threading
+from typing import Dict, Tuple
+
+import torch
+import torchaudio
+
+_resamplers: Dict[Tuple[int, int, torch.dtype, str], torchaudio.transforms.Resample] = {}
+_lock = threading.Lock()
+
+
+def _device_key(device) -> str:
+    # "cuda" and "cuda:0" are the same device - don't build its kernel twice
+    device = torch.device(device)
+    if device.type == "cuda" and device.index is None:
+        device = torch.device("cuda", torch.cuda.current_device())
+    return str(device)
+
+
+def get_resampler(
+    orig_freq: int, new_freq: int, dtype: torch.dtype = torch.float32, device: str = "cpu"
+) -> torchaudio.transforms.Resample:
+    key = (int(orig_freq), int(new_freq), dtype, _device_key(device))
+    resampler = _resamplers.get(key)
+    if resampler is None:
+        with _lock:
+            resampler = _resamplers.get(key)
+            if resampler is None:
+                resampler = torchaudio.transforms.Resample(key[0], key[1], dtype=dtype).to(device)
+                _resamplers[key] = resampler
+    return resampler
+
+
+@torch.inference_mode()
+def resample(audio: torch.Tensor, orig_freq: int, new_freq: int) -> torch.Tensor:
+    """Drop-in for torchaudio.functional.resample that reuses cached kernels; a no-op if the rates match."""
+    if int(orig_freq) == int(new_freq):
+        return audio
+    if not audio.is_floating_point():
+        audio = audio.float()
+    return get_resampler(orig_freq, new_freq, audio.dtype, audio.device)(audio)
@@ -0,0 +1,146 @@
+"""
+🚦 Synthesis Scheduler 🚦
+Decides who gets the model next.
+
+- Priority classes: interactive previews always jump ahead of bulk book renders
+- Fair share: inside a class, the user who has burned the least model time goes next
+- Preemption: a job is a generator that yields after every chunk, so a
+  500-page book steps aside between chunks whenever someone else is waiting
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future
+
+# 🏷️ Priority classes - lower number wins
+INTERACTIVE = 0
+BULK = 1
+PRIORITIES = (INTERACTIVE, BULK)
+
+
+class Job:
+    """🎟️ One unit of scheduled work - a step generator plus who asked for it"""
+
+    def __init__(self, steps, user_id, priority, name):
+        self.steps = steps
+        self.user_id = user_id
+        self.priority = priority
+        self.name = name
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+        self.started = False
+
+
+def run_once(fn, *args, **kwargs):
+    """🎯 Wrap a plain call as a one-step job"""
+    yield from ()
+    return fn(*args, **kwargs)
+
+
+class SynthesisScheduler:
+    """
+    🧠 Runs step generators on a few worker threads, picking the next step by
+    priority class first and per-user fair share second.
+
+    A job's generator does one chunk of work per next() and returns its result
+    when done (StopIteration.value lands in the job's future). Jobs can be
+    cancelled through their future until their first step starts.
+    """
+
+    def __init__(self, workers=1):
+        self._cond = threading.Condition()
+        # priority -> user -> that user's jobs, oldest first
+        self._queues = {priority: defaultdict(deque) for priority in PRIORITIES}
+        # user -> seconds of model time used (fair-share virtual time)
+        self._usage = defaultdict(float)
+        self._running = 0
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"synthesis-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"SynthesisScheduler started with {workers} worker(s)")
+
+    def submit(self, steps, user_id="anonymous", priority=BULK, name=None):
+        """📨 Queue a step generator; returns a Future for its return value"""
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class: {priority}")
+        job = Job(steps, user_id, priority, name or "job")
+
+        with self._cond:
+            if not self._is_active(user_id):
+                # Newcomers start level with the least-served active user,
+                # so a user back from a break can't bank idle time and hog the model
+                active = [self._usage[u] for u in self._active_users()]
+                if active:
+                    self._usage[user_id] = max(self._usage[user_id], min(active))
+            self._queues[priority][user_id].append(job)
+            self._cond.notify()
+        return job.future
+
+    def stats(self):
+        """📊 Queue depth per priority class and model time per user"""
+        with self._cond:
+            return {
+                "running": self._running,
+                "queued": {
+                    "interactive": sum(len(q) for q in self._queues[INTERACTIVE].values()),
+                    "bulk": sum(len(q) for q in self._queues[BULK].values()),
+                },
+                "usage_seconds": {user: round(used, 3) for user, used in self._usage.items()},
+            }
+
+    def _active_users(self):
+        return {user for queues in self._queues.values() for user, jobs in queues.items() if jobs}
+
+    def _is_active(self, user_id):
+        return any(self._queues[priority][user_id] for priority in PRIORITIES)
+
+    def _pop_next(self):
+        """🎯 Highest priority class first, then the user with the least model time"""
+        for priority in PRIORITIES:
+            waiting = [(self._usage[user], jobs[0].submitted_at, user)
+                       for user, jobs in self._queues[priority].items() if jobs]
+            if waiting:
+                _, _, user = min(waiting)
+                return self._queues[priority][user].popleft()
+        return None
+
+    def _requeue(self, job):
+        # Back to the front of its own user's line - a user's jobs still finish in order
+        self._queues[job.priority][job.user_id].appendleft(job)
+        self._cond.notify()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._pop_next()
+                while job is None:
+                    self._cond.wait()
+                    job = self._pop_next()
+                if not job.started:
+                    job.started = True
+                    if not job.future.set_running_or_notify_cancel():
+                        # Cancelled while it was still waiting in line
+                        job.steps.close()
+                        continue
+                self._running += 1
+
+            started = time.monotonic()
+            finished = True
+            try:
+                next(job.steps)
+                finished = False
+            except StopIteration as stop:
+                job.future.set_result(stop.value)
+            except Exception as e:
+                logging.error(f"Scheduled job {job.name} failed: {e}")
+                job.future.set_exception(e)
+
+            with self._cond:
+                self._running -= 1
+                self._usage[job.user_id] += time.monotonic() - started
+                if not finished:
+                    self._requeue(job)
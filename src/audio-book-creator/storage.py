@@ -0,0 +1,168 @@
+"""
+🗄️ Book Metadata Store 🗄️
+Every book's metadata lives in data/books/{id}.json. This is the only
+code that reads or writes those files.
+
+- Writes go to a temp file in the same folder, get fsynced, then
+  os.replace()d over the old file. Readers see the old version or the new
+  one, never half of one.
+- Read-modify-write is serialized per book: a thread lock within the
+  process plus an flock on a sidecar .lock file across processes (where
+  fcntl exists). Different books never wait on each other.
+- Every write bumps a `version` counter. Pass expected_version to update()
+  to fail instead of clobbering a change you haven't seen.
+- Listing re-parses only files whose mtime/size changed since the last
+  listing.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import weakref
+
+try:
+    import fcntl
+except ImportError:  # Windows - in-process locking only
+    fcntl = None
+
+
+class VersionConflict(ValueError):
+    """💥 The book changed since the caller last read it"""
+
+    def __init__(self, book_id, expected, actual):
+        super().__init__(f"Book {book_id} is at version {actual}, expected {expected}")
+        self.book_id = book_id
+        self.expected = expected
+        self.actual = actual
+
+
+class BookStore:
+    """🗄️ Atomic, versioned, per-book-locked JSON metadata"""
+
+    def __init__(self, root="data/books"):
+        self.root = root
+        # Weak - a book's lock lives as long as someone holds or waits on it, so the dict never piles up
+        self._locks = weakref.WeakValueDictionary()
+        self._locks_guard = threading.Lock()
+        # filename -> ((mtime_ns, size, inode), book) for listing without re-parsing
+        self._listing_cache = {}
+        self._listing_guard = threading.Lock()
+
+    def path(self, book_id):
+        return os.path.join(self.root, f"{book_id}.json")
+
+    def _lock_path(self, book_id):
+        return os.path.join(self.root, f"{book_id}.lock")
+
+    def _thread_lock(self, book_id):
+        with self._locks_guard:
+            lock = self._locks.get(book_id)
+            if lock is None:
+                lock = self._locks[book_id] = threading.Lock()
+            return lock
+
+    @contextlib.contextmanager
+    def locked(self, book_id):
+        """🔐 Hold this book's lock (threads here and other processes) for a read-modify-write"""
+        with self._thread_lock(book_id):
+            if fcntl is None:
+                yield
+                return
+            with open(self._lock_path(book_id), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self, book_id):
+        """📖 Read a book's metadata (FileNotFoundError if there's no such book)"""
+        with open(self.path(book_id), "r") as f:
+            return json.load(f)
+
+    def _write(self, book):
+        """💾 Temp file + fsync + rename - never leaves a truncated JSON behind"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=f".{book['id']}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(book, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path(book["id"]))
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp_path)
+            raise
+
+    def create(self, book):
+        """🆕 Store a brand-new book at version 1"""
+        with self.locked(book["id"]):
+            if os.path.exists(self.path(book["id"])):
+                raise FileExistsError(f"Book {book['id']} already exists")
+            book["version"] = 1
+            self._write(book)
+            return book
+
+    def update(self, book_id, mutate=None, expected_version=None, **changes):
+        """✏️ Load, patch (fields and/or mutate(book)), bump the version and write back - all under the lock"""
+        with self.locked(book_id):
+            book = self.load(book_id)
+            version = book.get("version", 0)
+            if expected_version is not None and version != expected_version:
+                raise VersionConflict(book_id, expected_version, version)
+            book.update(changes)
+            if mutate is not None:
+                mutate(book)
+            book["version"] = version + 1
+            self._write(book)
+            return book
+
+    def update_chapter(self, book_id, index, **changes):
+        """✏️ Patch a few fields of one chapter's entry"""
+        return self.update(book_id, mutate=lambda book: book["chapters"][index].update(changes))
+
+    def delete(self, book_id):
+        """🗑️ Drop a book's metadata and its lock file; returns what it was"""
+        with self.locked(book_id):
+            book = self.load(book_id)
+            os.remove(self.path(book_id))
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._lock_path(book_id))
+        return book
+
+    def list(self):
+        """📚 Every book, re-reading only files that changed since last time"""
+        books, seen = [], set()
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.name.endswith(".json"):
+                    continue
+                seen.add(entry.name)
+                try:
+                    stat = entry.stat()
+                    # Every atomic write is a new inode - catches same-size rewrites within one mtime tick
+                    key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+                    with self._listing_guard:
+                        cached = self._listing_cache.get(entry.name)
+                    if cached is not None and cached[0] == key:
+                        books.append(cached[1])
+                        continue
+                    with open(entry.path, "r") as f:
+                        book = json.load(f)
+                except FileNotFoundError:
+                    # Deleted between scandir and open - it's just not in this listing
+                    continue
+                except (OSError, ValueError) as e:
+                    logging.error(f"Skipping unreadable book metadata {entry.path}: {e}")
+                    continue
+                with self._listing_guard:
+                    self._listing_cache[entry.name] = (key, book)
+                books.append(book)
+
+        with self._listing_guard:
+            for name in set(self._listing_cache) - seen:
+                del self._listing_cache[name]
+        return books
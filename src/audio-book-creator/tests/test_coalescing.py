@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+from coalescing import SingleFlight, job_fingerprint
+
+
+@pytest.fixture
+def flights():
+    return SingleFlight()
+
+
+def test_first_leads_the_rest_follow(flights):
+    assert flights.join("fp", "a") is None
+    assert flights.join("fp", "b") == "a"
+    assert flights.join("fp", "c") == "a"
+    assert flights.join("other", "d") is None
+    assert flights.in_flight() == {"a": ["b", "c"], "d": []}
+
+
+def test_land_hands_back_followers_and_closes_the_flight(flights):
+    flights.join("fp", "a")
+    flights.join("fp", "b")
+    assert flights.land("a") == ["b"]
+    assert flights.land("a") == []
+    # Done flights aren't shared - the next submission renders again
+    assert flights.join("fp", "c") is None
+
+
+def test_leave(flights):
+    flights.join("fp", "a")
+    flights.join("fp", "b")
+    flights.join("fp", "c")
+    flights.leave("b")
+    flights.leave("not-following")
+    assert flights.land("a") == ["c"]
+
+
+def test_promote_hands_the_flight_to_the_first_follower(flights):
+    flights.join("fp", "a")
+    flights.join("fp", "b")
+    flights.join("fp", "c")
+
+    assert flights.promote("a") == ("b", ["c"])
+    assert flights.join("fp", "d") == "b"
+    assert flights.land("a") == []
+    assert flights.land("b") == ["c", "d"]
+
+
+def test_promote_without_followers(flights):
+    flights.join("fp", "a")
+    assert flights.promote("a") is None
+    assert flights.promote("missing") is None
+    assert flights.join("fp", "b") is None
+
+
+def test_concurrent_joins_elect_one_leader(flights):
+    results = []
+    barrier = threading.Barrier(16)
+
+    def _join(book_id):
+        barrier.wait()
+        results.append((book_id, flights.join("fp", book_id)))
+
+    threads = [threading.Thread(target=_join, args=(f"book-{i}",)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    leaders = [book_id for book_id, leader in results if leader is None]
+    assert len(leaders) == 1
+    assert sorted(flights.land(leaders[0])) == sorted(book_id for book_id, _ in results if book_id != leaders[0])
+
+
+def test_fingerprint_ignores_typography_and_spacing(tmp_path):
+    plain, fancy = tmp_path / "plain.txt", tmp_path / "fancy.txt"
+    plain.write_text('He said "hi" - twice.\n\nThe end.\n', encoding="utf-8")
+    fancy.write_text("\ufeffHe  said “hi” – twice.\n\n\n\n  The end.  \n", encoding="utf-8")
+    assert job_fingerprint(str(plain), voice_id=0) == job_fingerprint(str(fancy), voice_id=0)
+
+
+def test_fingerprint_changes_with_text_params_and_paragraphs(tmp_path):
+    base = tmp_path / "base.txt"
+    base.write_text("One.\n\nTwo.\n", encoding="utf-8")
+    joined = tmp_path / "joined.txt"
+    joined.write_text("One.\nTwo.\n", encoding="utf-8")
+    other = tmp_path / "other.txt"
+    other.write_text("One.\n\nThree.\n", encoding="utf-8")
+
+    fingerprint = job_fingerprint(str(base), voice_id=0, seed=None)
+    assert job_fingerprint(str(joined), voice_id=0, seed=None) != fingerprint
+    assert job_fingerprint(str(other), voice_id=0, seed=None) != fingerprint
+    assert job_fingerprint(str(base), voice_id=1, seed=None) != fingerprint
+    assert job_fingerprint(str(base), voice_id=0, seed=7) != fingerprint
+
+
+def test_binary_formats_are_fingerprinted_by_their_bytes(tmp_path):
+    first, second = tmp_path / "a.epub", tmp_path / "b.epub"
+    first.write_bytes(b"PK\x03\x04 same bytes")
+    second.write_bytes(b"PK\x03\x04 same bytes")
+    assert job_fingerprint(str(first)) == job_fingerprint(str(second))
+
+    second.write_bytes(b"PK\x03\x04 other bytes")
+    assert job_fingerprint(str(first)) != job_fingerprint(str(second))
@@ -0,0 +1,103 @@
+import pytest
+
+from ingest import _clean_markdown_line, _is_text_heading, extract_chapters
+
+
+def _read(chapter):
+    with open(chapter["text_path"], "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _extract(tmp_path, name, text):
+    source = tmp_path / name
+    source.write_text(text, encoding="utf-8")
+    return extract_chapters(str(source), str(tmp_path / "chapter_"))
+
+
+@pytest.mark.parametrize(
+    "line",
+    ["Chapter 12", "CHAPTER IV", "Part One", "Book Twenty-One: The Return", "Prologue", "Chapter 3 - Home"],
+)
+def test_heading_lines(line):
+    assert _is_text_heading(line)
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "Part of him wanted to stay.",
+        "Book him, Danno.",
+        "Chapter and verse, she said",
+        "Prologues are overrated.",
+        "",
+        "Chapter " + "x" * 100,
+    ],
+)
+def test_prose_is_not_a_heading(line):
+    assert not _is_text_heading(line)
+
+
+def test_plain_text_splits_at_headings(tmp_path):
+    chapters = _extract(
+        tmp_path,
+        "book.txt",
+        "Chapter 1\n\nIt began.\n\nPart of him wanted to stay.\n\nChapter 2\n\nIt ended.\n",
+    )
+    assert [chapter["title"] for chapter in chapters] == ["Chapter 1", "Chapter 2"]
+    assert "Part of him wanted to stay." in _read(chapters[0])
+    assert _read(chapters[1]).strip() == "It ended."
+
+
+def test_heading_needs_a_blank_line_before_it(tmp_path):
+    chapters = _extract(tmp_path, "book.txt", "Chapter 1\n\nShe turned the page\nChapter 2 was missing.\n")
+    assert len(chapters) == 1
+    assert "Chapter 2 was missing." in _read(chapters[0])
+
+
+def test_text_before_the_first_heading_is_an_opening(tmp_path):
+    chapters = _extract(tmp_path, "book.txt", "A dedication.\n\nChapter 1\n\nText.\n")
+    assert [chapter["title"] for chapter in chapters] == ["Opening", "Chapter 1"]
+
+
+def test_empty_headings_are_read_not_dropped(tmp_path):
+    chapters = _extract(tmp_path, "book.txt", "Part One\n\nChapter 1\n\nText.\n\nEpilogue\n")
+    assert [chapter["title"] for chapter in chapters] == ["Chapter 1"]
+    text = _read(chapters[0])
+    assert text.startswith("Part One")
+    assert text.rstrip().endswith("Epilogue")
+
+
+def test_markdown_headings_and_markup(tmp_path):
+    chapters = _extract(
+        tmp_path,
+        "book.md",
+        "# The *First* One\n\nSome **bold** text and a [link](http://x).\n\n```\ncode()\n```\n## Second\n\nMore.\n",
+    )
+    assert [chapter["title"] for chapter in chapters] == ["The First One", "Second"]
+    text = _read(chapters[0])
+    assert "Some bold text and a link." in text
+    assert "code()" not in text
+
+
+@pytest.mark.parametrize(
+    "line, cleaned",
+    [
+        ("**bold** and _em_ and ***both***", "bold and em and both"),
+        ("snake_case_name stays", "snake_case_name stays"),
+        ("2*3*4 = 24", "2*3*4 = 24"),
+        ("x**y**z", "x**y**z"),
+        ("> quoted `code`", "quoted code"),
+    ],
+)
+def test_markdown_emphasis_only_when_it_wraps_text(line, cleaned):
+    assert _clean_markdown_line(line) == cleaned
+
+
+def test_unsupported_format(tmp_path):
+    with pytest.raises(ValueError):
+        _extract(tmp_path, "book.doc", "text")
+
+
+def test_no_text_at_all(tmp_path):
+    with pytest.raises(ValueError):
+        _extract(tmp_path, "book.txt", "\n\n   \n")
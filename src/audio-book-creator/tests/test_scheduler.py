@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import BULK, INTERACTIVE, SynthesisScheduler, run_once
+
+TIMEOUT = 5
+
+
+def _steps(log, label, count, seconds=0.005):
+    """count chunks of work, each logged and taking a few ms of 'model time'"""
+    for _ in range(count):
+        time.sleep(seconds)
+        log.append(label)
+        yield
+    return label
+
+
+@pytest.fixture
+def blocked():
+    """A one-worker scheduler with its worker stuck in a job until release() - queue things up meanwhile"""
+    scheduler = SynthesisScheduler(workers=1)
+    running, gate = threading.Event(), threading.Event()
+
+    def _block():
+        running.set()
+        gate.wait(TIMEOUT)
+
+    blocker = scheduler.submit(run_once(_block), user_id="blocker")
+    assert running.wait(TIMEOUT)
+
+    def release():
+        gate.set()
+        blocker.result(TIMEOUT)
+
+    yield scheduler, release
+    gate.set()
+
+
+def test_run_once_returns_its_result():
+    scheduler = SynthesisScheduler(workers=1)
+    assert scheduler.submit(run_once(sum, [1, 2, 3])).result(TIMEOUT) == 6
+
+
+def test_return_value_and_exceptions_land_in_the_future():
+    scheduler = SynthesisScheduler(workers=1)
+    assert scheduler.submit(_steps([], "a", 2)).result(TIMEOUT) == "a"
+
+    def _broken():
+        yield
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        scheduler.submit(_broken()).result(TIMEOUT)
+
+
+def test_unknown_priority_is_rejected():
+    scheduler = SynthesisScheduler(workers=1)
+    with pytest.raises(ValueError):
+        scheduler.submit(run_once(int), priority=7)
+
+
+def test_interactive_jumps_ahead_of_bulk(blocked):
+    scheduler, release = blocked
+    log = []
+    bulk = scheduler.submit(_steps(log, "bulk", 3), user_id="a", priority=BULK)
+    interactive = scheduler.submit(_steps(log, "preview", 1), user_id="b", priority=INTERACTIVE)
+    release()
+    bulk.result(TIMEOUT)
+    interactive.result(TIMEOUT)
+    assert log == ["preview", "bulk", "bulk", "bulk"]
+
+
+def test_interactive_preempts_a_running_bulk_job_between_chunks():
+    scheduler = SynthesisScheduler(workers=1)
+    log = []
+    first_chunk = threading.Event()
+
+    def _book():
+        for _ in range(3):
+            log.append("bulk")
+            first_chunk.set()
+            time.sleep(0.05)
+            yield
+
+    bulk = scheduler.submit(_book(), user_id="a", priority=BULK)
+    assert first_chunk.wait(TIMEOUT)
+    preview = scheduler.submit(_steps(log, "preview", 1), user_id="b", priority=INTERACTIVE)
+    preview.result(TIMEOUT)
+    bulk.result(TIMEOUT)
+    assert log.index("preview") < 3
+    assert log.count("bulk") == 3
+
+
+def test_least_served_user_goes_next_within_a_class(blocked):
+    scheduler, release = blocked
+    log = []
+    heavy = scheduler.submit(_steps(log, "heavy", 3, seconds=0.05), user_id="alice")
+    light = scheduler.submit(_steps(log, "light", 3, seconds=0.002), user_id="bob")
+    release()
+    heavy.result(TIMEOUT)
+    light.result(TIMEOUT)
+    # One heavy chunk outweighs all of the light user's chunks together
+    assert log == ["heavy", "light", "light", "light", "heavy", "heavy"]
+
+
+def test_a_users_jobs_finish_in_order(blocked):
+    scheduler, release = blocked
+    log = []
+    first = scheduler.submit(_steps(log, "first", 2), user_id="alice")
+    second = scheduler.submit(_steps(log, "second", 2), user_id="alice")
+    release()
+    first.result(TIMEOUT)
+    second.result(TIMEOUT)
+    assert log == ["first", "first", "second", "second"]
+
+
+def test_cancelled_while_queued_never_runs(blocked):
+    scheduler, release = blocked
+    log = []
+    job = scheduler.submit(_steps(log, "never", 1), user_id="alice")
+    assert job.cancel()
+    after = scheduler.submit(_steps(log, "after", 1), user_id="alice")
+    release()
+    after.result(TIMEOUT)
+    assert log == ["after"]
+
+
+def test_stats_report_queues_and_usage(blocked):
+    scheduler, release = blocked
+    scheduler.submit(_steps([], "a", 1), user_id="alice", priority=BULK)
+    scheduler.submit(_steps([], "b", 1), user_id="bob", priority=INTERACTIVE)
+    stats = scheduler.stats()
+    assert stats["running"] == 1
+    assert stats["queued"] == {"interactive": 1, "bulk": 1}
+    release()
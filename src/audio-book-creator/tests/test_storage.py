@@ -0,0 +1,153 @@
+import gc
+import json
+import os
+import threading
+
+import pytest
+
+import storage
+from storage import BookStore, VersionConflict
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BookStore(str(tmp_path))
+
+
+def _book(book_id, **fields):
+    return {"id": book_id, "status": "pending", **fields}
+
+
+def test_create_load_update(store):
+    store.create(_book("a"))
+    assert store.load("a")["version"] == 1
+
+    book = store.update("a", status="processing")
+    assert book["status"] == "processing"
+    assert book["version"] == 2
+    assert store.load("a") == book
+
+
+def test_create_twice_fails(store):
+    store.create(_book("a"))
+    with pytest.raises(FileExistsError):
+        store.create(_book("a"))
+
+
+def test_missing_book(store):
+    with pytest.raises(FileNotFoundError):
+        store.load("nope")
+    with pytest.raises(FileNotFoundError):
+        store.update("nope", status="failed")
+
+
+def test_failed_write_keeps_the_old_file(store, tmp_path):
+    store.create(_book("a"))
+    before = (tmp_path / "a.json").read_text()
+
+    with pytest.raises(TypeError):
+        store.update("a", unserializable=object())
+
+    assert (tmp_path / "a.json").read_text() == before
+    assert sorted(os.listdir(tmp_path)) == ["a.json", "a.lock"]
+
+
+def test_writes_replace_the_file_whole(store, tmp_path):
+    store.create(_book("a"))
+    inode = os.stat(tmp_path / "a.json").st_ino
+    store.update("a", status="completed")
+    assert os.stat(tmp_path / "a.json").st_ino != inode
+    assert json.loads((tmp_path / "a.json").read_text())["status"] == "completed"
+
+
+def test_expected_version(store):
+    store.create(_book("a"))
+    store.update("a", expected_version=1, status="processing")
+
+    with pytest.raises(VersionConflict) as conflict:
+        store.update("a", expected_version=1, status="failed")
+    assert (conflict.value.expected, conflict.value.actual) == (1, 2)
+    assert store.load("a")["status"] == "processing"
+
+
+def test_update_chapter(store):
+    store.create(_book("a", chapters=[{"status": "pending"}, {"status": "pending"}]))
+    store.update_chapter("a", 1, status="completed")
+    assert [chapter["status"] for chapter in store.load("a")["chapters"]] == ["pending", "completed"]
+
+
+def test_concurrent_updates_lose_nothing(store):
+    store.create(_book("a", count=0))
+    threads, per_thread = 8, 25
+
+    def _bump(book):
+        book["count"] += 1
+
+    def _worker():
+        for _ in range(per_thread):
+            store.update("a", mutate=_bump)
+
+    workers = [threading.Thread(target=_worker) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    book = store.load("a")
+    assert book["count"] == threads * per_thread
+    assert book["version"] == 1 + threads * per_thread
+
+
+def test_locks_dont_pile_up(store):
+    for i in range(20):
+        store.create(_book(f"book-{i}"))
+        store.update(f"book-{i}", status="completed")
+    gc.collect()
+    assert len(store._locks) == 0
+
+
+def test_delete(store, tmp_path):
+    store.create(_book("a"))
+    assert store.delete("a")["id"] == "a"
+    assert os.listdir(tmp_path) == []
+    with pytest.raises(FileNotFoundError):
+        store.delete("a")
+
+
+def test_listing_only_rereads_changed_books(store, monkeypatch):
+    for book_id in ("a", "b", "c"):
+        store.create(_book(book_id))
+    assert sorted(book["id"] for book in store.list()) == ["a", "b", "c"]
+
+    loads = []
+    real_load = storage.json.load
+    monkeypatch.setattr(storage.json, "load", lambda f: loads.append(f.name) or real_load(f))
+
+    assert len(store.list()) == 3
+    assert loads == []
+
+    store.update("b", status="completed")
+    loads.clear()
+    listed = {book["id"]: book for book in store.list()}
+    assert [os.path.basename(name) for name in loads] == ["b.json"]
+    assert listed["b"]["status"] == "completed"
+
+
+def test_listing_sees_same_size_rewrites(store):
+    store.create(_book("a", status="aaaa"))
+    store.list()
+    # Same length, likely the same mtime tick - only the new inode gives it away
+    store.update("a", status="bbbb")
+    assert store.list()[0]["status"] == "bbbb"
+
+
+def test_listing_drops_deleted_and_skips_junk(store, tmp_path):
+    store.create(_book("a"))
+    store.create(_book("b"))
+    store.list()
+    store.delete("a")
+    (tmp_path / "broken.json").write_text("{not json")
+    (tmp_path / ".a.123.tmp").write_text("{}")
+
+    assert [book["id"] for book in store.list()] == ["b"]
+    assert "a.json" not in store._listing_cache
@@ -0,0 +1,66 @@
+import pytest
+
+from text_processing import iter_chunks, iter_normalized, iter_sentences, iter_text_chunks, normalize_text
+
+
+@pytest.mark.parametrize(
+    "text, spoken",
+    [
+        ("Dr. Smith arrived.", "Doctor Smith arrived."),
+        ("It cost $3.50 today.", "It cost three dollars fifty cents today."),
+        ("She was 21 in 1984.", "She was twenty-one in nineteen eighty-four."),
+        ("The 3rd of 1,200 tries.", "The third of one thousand two hundred tries."),
+        ("Pi is 3.14.", "Pi is three point one four."),
+        ("Up 15% this year.", "Up fifteen percent this year."),
+        ("“Quoted” — and done…", '"Quoted", and done...'),
+    ],
+)
+def test_normalize_text(text, spoken):
+    assert normalize_text(text) == spoken
+
+
+@pytest.mark.parametrize(
+    "text, spoken",
+    [
+        ("Meet at 10:30 sharp.", "Meet at ten thirty sharp."),
+        ("By 9:05 or 7:00.", "By nine oh five or seven o'clock."),
+        ("It's 14:45 now.", "It's fourteen forty-five now."),
+    ],
+)
+def test_clock_times(text, spoken):
+    assert normalize_text(text) == spoken
+
+
+@pytest.mark.parametrize(
+    "text, spoken",
+    [
+        ("Update to 2.0.1 now.", "Update to two point zero point one now."),
+        ("Get v3.10.2 today.", "Get version three point ten point two today."),
+    ],
+)
+def test_version_strings_read_group_by_group(text, spoken):
+    assert normalize_text(text) == spoken
+
+
+def test_numbers_survive_being_split_across_pieces():
+    pieces = ["It cost $3", ".50 and took 10:", "30 to get."]
+    assert "".join(iter_normalized(pieces)).strip() == "It cost three dollars fifty cents and took ten thirty to get."
+
+
+def test_sentences_split_on_end_punctuation():
+    assert list(iter_sentences(["One here. Two there! Three", " at last?"])) == [
+        "One here.", "Two there!", "Three at last?"
+    ]
+
+
+def test_chunks_never_exceed_max_chars():
+    sentences = ["Short one.", "A much longer sentence, with commas, that has to be broken up somewhere sensible."]
+    chunks = list(iter_chunks(sentences, max_chars=30))
+    assert all(len(chunk) <= 30 for chunk in chunks)
+    assert " ".join(chunks).split() == " ".join(sentences).split()
+
+
+def test_text_file_pipeline(tmp_path):
+    path = tmp_path / "book.txt"
+    path.write_text("\ufeffMr. Brown paid $5. He left at 6:15.\n", encoding="utf-8")
+    assert list(iter_text_chunks(str(path))) == ["Mister Brown paid five dollars. He left at six fifteen."]
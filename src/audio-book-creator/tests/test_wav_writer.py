@@ -0,0 +1,100 @@
+import os
+import struct
+import wave
+
+import pytest
+
+from wav_writer import StreamingWavWriter
+
+SAMPLE_RATE = 24000
+
+
+def _write_pcm(path, samples, sample_rate=SAMPLE_RATE, channels=1):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(struct.pack(f"<{len(samples)}h", *samples))
+
+
+def _read_pcm(path):
+    with wave.open(str(path), "rb") as wav:
+        assert (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) == (1, 2, SAMPLE_RATE)
+        frames = wav.readframes(wav.getnframes())
+    return list(struct.unpack(f"<{len(frames) // 2}h", frames))
+
+
+def test_append_wav_stitches_files_in_order(tmp_path):
+    first, second = tmp_path / "a.wav", tmp_path / "b.wav"
+    _write_pcm(first, [1, 2, 3])
+    _write_pcm(second, [-4, 5])
+    out = tmp_path / "book.wav"
+
+    with StreamingWavWriter(str(out), SAMPLE_RATE) as writer:
+        writer.append_wav(str(first))
+        writer.append_wav(str(second))
+
+    assert writer.frames == 5
+    assert _read_pcm(out) == [1, 2, 3, -4, 5]
+
+
+def test_appending_in_blocks_copies_everything(tmp_path, monkeypatch):
+    monkeypatch.setattr("wav_writer.COPY_BLOCK_FRAMES", 4)
+    source = tmp_path / "long.wav"
+    samples = list(range(-500, 500, 7))
+    _write_pcm(source, samples)
+    out = tmp_path / "book.wav"
+
+    with StreamingWavWriter(str(out), SAMPLE_RATE) as writer:
+        writer.append_wav(str(source))
+
+    assert _read_pcm(out) == samples
+
+
+def test_file_only_appears_once_closed(tmp_path):
+    source = tmp_path / "a.wav"
+    _write_pcm(source, [7] * 10)
+    out = tmp_path / "book.wav"
+
+    writer = StreamingWavWriter(str(out), SAMPLE_RATE)
+    writer.append_wav(str(source))
+    assert not out.exists()
+    assert os.path.exists(f"{out}.part")
+
+    assert writer.close() == str(out)
+    assert out.exists()
+    assert not os.path.exists(f"{out}.part")
+
+
+def test_failure_leaves_no_file_behind(tmp_path):
+    out = tmp_path / "book.wav"
+    out.write_bytes(b"the finished one from last time")
+
+    with pytest.raises(RuntimeError):
+        with StreamingWavWriter(str(out), SAMPLE_RATE):
+            raise RuntimeError("render failed")
+
+    assert out.read_bytes() == b"the finished one from last time"
+    assert not os.path.exists(f"{out}.part")
+
+
+@pytest.mark.parametrize("sample_rate, channels", [(16000, 1), (SAMPLE_RATE, 2)])
+def test_mismatched_wav_is_rejected(tmp_path, sample_rate, channels):
+    source = tmp_path / "odd.wav"
+    _write_pcm(source, [0] * 8, sample_rate=sample_rate, channels=channels)
+
+    with pytest.raises(ValueError):
+        with StreamingWavWriter(str(tmp_path / "book.wav"), SAMPLE_RATE) as writer:
+            writer.append_wav(str(source))
+
+
+def test_write_converts_floats_to_clamped_pcm(tmp_path):
+    torch = pytest.importorskip("torch")
+    out = tmp_path / "chunk.wav"
+
+    with StreamingWavWriter(str(out), SAMPLE_RATE) as writer:
+        writer.write(torch.tensor([0.0, 0.5, -0.5, 2.0, -2.0]))
+        writer.write(torch.tensor([[1.0]]))
+
+    assert writer.frames == 6
+    assert _read_pcm(out) == [0, 16384, -16384, 32767, -32767, 32767]
@@ -0,0 +1,292 @@
+"""
+📝 Text Pipeline 📝
+Turns a manuscript on disk into bite-sized, speakable chunks.
+
+Every stage is a generator, so a book flows through in small pieces:
+decode -> normalize -> split into sentences -> pack into chunks.
+Memory stays flat no matter how thicc the manuscript is.
+"""
+
+import codecs
+import re
+
+# 📦 How many bytes we pull off disk at a time
+READ_CHUNK_SIZE = 64 * 1024
+
+# ✂️ Biggest chunk of text handed to the model in one go
+MAX_CHUNK_CHARS = 400
+
+# 🚧 Safety valve - text with no sentence breaks gets force-split past this
+MAX_BUFFER_CHARS = 4 * MAX_CHUNK_CHARS
+
+# 💬 Fancy typography -> plain stuff the tokenizer actually likes
+_CHAR_REPLACEMENTS = {
+    "“": '"', "”": '"', "„": '"', "‟": '"',
+    "«": '"', "»": '"',
+    "‘": "'", "’": "'", "‚": "'", "‛": "'",
+    "–": "-", "…": "...",
+    "\u00a0": " ", "\ufeff": "",
+}
+_CHAR_TABLE = str.maketrans(_CHAR_REPLACEMENTS)
+
+# 🎓 Abbreviations that would otherwise trip up sentence splitting
+_ABBREVIATIONS = {
+    "Mr.": "Mister",
+    "Mrs.": "Missus",
+    "Ms.": "Miz",
+    "Dr.": "Doctor",
+    "Prof.": "Professor",
+    "St.": "Saint",
+    "Jr.": "Junior",
+    "Sr.": "Senior",
+    "Mt.": "Mount",
+    "vs.": "versus",
+    "etc.": "et cetera",
+    "e.g.": "for example",
+    "i.e.": "that is",
+    "a.m.": "A M",
+    "p.m.": "P M",
+}
+_ABBREVIATION_PATTERN = re.compile(
+    r"(?<![\w.])(" + "|".join(re.escape(a) for a in _ABBREVIATIONS) + r")(?=\W|$)"
+)
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+_DASH_PATTERN = re.compile(r"\s*—\s*")
+_NUMBER_PATTERN = re.compile(
+    r"(?<![\w.])([$£€])?(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d+))?(st|nd|rd|th|%)?(?![\w]|\.\d)"
+)
+# 🕙 10:30 -> ten thirty (not inside 1:30:00 durations)
+_TIME_PATTERN = re.compile(r"(?<![\w:])(\d{1,2}):(\d{2})\b(?!:\d)")
+# 🏷️ 2.0.1 / v3.10.2 - dotted version strings, read group by group
+_VERSION_PATTERN = re.compile(r"(?<![\w.])(v)?(\d+(?:\.\d+){2,})(?![\w]|\.\d)")
+_CURRENCIES = {"$": ("dollar", "cent"), "£": ("pound", "penny"), "€": ("euro", "cent")}
+_SENTENCE_END_PATTERN = re.compile(r"[.!?]+[\"')\]]*(?=\s)")
+
+_ONES = [
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine",
+    "ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen",
+    "seventeen", "eighteen", "nineteen",
+]
+_TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+_SCALES = [(10**12, "trillion"), (10**9, "billion"), (10**6, "million"), (1000, "thousand")]
+_ORDINAL_IRREGULAR = {
+    "one": "first", "two": "second", "three": "third", "five": "fifth",
+    "eight": "eighth", "nine": "ninth", "twelve": "twelfth",
+}
+
+
+def _int_to_words(n):
+    """🔢 Spell out a non-negative integer"""
+    if n < 20:
+        return _ONES[n]
+    if n < 100:
+        tens, ones = divmod(n, 10)
+        return _TENS[tens] + (f"-{_ONES[ones]}" if ones else "")
+    if n < 1000:
+        hundreds, rest = divmod(n, 100)
+        return f"{_ONES[hundreds]} hundred" + (f" {_int_to_words(rest)}" if rest else "")
+    for scale, name in _SCALES:
+        if n >= scale:
+            head, rest = divmod(n, scale)
+            return f"{_int_to_words(head)} {name}" + (f" {_int_to_words(rest)}" if rest else "")
+    return str(n)
+
+
+def _year_to_words(n):
+    """📅 Read a year the way people actually say it (1984 -> nineteen eighty-four)"""
+    century, rest = divmod(n, 100)
+    if rest == 0:
+        return f"{_int_to_words(century)} hundred"
+    if rest < 10:
+        return f"{_int_to_words(century)} oh {_ONES[rest]}"
+    return f"{_int_to_words(century)} {_int_to_words(rest)}"
+
+
+def _ordinal(words):
+    """🥇 Turn 'twenty-one' into 'twenty-first'"""
+    head, sep, last = words.rpartition(" ") if "-" not in words else words.rpartition("-")
+    if last in _ORDINAL_IRREGULAR:
+        last = _ORDINAL_IRREGULAR[last]
+    elif last.endswith("y"):
+        last = last[:-1] + "ieth"
+    else:
+        last = last + "th"
+    return head + sep + last
+
+
+def _plural(n, unit):
+    if n == 1:
+        return unit
+    return "pence" if unit == "penny" else unit + "s"
+
+
+def _expand_currency(symbol, n, fraction):
+    """💸 $3.50 -> three dollars fifty cents"""
+    major, minor = _CURRENCIES[symbol]
+    words = f"{_int_to_words(n)} {_plural(n, major)}"
+    if fraction:
+        cents = int(fraction[:2].ljust(2, "0"))
+        if cents:
+            words += f" {_int_to_words(cents)} {_plural(cents, minor)}"
+    return words
+
+
+def _expand_time(match):
+    """🕙 10:30 -> ten thirty, 9:05 -> nine oh five, 7:00 -> seven o'clock"""
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if hours > 24 or minutes > 59:
+        return match.group(0)
+    if minutes == 0:
+        return f"{_int_to_words(hours)} o'clock"
+    if minutes < 10:
+        return f"{_int_to_words(hours)} oh {_ONES[minutes]}"
+    return f"{_int_to_words(hours)} {_int_to_words(minutes)}"
+
+
+def _expand_version(match):
+    """🏷️ 2.0.1 -> two point zero point one - one number per group, not a decimal"""
+    words = " point ".join(_int_to_words(int(group)) for group in match.group(2).split("."))
+    return f"version {words}" if match.group(1) else words
+
+
+def _expand_number(match):
+    symbol, integer, fraction, suffix = match.groups()
+    n = int(integer.replace(",", ""))
+
+    if symbol and suffix is None:
+        return _expand_currency(symbol, n, fraction)
+
+    if suffix in ("st", "nd", "rd", "th"):
+        return _ordinal(_int_to_words(n))
+
+    if fraction is None and "," not in integer and len(integer) == 4 and 1100 <= n <= 1999:
+        words = _year_to_words(n)
+    else:
+        words = _int_to_words(n)
+
+    if fraction is not None:
+        words += " point " + " ".join(_ONES[int(d)] for d in fraction)
+    if suffix == "%":
+        words += " percent"
+    if symbol:
+        words = f"{symbol}{words}"
+    return words
+
+
+def normalize_text(text):
+    """
+    🧽 Clean up a piece of text so it reads well out loud
+
+    Straightens quotes, expands abbreviations, spells out numbers and
+    collapses whitespace. Leading/trailing whitespace is kept as a single
+    space so pieces can be glued back together.
+    """
+    text = text.translate(_CHAR_TABLE)
+    text = _DASH_PATTERN.sub(", ", text)
+    text = _ABBREVIATION_PATTERN.sub(lambda m: _ABBREVIATIONS[m.group(1)], text)
+    text = _TIME_PATTERN.sub(_expand_time, text)
+    text = _VERSION_PATTERN.sub(_expand_version, text)
+    text = _NUMBER_PATTERN.sub(_expand_number, text)
+    return _WHITESPACE_PATTERN.sub(" ", text)
+
+
+def iter_decoded(path, chunk_size=READ_CHUNK_SIZE, encoding="utf-8-sig"):
+    """📖 Yield decoded text from a file a few KB at a time"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    with open(path, "rb") as f:
+        while True:
+            raw = f.read(chunk_size)
+            if not raw:
+                break
+            text = decoder.decode(raw)
+            if text:
+                yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_normalized(pieces):
+    """🧽 Normalize a stream of text pieces, only cutting on whitespace"""
+    carry = ""
+    for piece in pieces:
+        text = carry + piece
+        # Never normalize across a half-read word or number
+        cut = max(text.rfind(" "), text.rfind("\n"), text.rfind("\t"))
+        if cut == -1:
+            if len(text) < MAX_BUFFER_CHARS:
+                carry = text
+                continue
+            cut = len(text)
+        yield normalize_text(text[:cut])
+        carry = text[cut:]
+    if carry:
+        yield normalize_text(carry)
+
+
+def iter_sentences(pieces):
+    """🗣️ Split a stream of normalized text into sentences"""
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        start = 0
+        for match in _SENTENCE_END_PATTERN.finditer(buffer):
+            sentence = buffer[start:match.end()].strip()
+            if sentence:
+                yield sentence
+            start = match.end()
+        buffer = buffer[start:]
+
+        # No punctuation for ages? Cut it at a space before the buffer balloons
+        while len(buffer) > MAX_BUFFER_CHARS:
+            cut = buffer.rfind(" ", 0, MAX_BUFFER_CHARS)
+            if cut <= 0:
+                cut = MAX_BUFFER_CHARS
+            sentence = buffer[:cut].strip()
+            if sentence:
+                yield sentence
+            buffer = buffer[cut:]
+    tail = buffer.strip()
+    if tail:
+        yield tail
+
+
+def _split_long_sentence(sentence, max_chars):
+    """🔪 Break a monster sentence at commas, then spaces"""
+    while len(sentence) > max_chars:
+        cut = sentence.rfind(", ", 0, max_chars)
+        if cut > 0:
+            cut += 1
+        else:
+            cut = sentence.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        yield sentence[:cut].strip()
+        sentence = sentence[cut:].strip()
+    if sentence:
+        yield sentence
+
+
+def iter_chunks(sentences, max_chars=MAX_CHUNK_CHARS):
+    """📦 Pack sentences into chunks of at most max_chars"""
+    chunk = ""
+    for sentence in sentences:
+        for part in _split_long_sentence(sentence, max_chars):
+            if chunk and len(chunk) + 1 + len(part) > max_chars:
+                yield chunk
+                chunk = part
+            else:
+                chunk = f"{chunk} {part}" if chunk else part
+    if chunk:
+        yield chunk
+
+
+def iter_text_chunks(path, max_chars=MAX_CHUNK_CHARS):
+    """🚰 The whole pipeline - file on disk in, speakable chunks out"""
+    return iter_chunks(iter_sentences(iter_normalized(iter_decoded(path))), max_chars)
+
+
+def preview_text(text, max_chars):
+    """👀 Just the opening sentence(s) of some text, normalized and capped at max_chars"""
+    return next(iter_chunks(iter_sentences(iter_normalized([text])), max_chars), "")
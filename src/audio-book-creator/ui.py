@@ -7,11 +7,15 @@ that Sesame CSM-1b model! Vibes for days...
 import streamlit as st
 import requests
 import os
+import json
 import time
 
 # 🌐 API stuff - change if ur hosting elsewhere
 API_URL = "http://localhost:8000"
 
+# 📡 The API sends a keep-alive every 15s - give up on the stream if it goes quiet way longer
+PROGRESS_READ_TIMEOUT = 60
+
 # 🎨 Page setup - making it look cute
 st.set_page_config(
     page_title="Audiobook Creator",
@@ -77,12 +81,6 @@ if 'audiobooks' not in st.session_state:
     st.session_state.audiobooks = []
 if 'selected_book' not in st.session_state:
     st.session_state.selected_book = None
-if 'refresh_interval' not in st.session_state:
-    st.session_state.refresh_interval = 5  # seconds to wait between vibes
-if 'progress_value' not in st.session_state:
-    st.session_state.progress_value = 0.0
-if 'progress_bars' not in st.session_state:
-    st.session_state.progress_bars = []
 
 # 🛠️ Helper functions - doing the heavy lifting
 
@@ -127,6 +125,20 @@ def create_audiobook(title, author, voice_id, text_file=None, text_content=None)
         st.error(f"Error: {str(e)}")
         return None
 
+def preview_voice(voice_id, text):
+    """🎧 Get a quick taste of a voice - first sentence only"""
+    try:
+        response = requests.post(
+            f"{API_URL}/preview",
+            data={"text": text, "voice_id": voice_id}
+        )
+        if response.status_code == 200:
+            return response.content
+        st.error(f"Error previewing voice: {response.text}")
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+    return None
+
 def delete_audiobook(book_id):
     """🗑️ Yeet a book into oblivion - delete it from existence"""
     try:
@@ -162,6 +174,21 @@ def get_audio_url(book_id):
     """🔊 Get URL for the audio file - bops only"""
     return f"{API_URL}/audiobook/{book_id}/audio"
 
+def get_chapter_audio_url(book_id, index):
+    """🔉 Get URL for a single chapter's audio"""
+    return f"{API_URL}/audiobook/{book_id}/chapters/{index}/audio"
+
+def rerender_chapter(book_id, index):
+    """🔁 Ask the API to redo one chapter"""
+    try:
+        response = requests.post(f"{API_URL}/audiobook/{book_id}/chapters/{index}/render")
+        if response.status_code == 200:
+            st.success("Chapter re-render started!")
+        else:
+            st.error(f"Error re-rendering chapter: {response.text}")
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+
 def format_status(status):
     """💄 Make status look cute with different colors"""
     if status == "pending":
@@ -175,27 +202,69 @@ def format_status(status):
     else:
         return status
 
-# 🔄 Auto-refresh function - keeping our content fresh
-def auto_refresh():
-    if st.session_state.get('auto_refresh', False):
-        # Any books still cooking?
-        has_processing = any(book.get('status') == 'processing' for book in st.session_state.audiobooks)
-        
-        if has_processing:
-            # Update progress animation - make it pulse
-            if "progress_value" in st.session_state:
-                # Wavy animation vibe
-                st.session_state.progress_value = (st.session_state.progress_value + 0.05) % 1.0
-            
-            # Get fresh data
-            fetch_audiobooks()
-            
-            # Update the book we're looking at
-            if st.session_state.selected_book:
-                book_id = st.session_state.selected_book["id"]
-                updated_book = get_audiobook(book_id)
-                if updated_book:
-                    st.session_state.selected_book = updated_book
+# 📡 Live progress - the API pushes it, we just listen
+def stream_progress(book_id=None):
+    """📡 Yield progress snapshots from the API's SSE stream (one book, or all of them)"""
+    url = f"{API_URL}/audiobook/{book_id}/progress" if book_id else f"{API_URL}/progress"
+    with requests.get(url, stream=True, timeout=(5, PROGRESS_READ_TIMEOUT)) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            # Keep-alives are ": comment" lines - only data lines carry snapshots
+            if line and line.startswith("data:"):
+                yield json.loads(line[len("data:"):])
+
+def format_duration(seconds):
+    """⏱️ 185 -> '3m 05s'"""
+    if seconds is None:
+        return "estimating..."
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+def show_progress(slot, snapshot):
+    """📊 Draw a snapshot into a placeholder - bar plus chunks, speed and ETA"""
+    if "chunks_total" not in snapshot:
+        slot.info("Audio generation in progress...")
+        return
+    fps = snapshot.get("frames_per_sec")
+    label = f'{snapshot["chunks_done"]}/{snapshot["chunks_total"]} chunks'
+    label += f' · chapter {snapshot["chapters_done"]}/{snapshot["chapters_total"]} done'
+    if fps:
+        label += f' · {fps:.1f} frames/s'
+    label += f' · ETA {format_duration(snapshot["eta_s"])}'
+    slot.progress(min(1.0, snapshot["percent"] / 100), text=label)
+
+def follow_progress(progress_slots):
+    """🔄 Keep the progress bars live until a chapter or book we're showing finishes, then redraw"""
+    chapters_seen = {}
+    try:
+        for snapshot in stream_progress():
+            book_id = snapshot["book_id"]
+            if book_id not in progress_slots:
+                continue
+            for slot in progress_slots[book_id]:
+                show_progress(slot, snapshot)
+            if snapshot["status"] in ("completed", "failed"):
+                break
+            # A chapter landed - redraw so its player shows up
+            chapters = (snapshot.get("chapters_done"), snapshot.get("chapters_failed"))
+            if chapters_seen.setdefault(book_id, chapters) != chapters:
+                break
+        else:
+            return
+    except requests.exceptions.RequestException as e:
+        st.warning(f"Lost the live progress stream: {str(e)}")
+        return
+    
+    # Something finished - grab fresh data and redraw the page
+    fetch_audiobooks()
+    if st.session_state.selected_book:
+        updated_book = get_audiobook(st.session_state.selected_book["id"])
+        if updated_book:
+            st.session_state.selected_book = updated_book
+    st.rerun()
 
 # 🗣️ Voice options - pick your vibe
 VOICE_OPTIONS = {
@@ -233,6 +302,13 @@ def main():
         else:  # Text area for the writers
             text_content = st.text_area("Book Text", height=200, placeholder="Enter your book text here...")
         
+        # Vibe check the voice before committing a whole book
+        if st.button("Preview Voice"):
+            sample_text = text_content or "Once upon a time, a story was waiting to be told."
+            preview_audio = preview_voice(voice_id, sample_text)
+            if preview_audio:
+                st.audio(preview_audio, format="audio/wav")
+        
         # Let's go button!
         if st.button("Create Audiobook"):
             if not title or not author:
@@ -248,11 +324,11 @@ def main():
                     st.session_state.auto_refresh = True
                     st.balloons()
         
-        # Auto-refresh toggle - stay up to date
-        st.checkbox("Auto-refresh for processing books", value=True, key="auto_refresh")
+        # Live updates toggle - stay up to date
+        st.checkbox("Live progress for processing books", value=True, key="auto_refresh")
         
         if st.session_state.get('auto_refresh', False):
-            st.info(f"Auto-refreshing every {st.session_state.refresh_interval} seconds when books are processing")
+            st.info("Progress streams in live while books are processing")
         
         st.markdown("---")
         st.markdown("### About")
@@ -264,6 +340,9 @@ def main():
     # 📑 Main content tabs
     tab1, tab2 = st.tabs(["My Audiobooks", "View Audiobook"])
     
+    # Placeholders the live progress stream draws into, by book id
+    progress_slots = {}
+    
     # 📚 Tab 1: Book list
     with tab1:
         st.markdown('<h2 class="sub-header">My Audiobooks</h2>', unsafe_allow_html=True)
@@ -294,15 +373,10 @@ def main():
                         st.markdown(f'Status: {status_html}', unsafe_allow_html=True)
                         
                         if book["status"] == "processing":
-                            # Loading animation vibes
-                            st.spinner("Processing...")
-                            # Progress bar with pulse effect
-                            progress_bar = st.progress(st.session_state.progress_value)
-                            # Keep track of our progress bars
-                            if progress_bar not in st.session_state.progress_bars:
-                                st.session_state.progress_bars.append(progress_bar)
-                            # Info message
-                            st.info("Audio generation in progress...")
+                            # Filled in live by follow_progress at the bottom of the page
+                            slot = st.empty()
+                            slot.info("Audio generation in progress...")
+                            progress_slots.setdefault(book["id"], []).append(slot)
                     with col3:
                         if st.button("View", key=f"view_{book['id']}"):
                             st.session_state.selected_book = book
@@ -322,13 +396,6 @@ def main():
         if st.session_state.selected_book:
             book = st.session_state.selected_book
             
-            # Auto-refresh processing books
-            if book["status"] == "processing" and st.session_state.get('auto_refresh', False):
-                updated_book = get_audiobook(book["id"])
-                if updated_book:
-                    book = updated_book
-                    st.session_state.selected_book = updated_book
-            
             st.markdown(f'<h2 class="sub-header">{book["title"]}</h2>', unsafe_allow_html=True)
             st.markdown(f'<div class="book-author">by {book["author"]}</div>', unsafe_allow_html=True)
             st.markdown(f'<div class="book-date">{book["date"]}</div>', unsafe_allow_html=True)
@@ -338,15 +405,10 @@ def main():
             st.markdown(f'Status: {status_html}', unsafe_allow_html=True)
             
             if book["status"] == "processing":
-                # Loading animation vibes
-                st.spinner("Processing...")
-                # Progress bar with pulse effect
-                progress_bar = st.progress(st.session_state.progress_value)
-                # Keep track of our progress bars
-                if progress_bar not in st.session_state.progress_bars:
-                    st.session_state.progress_bars.append(progress_bar)
-                # Info message
-                st.info("Audio generation in progress...")
+                # Filled in live by follow_progress at the bottom of the page
+                slot = st.empty()
+                slot.info("Audio generation in progress...")
+                progress_slots.setdefault(book["id"], []).append(slot)
             
             if book["status"] == "completed" and book.get("audio_path"):
                 st.markdown("### Audio")
@@ -356,11 +418,25 @@ def main():
                 audio_url = get_audio_url(book["id"])
                 st.markdown(f'<a href="{audio_url}" download="{book["title"]}.wav">Download Audiobook</a>', unsafe_allow_html=True)
             
-            # Show a preview of the book text
-            if book.get("text_path") and os.path.exists(book["text_path"]):
+            # 📑 Chapters - each one plays on its own, even before the book is done
+            chapters = book.get("chapters", [])
+            if chapters:
+                st.markdown("### Chapters")
+                for chapter in chapters:
+                    with st.expander(f'{chapter["index"] + 1}. {chapter["title"]}'):
+                        st.markdown(f'Status: {format_status(chapter["status"])}', unsafe_allow_html=True)
+                        if chapter["status"] == "completed":
+                            st.audio(get_chapter_audio_url(book["id"], chapter["index"]))
+                        elif chapter["status"] == "failed":
+                            if st.button("Re-render chapter", key=f'rerender_{book["id"]}_{chapter["index"]}'):
+                                rerender_chapter(book["id"], chapter["index"])
+            
+            # Show a preview of the book text - first chapter if the upload isn't plain text
+            preview_path = chapters[0]["text_path"] if chapters else book.get("text_path")
+            if preview_path and os.path.exists(preview_path):
                 st.markdown("### Book Text Preview")
                 try:
-                    with open(book["text_path"], "r", encoding="utf-8") as f:
+                    with open(preview_path, "r", encoding="utf-8") as f:
                         text_content = f.read()
                     
                     # Just show a snippet
@@ -371,25 +447,9 @@ def main():
         else:
             st.info("Select an audiobook from the list to view details.")
     
-    # 🔄 Auto-refresh for processing books
-    if st.session_state.get('auto_refresh', False):
-        # Any books still cooking?
-        has_processing = any(book.get('status') == 'processing' for book in st.session_state.audiobooks)
-        
-        if has_processing:
-            # Update all progress bars with the current value
-            for progress_bar in st.session_state.get('progress_bars', []):
-                if 'progress_value' in st.session_state:
-                    try:
-                        progress_bar.progress(st.session_state.progress_value)
-                    except:
-                        pass
-            
-            # Chill for a bit
-            time.sleep(st.session_state.refresh_interval)
-            
-            # Refresh everything
-            auto_refresh()
+    # 📡 Live progress for processing books - the API pushes, no polling
+    if st.session_state.get('auto_refresh', False) and progress_slots:
+        follow_progress(progress_slots)
 
 # 🚀 Launch the app
 if __name__ == "__main__":
@@ -0,0 +1,15 @@
+"""
+🔏 Batch Watermark Audit 🔏
+Checks a whole output library for the CSM watermark in one go:
+
+    python verify_watermarks.py data/books data/audio --workers 4 --device cpu > audit.jsonl
+
+Takes files, directories and globs. Each worker process loads the
+watermarker once, long files are read in windows, and every file gets one
+JSON line. Exits non-zero if anything came back unmarked or unreadable.
+"""
+
+from watermarking import cli_verify_batch
+
+if __name__ == "__main__":
+    cli_verify_batch()
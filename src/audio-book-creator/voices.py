@@ -0,0 +1,189 @@
+"""
+🎤 Voice References 🎤
+Every chunk of a book is generated with its voice's reference clip in
+front of it. So the clip's length is paid again in backbone prefill on
+every single chunk, and it eats into the 2048 positions a prompt gets.
+Whatever gets uploaded, we keep a short, clean slice of it:
+
+- dead air trimmed off both ends, long pauses inside squeezed down
+- capped at VOICE_MAX_SECONDS
+- when the clip is longer than that, the window that sounds most like
+  the whole clip - mostly speech, typical loudness and brightness, and
+  cut at quiet spots instead of mid-word
+
+Next to data/voices/voice_{id}.wav sits voice_{id}.json with the
+transcript and how many prompt positions the reference takes (Mimi
+frames + text tokens), so its prefill cost is known up front.
+"""
+
+import json
+import math
+import os
+
+import torch
+
+# 🗣️ What the reference says when nobody told us
+DEFAULT_TRANSCRIPT = "This is a voice sample for cloning."
+
+# 🎛️ Mimi codes audio at 12.5 frames a second - one prompt position each
+MIMI_FRAME_RATE = 12.5
+
+# 🤫 Silence detection on short frames
+ANALYSIS_MS = 20
+SILENCE_FLOOR_DB = -50.0
+SILENCE_BELOW_PEAK_DB = 40.0
+KEEP_EDGE_MS = 100
+
+# ⚖️ Window scoring - speech fraction first, then how typical it sounds, then clean edges
+DISTANCE_WEIGHT = 0.25
+QUIET_EDGE_BONUS = 0.05
+
+
+def _frames(audio, sample_rate):
+    frame = max(1, int(sample_rate * ANALYSIS_MS / 1000))
+    n_frames = audio.numel() // frame
+    return audio[: n_frames * frame].view(n_frames, frame), frame
+
+
+def _voiced(frames):
+    """🔊 Which frames have speech in them, plus their level in dB"""
+    rms_db = 10.0 * torch.log10(frames.pow(2).mean(dim=1) + 1e-10)
+    threshold = max(SILENCE_FLOOR_DB, rms_db.max().item() - SILENCE_BELOW_PEAK_DB)
+    return rms_db > threshold, rms_db
+
+
+def squeeze_silence(audio, sample_rate, max_pause_ms=400):
+    """✂️ Trim dead air off the ends and shorten pauses longer than max_pause_ms"""
+    frames, frame = _frames(audio, sample_rate)
+    if frames.size(0) == 0:
+        return audio
+    voiced, _ = _voiced(frames)
+    voiced_idx = torch.nonzero(voiced).flatten()
+    if voiced_idx.numel() == 0:
+        return audio[:0]
+
+    edge = max(1, KEEP_EDGE_MS // ANALYSIS_MS)
+    half_pause = max(1, max_pause_ms // ANALYSIS_MS // 2)
+    first, last = voiced_idx[0].item(), voiced_idx[-1].item()
+    keep = torch.zeros_like(voiced)
+    keep[max(0, first - edge): last + 1 + edge] = True
+
+    # Long pauses keep a bit of their start and end - always cut in silence, so no clicks
+    gaps = torch.diff(voiced_idx)
+    for start, gap in zip(voiced_idx[:-1].tolist(), gaps.tolist()):
+        if gap - 1 > 2 * half_pause:
+            keep[start + 1 + half_pause: start + gap - half_pause] = False
+    return frames[keep].reshape(-1)
+
+
+def pick_window(audio, sample_rate, max_seconds):
+    """
+    🎯 The max_seconds of audio most like the whole clip - returns (audio, (start_s, end_s))
+
+    Scored per window from running sums over short frames: the share of
+    frames with speech, how far its voiced loudness and spectral centroid
+    sit from the clip's, and a nudge for starting and ending in silence.
+    """
+    max_samples = int(max_seconds * sample_rate)
+    if audio.numel() <= max_samples:
+        return audio, (0.0, audio.numel() / sample_rate)
+
+    frames, frame = _frames(audio, sample_rate)
+    voiced, rms_db = _voiced(frames)
+    spectrum = torch.fft.rfft(frames).abs()
+    freqs = torch.fft.rfftfreq(frame, 1.0 / sample_rate)
+    centroid = (spectrum * freqs).sum(dim=1) / (spectrum.sum(dim=1) + 1e-9)
+
+    features = torch.stack([rms_db, centroid], dim=1).double()
+    weights = voiced.double()
+    reference = features[voiced].mean(dim=0)
+    scale = features[voiced].std(dim=0).clamp(min=1e-6) if voiced.sum() > 1 else torch.ones(2, dtype=torch.double)
+
+    # Window sums for every start at once
+    width = max_samples // frame
+    zero = torch.zeros(1, 2, dtype=torch.double)
+    feature_sums = torch.cat([zero, torch.cumsum(features * weights.unsqueeze(1), dim=0)])
+    voiced_sums = torch.cat([zero[:, 0], torch.cumsum(weights, dim=0)])
+    window_features = feature_sums[width:] - feature_sums[:-width]
+    window_voiced = voiced_sums[width:] - voiced_sums[:-width]
+
+    means = window_features / window_voiced.clamp(min=1.0).unsqueeze(1)
+    distance = ((means - reference) / scale).pow(2).sum(dim=1).sqrt()
+    starts = torch.arange(window_voiced.numel())
+    quiet_edges = (~voiced[starts]).double() + (~voiced[starts + width - 1]).double()
+    score = window_voiced / width - DISTANCE_WEIGHT * distance + QUIET_EDGE_BONUS * quiet_edges
+    score[window_voiced == 0] = -math.inf
+
+    start = int(torch.argmax(score)) * frame
+    end = start + width * frame
+    return audio[start:end], (start / sample_rate, end / sample_rate)
+
+
+def prepare_reference(audio, sample_rate, max_seconds=10.0, max_pause_ms=400):
+    """
+    🎤 Raw upload -> the reference we actually prompt with (mono float32 on the CPU)
+
+    Returns (audio, info) - info says how long the clip was, which window
+    of the trimmed clip we kept and whether anything got cut.
+    """
+    audio = audio.detach().float().cpu()
+    if audio.dim() > 1:
+        audio = audio.mean(dim=0) if audio.size(0) > 1 else audio.reshape(-1)
+    source_s = audio.numel() / sample_rate
+
+    trimmed = squeeze_silence(audio, sample_rate, max_pause_ms)
+    trimmed_s = trimmed.numel() / sample_rate
+    windowed, window_s = pick_window(trimmed, sample_rate, max_seconds)
+    # The window may start or end in a pause - tidy its edges too
+    reference = squeeze_silence(windowed, sample_rate, max_pause_ms)
+
+    info = {
+        "source_s": round(source_s, 2),
+        "trimmed_s": round(trimmed_s, 2),
+        "window_s": [round(window_s[0], 2), round(window_s[1], 2)],
+        "duration_s": round(reference.numel() / sample_rate, 2),
+        "cut": windowed.numel() < trimmed.numel(),
+    }
+    return reference, info
+
+
+def audio_frames(num_samples, sample_rate):
+    """🎛️ Mimi frames (= prompt positions) for this much audio"""
+    return math.ceil(num_samples * MIMI_FRAME_RATE / sample_rate)
+
+
+def context_tokens(num_samples, sample_rate, text_tokens):
+    """📏 Prompt positions the reference costs - its text, its audio frames, and the audio EOS frame"""
+    return text_tokens + audio_frames(num_samples, sample_rate) + 1
+
+
+def meta_path(voice_id):
+    return f"data/voices/voice_{voice_id}.json"
+
+
+def load_meta(voice_id):
+    """📄 A registered voice's metadata (None for a bare WAV nobody registered)"""
+    try:
+        with open(meta_path(voice_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_meta(voice_id, meta):
+    path = meta_path(voice_id)
+    with open(f"{path}.part", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(f"{path}.part", path)
+    return path
+
+
+def list_meta():
+    """📚 Every registered voice, by voice_id"""
+    voices = []
+    for filename in sorted(os.listdir("data/voices")):
+        if filename.startswith("voice_") and filename.endswith(".json"):
+            meta = load_meta(filename[len("voice_"):-len(".json")])
+            if meta is not None:
+                voices.append(meta)
+    return sorted(voices, key=lambda meta: meta.get("voice_id", 0))
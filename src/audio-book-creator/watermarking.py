@@ -1,20 +1,40 @@
 import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, List, Optional
 
 import silentcipher
 import torch
 import torchaudio
 
+from resampling import resample
+
 # This watermark key is public, it is not secure.
 # If using CSM 1B in another application, use a new private key and keep it secret.
 CSM_1B_GH_WATERMARK = [212, 211, 146, 56, 201]
 
+AUDIO_EXTENSIONS = {".wav", ".flac", ".mp3", ".ogg"}
+
+# Long files are checked a window at a time so they never have to be loaded whole
+VERIFY_WINDOW_S = 30.0
+MIN_WINDOW_S = 3.0
+
+
+def default_device() -> str:
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
 
 def cli_check_audio() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--audio_path", type=str, required=True)
+    parser.add_argument("--device", type=str, default=default_device())
     args = parser.parse_args()
 
-    check_audio_from_file(args.audio_path)
+    check_audio_from_file(args.audio_path, device=args.device)
 
 
 def load_watermarker(device: str = "cuda") -> silentcipher.server.Model:
@@ -32,11 +52,13 @@ def watermark(
     sample_rate: int,
     watermark_key: list[int],
 ) -> tuple[torch.Tensor, int]:
-    audio_array_44khz = torchaudio.functional.resample(audio_array, orig_freq=sample_rate, new_freq=44100)
+    # The 44.1k silentcipher model only encodes at 44.1k, so a 24k chunk has to go up and back down again.
+    # Those two conversions are the whole cost; resample() just keeps their kernels cached.
+    audio_array_44khz = resample(audio_array, sample_rate, 44100)
     encoded, _ = watermarker.encode_wav(audio_array_44khz, 44100, watermark_key, calc_sdr=False, message_sdr=36)
 
     output_sample_rate = min(44100, sample_rate)
-    encoded = torchaudio.functional.resample(encoded, orig_freq=44100, new_freq=output_sample_rate)
+    encoded = resample(encoded, 44100, output_sample_rate)
     return encoded, output_sample_rate
 
 
@@ -47,7 +69,7 @@ def verify(
     sample_rate: int,
     watermark_key: list[int],
 ) -> bool:
-    watermarked_audio_44khz = torchaudio.functional.resample(watermarked_audio, orig_freq=sample_rate, new_freq=44100)
+    watermarked_audio_44khz = resample(watermarked_audio, sample_rate, 44100)
     result = watermarker.decode_wav(watermarked_audio_44khz, 44100, phase_shift_decoding=True)
 
     is_watermarked = result["status"]
@@ -59,8 +81,8 @@ def verify(
     return is_watermarked and is_csm_watermarked
 
 
-def check_audio_from_file(audio_path: str) -> None:
-    watermarker = load_watermarker(device="cuda")
+def check_audio_from_file(audio_path: str, device: Optional[str] = None) -> None:
+    watermarker = load_watermarker(device=device or default_device())
 
     audio_array, sample_rate = load_audio(audio_path)
     is_watermarked = verify(watermarker, audio_array, sample_rate, CSM_1B_GH_WATERMARK)
@@ -75,5 +97,139 @@ def load_audio(audio_path: str) -> tuple[torch.Tensor, int]:
     return audio_array, int(sample_rate)
 
 
+def iter_audio_windows(audio_path: str, window_s: float = VERIFY_WINDOW_S) -> Iterator[tuple[torch.Tensor, int]]:
+    """Yields (mono audio, sample_rate) windows of a file without loading all of it.
+    A short tail is folded into the window before it."""
+    info = torchaudio.info(audio_path)
+    sample_rate = int(info.sample_rate)
+    total = info.num_frames
+    if total <= 0:
+        # Some compressed formats don't report a length up front - load the whole thing
+        audio_array, _ = torchaudio.load(audio_path)
+        yield audio_array.mean(dim=0), sample_rate
+        return
+
+    window = max(1, int(window_s * sample_rate))
+    min_window = int(MIN_WINDOW_S * sample_rate)
+    start = 0
+    while start < total:
+        length = window if total - (start + window) >= min_window else total - start
+        audio_array, _ = torchaudio.load(audio_path, frame_offset=start, num_frames=length)
+        if audio_array.numel() == 0:
+            break
+        yield audio_array.mean(dim=0), sample_rate
+        start += length
+
+
+def expand_audio_paths(inputs: List[str]) -> List[str]:
+    """Files, directories (searched recursively) and glob patterns -> sorted, de-duplicated audio files"""
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.update(os.path.join(root, f) for f in files if os.path.splitext(f)[1].lower() in AUDIO_EXTENSIONS)
+        elif os.path.isfile(item):
+            paths.add(item)
+        else:
+            paths.update(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+    return sorted(paths)
+
+
+# Loaded once per worker process by _init_verify_worker
+_worker_watermarker = None
+
+
+def _init_verify_worker(device: str, threads: int) -> None:
+    global _worker_watermarker
+    torch.set_num_threads(threads)
+    _worker_watermarker = load_watermarker(device=device)
+
+
+def verify_file(
+    watermarker: silentcipher.server.Model,
+    audio_path: str,
+    watermark_key: list[int] = CSM_1B_GH_WATERMARK,
+    window_s: float = VERIFY_WINDOW_S,
+    all_windows: bool = False,
+) -> dict:
+    """Checks a file window by window. Stops at the first watermarked window unless all_windows."""
+    result = {"path": audio_path, "watermarked": False, "windows": 0, "watermarked_windows": 0, "duration_s": 0.0}
+    try:
+        for audio_array, sample_rate in iter_audio_windows(audio_path, window_s):
+            result["windows"] += 1
+            result["duration_s"] += audio_array.size(-1) / sample_rate
+            if verify(watermarker, audio_array, sample_rate, watermark_key):
+                result["watermarked"] = True
+                result["watermarked_windows"] += 1
+                if not all_windows:
+                    break
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["duration_s"] = round(result["duration_s"], 3)
+    return result
+
+
+def _verify_in_worker(audio_path: str, window_s: float, all_windows: bool) -> dict:
+    return verify_file(_worker_watermarker, audio_path, window_s=window_s, all_windows=all_windows)
+
+
+def verify_batch(
+    audio_paths: List[str],
+    device: str = "cpu",
+    workers: int = 1,
+    window_s: float = VERIFY_WINDOW_S,
+    all_windows: bool = False,
+) -> Iterator[dict]:
+    """Verifies many files across a process pool; yields results as they finish."""
+    workers = max(1, min(workers, len(audio_paths) or 1))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # spawn, not fork - CUDA can't be re-initialized in a forked child
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_verify_worker,
+        initargs=(device, threads),
+    ) as executor:
+        futures = [executor.submit(_verify_in_worker, path, window_s, all_windows) for path in audio_paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def cli_verify_batch() -> None:
+    parser = argparse.ArgumentParser(description="Check many audio files for the CSM watermark, one JSON line per file")
+    parser.add_argument("inputs", nargs="+", help="audio files, directories or glob patterns")
+    parser.add_argument("--device", type=str, default=default_device())
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--window_s", type=float, default=VERIFY_WINDOW_S)
+    parser.add_argument(
+        "--all_windows", action="store_true", help="scan every window instead of stopping at the first hit"
+    )
+    parser.add_argument("--output", type=str, default=None, help="write JSON lines here instead of stdout")
+    args = parser.parse_args()
+
+    audio_paths = expand_audio_paths(args.inputs)
+    if not audio_paths:
+        parser.error("no audio files matched")
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    counts = {"watermarked": 0, "not_watermarked": 0, "errors": 0}
+    try:
+        for result in verify_batch(audio_paths, args.device, args.workers, args.window_s, args.all_windows):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            if "error" in result:
+                counts["errors"] += 1
+            elif result["watermarked"]:
+                counts["watermarked"] += 1
+            else:
+                counts["not_watermarked"] += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"{len(audio_paths)} files: {json.dumps(counts)}", file=sys.stderr)
+    sys.exit(0 if counts["watermarked"] == len(audio_paths) else 1)
+
+
 if __name__ == "__main__":
     cli_check_audio()
\ No newline at end of file
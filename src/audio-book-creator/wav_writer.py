@@ -0,0 +1,74 @@
+"""
+💿 Streaming WAV Writer 💿
+Appends PCM to a WAV file chunk by chunk and patches the header when done,
+so a 10-hour book never has to exist in RAM all at once.
+
+Audio is stored as 16-bit PCM. Files are written to a .part path and
+renamed into place on close, so a crash never leaves a half-written WAV
+where a finished one should be.
+"""
+
+import os
+import wave
+
+# 📦 Frames copied per read when stitching WAVs together (~512KB of 16-bit mono)
+COPY_BLOCK_FRAMES = 256 * 1024
+
+SAMPLE_WIDTH = 2  # 16-bit
+INT16_MAX = 32767.0
+
+
+class StreamingWavWriter:
+    """💿 Write mono audio to a WAV file a chunk at a time"""
+
+    def __init__(self, path, sample_rate):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.frames = 0
+        self._tmp_path = f"{path}.part"
+        self._wav = wave.open(self._tmp_path, "wb")
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(SAMPLE_WIDTH)
+        self._wav.setframerate(sample_rate)
+
+    def write(self, audio):
+        """➕ Append a float tensor in [-1, 1] as 16-bit PCM"""
+        pcm = (audio.detach().float().cpu().reshape(-1).clamp(-1.0, 1.0) * INT16_MAX).round().short()
+        self._wav.writeframesraw(pcm.numpy().tobytes())
+        self.frames += pcm.numel()
+
+    def append_wav(self, path):
+        """🔗 Copy another WAV's PCM straight in - no decoding, a block at a time"""
+        with wave.open(path, "rb") as source:
+            if (source.getnchannels(), source.getsampwidth(), source.getframerate()) != (
+                1, SAMPLE_WIDTH, self.sample_rate
+            ):
+                raise ValueError(f"{path} isn't 16-bit mono at {self.sample_rate}Hz")
+            while True:
+                block = source.readframes(COPY_BLOCK_FRAMES)
+                if not block:
+                    break
+                self._wav.writeframesraw(block)
+                self.frames += len(block) // SAMPLE_WIDTH
+
+    def close(self):
+        """✅ Patch the header and move the file into place"""
+        self._wav.close()
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+    def abort(self):
+        """🗑️ Throw away a half-written file"""
+        self._wav.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -0,0 +1,99 @@
+"""
+🏊 Shared-Weight Worker Pool 🏊
+Runs generations in forked worker processes that all read one copy of the
+model weights.
+
+The parent loads the backend once, moves every parameter into shared
+memory and only then forks. Children attach to those same pages (nothing
+gets copied) and allocate just their own KV caches, so N workers cost
+one model plus N caches instead of N models.
+
+CPU only - CUDA contexts don't survive a fork.
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+import torch.multiprocessing as mp
+
+# 🧬 Inherited by forked children - set in the parent right before the fork
+_backend = None
+
+
+def _modules_of(obj):
+    """🔎 nn.Modules held by a backend (or by the things it holds, one level down)"""
+    if isinstance(obj, torch.nn.Module):
+        return [obj]
+    modules = []
+    for value in getattr(obj, "__dict__", {}).values():
+        if isinstance(value, torch.nn.Module):
+            modules.append(value)
+        elif hasattr(value, "__dict__") and not isinstance(value, type):
+            modules.extend(v for v in vars(value).values() if isinstance(v, torch.nn.Module))
+    return modules
+
+
+def share_weights(backend):
+    """📌 Park every parameter in shared memory, read-only; returns how many bytes are shared"""
+    shared = 0
+    for module in _modules_of(backend):
+        module.requires_grad_(False)
+        # Parameters only - buffers include KV caches, and those must stay per-process
+        for param in module.parameters():
+            param.data.share_memory_()
+            shared += param.numel() * param.element_size()
+    return shared
+
+
+def _init_worker(threads):
+    """👶 Runs once in each child: own thread budget, own KV caches"""
+    torch.set_num_threads(threads)
+    model = getattr(_backend, "_model", None)
+    if model is not None and hasattr(model, "setup_caches"):
+        # Fresh caches in this process's private memory - the parent's are never written
+        model.setup_caches(1)
+    logging.info(f"Worker {os.getpid()} attached to shared weights ({threads} threads)")
+
+
+def _ready():
+    return os.getpid()
+
+
+def _generate_in_worker(kwargs):
+    audio = _backend.generate(**kwargs)
+    return audio.cpu() if audio is not None else None
+
+
+class SharedModelPool:
+    """🏊 A process pool whose workers share the parent's already-loaded backend"""
+
+    def __init__(self, backend, workers, threads_per_worker=None):
+        global _backend
+        if workers < 1:
+            raise ValueError("Need at least one worker process")
+
+        shared_bytes = share_weights(backend)
+        _backend = backend
+
+        threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(threads,),
+        )
+        # Fork everyone now, straight after loading, rather than mid-request later
+        pids = {future.result() for future in [self._executor.submit(_ready) for _ in range(workers)]}
+        logging.info(
+            f"SharedModelPool up: {len(pids)} worker(s) sharing {shared_bytes / 2**30:.2f} GiB of weights"
+        )
+
+    def generate(self, **kwargs):
+        """🗣️ Same call as backend.generate, run in whichever worker is free"""
+        return self._executor.submit(_generate_in_worker, kwargs).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)